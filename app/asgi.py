@@ -0,0 +1,114 @@
+"""ASGI entry point module.
+
+Serves the app from an ASGI server with one long-lived event loop
+per worker process:
+
+    python -m gunicorn asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+Each request runs as WSGI in a thread of its own executor
+(`ASGI_THREADS` threads), so a worker serves many requests at once.
+Their async views and database calls run on the worker loop instead
+of a new loop per request, sharing one warm connection pool. The loop
+default executor stays free for them: opening a connection resolves
+its host there, which requests occupying it would wait for forever.
+"""
+import contextlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from db.pools import get_engine
+from server import create_app
+
+THREADS = int(os.environ.get('ASGI_THREADS', '32'))
+REQUEST_EXECUTOR = ThreadPoolExecutor(THREADS, thread_name_prefix='asgi')
+
+
+class ConcurrentWsgiInstance(WsgiToAsgiInstance):
+    """Request handled in any thread of the executor.
+
+    asgiref runs every request in one shared thread by default.
+    """
+
+    async def run_wsgi_app(self, body: BinaryIO) -> None:
+        """Run the WSGI app in a thread of `REQUEST_EXECUTOR`.
+
+        `sync_to_async` lets the async views of the request
+        run on this loop, see `ProfilingFlask.async_to_sync`.
+
+        Args:
+            body (BinaryIO): The request body.
+        """
+        await sync_to_async(
+            self.serve, thread_sensitive=False, executor=REQUEST_EXECUTOR,
+            )(body)
+
+    def serve(self, body: BinaryIO) -> None:
+        """Run the WSGI app and send its response, in a worker thread.
+
+        Args:
+            body (BinaryIO): The request body.
+        """
+        environ = self.build_environ(self.scope, body)
+        with contextlib.closing(self.wsgi_application(environ, self.start_response)) as chunks:
+            for chunk in chunks:
+                self.send_start()
+                self.sync_send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        self.send_start()
+        self.sync_send({'type': 'http.response.body'})
+
+    def send_start(self) -> None:
+        """Send the status and headers set by `start_response`, once."""
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+
+
+class ConcurrentWsgiToAsgi(WsgiToAsgi):
+    """WSGI to ASGI adapter handling requests concurrently."""
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        """Handle a request.
+
+        Args:
+            scope (dict): ASGI connection scope.
+            receive (Callable): Awaitable returning the next ASGI event.
+            send (Callable): Awaitable sending an ASGI event.
+        """
+        await ConcurrentWsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+async def lifespan(receive, send) -> None:
+    """Close the connection pool on shutdown.
+
+    Args:
+        receive (Callable): Awaitable returning the next ASGI event.
+        send (Callable): Awaitable sending an ASGI event.
+    """
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await get_engine().dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+wsgi_application = ConcurrentWsgiToAsgi(create_app())
+
+
+async def application(scope: dict, receive, send) -> None:
+    """Serve the app, ASGI entry point.
+
+    Args:
+        scope (dict): ASGI connection scope.
+        receive (Callable): Awaitable returning the next ASGI event.
+        send (Callable): Awaitable sending an ASGI event.
+    """
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    else:
+        await wsgi_application(scope, receive, send)
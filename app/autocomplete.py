@@ -0,0 +1,229 @@
+"""Typeahead blueprint module.
+
+`GET /autocomplete?q=...` suggests movies and actors while an id is typed
+into the REST forms. Names starting with the typed text come first
+(an ordered scan of the `lower(name)` pattern indexes), then names with
+words starting with the typed ones (the title lexemes of the `search`
+columns). When there are still not enough of them, each typed word is
+corrected to the closest word of a movie or actor name (`pg_trgm`
+similarity over the `name_word` dictionary) and the corrected text
+is looked up by prefix again.
+
+Results of hot prefixes are kept in a small in-process cache
+for `AUTOCOMPLETE_CACHE_TTL` seconds.
+"""
+import os
+
+from db.models import Actor, Movie, NameWord
+from entity_cache import MISSING, EntityCache
+from flask import Blueprint, current_app, jsonify, request
+from search import SEARCH_CONFIG
+from sqlalchemy import CompoundSelect, Select, func, literal, select, union_all
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.expression import UnaryExpression
+
+MIN_LENGTH = 2
+FUZZY_MIN_LENGTH = 3
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+LIKE_ESCAPE = '\\'
+PATTERN_ORDER = operators.custom_op('USING ~<~')
+SUGGESTED = (
+    ('movie', Movie.id, Movie.movie_name, Movie.search),
+    ('actor', Actor.id, Actor.actor_name, Actor.search),
+)
+
+autocomplete = Blueprint('autocomplete', __name__)
+
+
+def create_autocomplete_cache() -> EntityCache:
+    """Configure the cache of suggestions from the environment.
+
+    Returns:
+        EntityCache: Cache of `AUTOCOMPLETE_CACHE_SIZE` prefixes.
+    """
+    return EntityCache(
+        maxsize=int(os.environ.get('AUTOCOMPLETE_CACHE_SIZE', '256')),
+        ttl=float(os.environ.get('AUTOCOMPLETE_CACHE_TTL', '30')),
+        negative_ttl=0,
+    )
+
+
+def escape_like(text: str) -> str:
+    """Escape the LIKE wildcards of user input.
+
+    Args:
+        text (str): Typed text.
+
+    Returns:
+        str: Text matching itself in a LIKE pattern.
+    """
+    for char in (LIKE_ESCAPE, '%', '_'):
+        text = text.replace(char, LIKE_ESCAPE + char)
+    return text
+
+
+def prefix_statement(terms: str, limit: int) -> CompoundSelect:
+    """Build the lookup of names starting with the typed text.
+
+    Each branch walks the `lower(name)` index in order
+    and stops after `limit` rows.
+
+    Args:
+        terms (str): Typed text.
+        limit (int): Maximum number of suggestions.
+
+    Returns:
+        CompoundSelect: Rows of `kind`, `id` and `name`, by name.
+    """
+    pattern = '{0}%'.format(escape_like(terms.lower()))
+    branches = []
+    for kind, entity_id, name, _search in SUGGESTED:
+        folded = func.lower(name)
+        branch = select(
+            literal(kind).label('kind'), entity_id, name.label('name'),
+            )
+        branch = branch.where(folded.like(pattern, escape=LIKE_ESCAPE))
+        in_order = UnaryExpression(folded, modifier=PATTERN_ORDER)
+        branches.append(branch.order_by(in_order).limit(limit))
+    return union_all(*branches).order_by('name').limit(limit)
+
+
+def word_statement(word: str, limit: int) -> CompoundSelect:
+    """Build the lookup of names with a word starting with the typed one.
+
+    Matches prefixes of the title lexemes of the `search` columns,
+    so the surname finds the actor and any title word the movie.
+    Branches are not sorted, so common words stop at `limit` matches.
+
+    Args:
+        word (str): Typed word, in lower case.
+        limit (int): Maximum number of suggestions.
+
+    Returns:
+        CompoundSelect: Rows of `kind`, `id` and `name`, by name.
+    """
+    lexeme = word.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("'", "''")
+    tsquery = func.to_tsquery(SEARCH_CONFIG, "'{0}':*A".format(lexeme))
+    branches = []
+    for kind, entity_id, name, search in SUGGESTED:
+        branch = select(
+            literal(kind).label('kind'), entity_id, name.label('name'),
+            )
+        branch = branch.where(search.op('@@')(tsquery))
+        branches.append(branch.limit(limit))
+    return union_all(*branches).order_by('name').limit(limit)
+
+
+def correct_statement(words: list[str]) -> Select:
+    """Build the lookup of the closest known spelling of typed words.
+
+    Words without a similar enough word in the dictionary
+    are kept as typed.
+
+    Args:
+        words (list[str]): Typed words, in lower case.
+
+    Returns:
+        Select: Single row of corrected words.
+    """
+    corrected = []
+    for word in words:
+        is_similar = NameWord.word.op('%')(word)
+        distance = NameWord.word.op('<->')(word)
+        closest = select(NameWord.word).where(is_similar)
+        closest = closest.order_by(distance).limit(1)
+        corrected.append(func.coalesce(closest.scalar_subquery(), word))
+    return select(*corrected)
+
+
+async def add_new(
+    async_session: AsyncSession,
+    rows: list[Row],
+    statement: Select | CompoundSelect,
+        ) -> None:
+    """Append the suggestions of a lookup that are not listed yet.
+
+    Args:
+        async_session (AsyncSession): Session of the lookups.
+        rows (list[Row]): Suggestions found so far.
+        statement (Select | CompoundSelect): Lookup of more suggestions.
+    """
+    found = {row.id for row in rows}
+    query = await async_session.execute(statement)
+    rows.extend(row for row in query if row.id not in found)
+
+
+async def suggest(
+    terms: str,
+    limit: int,
+    session_maker: async_sessionmaker[AsyncSession],
+        ) -> list[dict]:
+    """Suggest movies and actors for typed text.
+
+    Names starting with the text come first. When there are fewer
+    than `limit` of them, the rest is filled with names having a word
+    that starts with the text (for a single typed word), then with names
+    starting with the text with its typos corrected. Typed words
+    shorter than `FUZZY_MIN_LENGTH` are not corrected.
+
+    Args:
+        terms (str): Typed text.
+        limit (int): Maximum number of suggestions.
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+
+    Returns:
+        list[dict]: `kind`, `id` and `name` of the suggestions.
+    """
+    typed = terms.lower()
+    words = [word for word in typed.split() if len(word) >= FUZZY_MIN_LENGTH]
+    async with session_maker() as async_session:
+        rows = []
+        await add_new(async_session, rows, prefix_statement(typed, limit))
+        if words == [typed] and len(rows) < limit:
+            await add_new(async_session, rows, word_statement(typed, limit))
+        if words and len(rows) < limit:
+            query = await async_session.execute(correct_statement(words))
+            fixes = dict(zip(words, query.one()))
+            corrected = ' '.join(
+                fixes.get(word, word) for word in typed.split()
+            )
+            if corrected != typed:
+                fixed = prefix_statement(corrected, limit)
+                await add_new(async_session, rows, fixed)
+    return [
+        {'kind': row.kind, 'id': row.id, 'name': row.name}
+        for row in rows[:limit]
+    ]
+
+
+@autocomplete.get('/autocomplete')
+async def suggestions():
+    """Suggest movies and actors for the text typed into a form.
+
+    The `q` query argument holds the typed text
+    (at least two characters) and `limit` the number of suggestions.
+
+    Returns:
+        Response: JSON list of suggestions.
+    """
+    terms = ' '.join(request.args.get('q', '').split())
+    try:
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    limit = min(max(limit, 1), MAX_LIMIT)
+    if len(terms) < MIN_LENGTH:
+        return jsonify([])
+    cache = current_app.extensions['autocomplete_cache']
+    key = (terms.lower(), limit)
+    found = cache.get(key)
+    if found is MISSING:
+        found = await suggest(
+            terms, limit, current_app.extensions['async_session_maker'],
+            )
+        cache.put(key, found)
+    return jsonify(found)
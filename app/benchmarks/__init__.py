@@ -0,0 +1 @@
+"""Benchmarks, run from `app/` as `python -m benchmarks.<name>`."""
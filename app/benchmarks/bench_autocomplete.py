@@ -0,0 +1,136 @@
+"""Benchmark of the typeahead.
+
+Seeds the synthetic catalog of `bench_search`, then replays typing:
+for random movie and actor names every prefix of 2 to 8 characters,
+plus a misspelt version of the name. Reports the latency of the
+database lookup (cache misses) and of the endpoint with the hot
+prefix cache. The seeded rows are removed afterwards.
+
+Usage, from `app/` with the POSTGRES_* variables set:
+
+    python -m benchmarks.bench_autocomplete --movies 80000 --actors 20000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import random
+import time
+
+from autocomplete import DEFAULT_LIMIT, suggest
+from benchmarks import bench_search
+from benchmarks.reporting import echo, elapsed_ms, percentiles, timed
+from db.models import Actor, Movie
+from db.pools import get_engine, get_session_maker
+from server import create_app
+from sqlalchemy import func, select, union_all
+
+TYPED_LENGTHS = (2, 8)
+DEFAULT_NAMES = 200
+RANDOM_SEED = 11
+TABLE_ROW = '{0:10} {1:>8.2f} {2:>8.2f} {3:>8.2f}'
+app = create_app()
+
+
+def typed(names: list[str], rnd: random.Random) -> list[str]:
+    """Replay the typing of names.
+
+    Args:
+        names (list[str]): Names typed.
+        rnd (Random): Picks the misspelt letters.
+
+    Returns:
+        list[str]: The prefixes of each name, then the name with two
+        letters swapped.
+    """
+    shortest, longest = TYPED_LENGTHS
+    prefixes = []
+    for name in names:
+        lengths = range(shortest, min(len(name), longest) + 1)
+        prefixes.extend(name[:length] for length in lengths)
+        swap = rnd.randrange(len(name) - 1)
+        head, tail = name[:swap], name[swap:]
+        swapped = tail[1::-1] + tail[2:]
+        prefixes.append(head + swapped)
+    return prefixes
+
+
+async def sample_names(session_maker, count: int) -> list[str]:
+    """Draw random names of the seeded movies and actors.
+
+    Args:
+        session_maker (sessionmaker): Factory of the querying session.
+        count (int): Number of names, half movies and half actors.
+
+    Returns:
+        list[str]: The names.
+    """
+    seeded_movies = Movie.id.startswith(bench_search.MOVIE_PREFIX)
+    movies = select(Movie.movie_name).where(seeded_movies)
+    seeded_actors = Actor.id.startswith(bench_search.ACTOR_PREFIX)
+    actors = select(Actor.actor_name).where(seeded_actors)
+    sampled = [
+        names.order_by(func.random()).limit(count // 2)
+        for names in (movies, actors)
+    ]
+    async with session_maker() as session:
+        names = await session.scalars(union_all(*sampled))
+        return names.all()
+
+
+async def measure_database(prefixes: list[str], session_maker) -> None:
+    """Time the lookups of the prefixes, without the cache.
+
+    Args:
+        prefixes (list[str]): Typed prefixes.
+        session_maker (sessionmaker): Factory of the lookup sessions.
+    """
+    timings = []
+    for prefix in prefixes:
+        _suggested, elapsed = await timed(suggest(prefix, DEFAULT_LIMIT, session_maker))
+        timings.append(elapsed)
+    echo(TABLE_ROW.format('database', *percentiles(timings)))
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Seed the catalog, replay the typing and clean up.
+
+    Args:
+        args (Namespace): Command line arguments.
+    """
+    session_maker = get_session_maker()
+    rnd = random.Random(RANDOM_SEED)
+    async with contextlib.AsyncExitStack() as stack:
+        stack.push_async_callback(get_engine().dispose)
+        stack.push_async_callback(bench_search.cleanup, session_maker)
+        await bench_search.seed(session_maker, args)
+        prefixes = typed(await sample_names(session_maker, args.names), rnd)
+        echo('{0} lookups of {1} names'.format(len(prefixes), args.names))
+        echo('{0:10} {1:>8} {2:>8} {3:>8}'.format('path', 'p50 ms', 'p95 ms', 'p99 ms'))
+        await measure_database(prefixes, session_maker)
+        await get_engine().dispose()
+        await asyncio.to_thread(measure_endpoint, prefixes)
+
+
+def measure_endpoint(prefixes: list[str]) -> None:
+    """Time the endpoint, each prefix twice so the cache gets hot.
+
+    Args:
+        prefixes (list[str]): Typed prefixes.
+    """
+    timings = []
+    with app.test_client() as test_client:
+        for prefix in prefixes * 2:
+            started = time.perf_counter()
+            test_client.get('/autocomplete', query_string={'q': prefix})
+            timings.append(elapsed_ms(started))
+    echo(TABLE_ROW.format('endpoint', *percentiles(timings)))
+    echo('cache {0}'.format(app.extensions['autocomplete_cache'].stats()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=bench_search.DEFAULT_MOVIES)
+    parser.add_argument('--actors', type=int, default=bench_search.DEFAULT_ACTORS)
+    parser.add_argument('--names', type=int, default=DEFAULT_NAMES)
+    asyncio.run(main(parser.parse_args()))
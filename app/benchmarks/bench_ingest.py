@@ -0,0 +1,232 @@
+"""Benchmark of the ingestion write path.
+
+Compares the legacy per-row writes (a transaction and two SELECTs for every
+genre and actor) with `MoviesApi.store_movie` (one transaction, set-based
+upserts) on synthetic titles, so no network access is needed. Only the
+rows the run created are removed afterwards.
+
+Usage, from `app/` with the POSTGRES_* variables set:
+
+    python -m benchmarks.bench_ingest --titles 20 --cast 15 --genres 3
+"""
+
+import argparse
+import asyncio
+import datetime
+import time
+
+from benchmarks.reporting import SQLCounter, echo, elapsed_ms
+from db.imdb import MoviesApi
+from db.models import Actor, Genre, Movie, MovieActor, MovieGenre
+from db.pools import get_engine
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+# No IMDb id starts with `ttingest` / `nmingest`: the legacy path, which
+# looks actors up by id, can never link a synthetic title to a real actor.
+MOVIE_ID = 'ttingest-{0}-{1:05d}'
+ACTOR_ID = 'nmingest-{0}-{1:05d}'
+GENRE_NAME = 'bench-genre-{0}'
+GENRES = 20
+ACTORS = 5000
+ACTOR_STRIDE = 7
+BIRTH_DATE = datetime.date.fromisoformat('1970-01-01')
+DEFAULT_TITLES = 20
+DEFAULT_CAST = 15
+DEFAULT_GENRES = 3
+TABLE_ROW = '{0:8} {1:>10} {2:>12} {3:>12}'
+
+
+async def legacy_movie_genre(movie: Movie, genre: Genre, session: AsyncSession) -> None:
+    """Link a movie to a genre the way imports used to, in a transaction.
+
+    Args:
+        movie (Movie): The movie, stored if missing.
+        genre (Genre): The genre, stored if missing.
+        session (AsyncSession): Session of the import.
+    """
+    async with session.begin():
+        with_genres = selectinload(Movie.genres)
+        movie_query = select(Movie).where(Movie.id == movie.id)
+        movie_query = movie_query.options(with_genres)
+        movie_result = (await session.scalars(movie_query)).first()
+        genre_query = select(Genre).where(Genre.genre_name == genre.genre_name)
+        genre_result = (await session.scalars(genre_query)).first()
+        if genre_result is not None:
+            genre = genre_result
+        else:
+            session.add(genre)
+        if movie_result is not None:
+            movie = movie_result
+        else:
+            session.add(movie)
+        movie.genres.append(genre)
+
+
+async def legacy_movie_actor(movie: Movie, actor: Actor, session: AsyncSession) -> None:
+    """Link a movie to an actor the way imports used to, in a transaction.
+
+    Args:
+        movie (Movie): The movie, stored if missing.
+        actor (Actor): The actor, stored if missing.
+        session (AsyncSession): Session of the import.
+    """
+    async with session.begin():
+        with_actors = selectinload(Movie.actors)
+        movie_query = select(Movie).where(Movie.id == movie.id)
+        movie_query = movie_query.options(with_actors)
+        movie_result = (await session.scalars(movie_query)).first()
+        actor_query = select(Actor).where(Actor.id == actor.id)
+        actor_result = (await session.scalars(actor_query)).first()
+        if actor_result is not None:
+            actor = actor_result
+        else:
+            session.add(actor)
+        if movie_result is not None:
+            movie = movie_result
+        else:
+            session.add(movie)
+        movie.actors.append(actor)
+
+
+async def legacy_store(
+    api: MoviesApi,
+    movie_row: dict,
+    genre_names: list[str],
+    actor_rows: list[dict],
+        ) -> None:
+    """Store a title with the legacy per-row writes.
+
+    Args:
+        api (MoviesApi): Api whose session writes the rows.
+        movie_row (dict): Column values of the movie.
+        genre_names (list[str]): Names of its genres.
+        actor_rows (list[dict]): Column values of its cast.
+    """
+    movie = Movie(**movie_row)
+    for genre_name in genre_names:
+        await legacy_movie_genre(movie, Genre(genre_name=genre_name), api.async_session)
+    for actor_row in actor_rows:
+        await legacy_movie_actor(movie, Actor(**actor_row), api.async_session)
+
+
+async def bulk_store(
+    api: MoviesApi,
+    movie_row: dict,
+    genre_names: list[str],
+    actor_rows: list[dict],
+        ) -> None:
+    """Store a title with `MoviesApi.store_movie`.
+
+    Args:
+        api (MoviesApi): Api storing the title.
+        movie_row (dict): Column values of the movie.
+        genre_names (list[str]): Names of its genres.
+        actor_rows (list[dict]): Column values of its cast.
+    """
+    await api.store_movie(movie_row, genre_names, actor_rows)
+
+
+def synthetic_title(path: str, num: int, cast: int, genres: int) -> tuple[dict, list, list]:
+    """Generate a title sharing its genres and cast with other titles.
+
+    Args:
+        path (str): Name of the benchmarked path, part of the ids.
+        num (int): Number of the title.
+        cast (int): Number of actors.
+        genres (int): Number of genres.
+
+    Returns:
+        tuple[dict, list, list]: Column values of the movie,
+        names of its genres and column values of its cast.
+    """
+    movie_row = {
+        'id': MOVIE_ID.format(path, num), 'movie_name': 'Bench {0}'.format(num),
+        'url': '', 'poster': '', 'description': '', 'rating': 5.0,
+    }
+    genre_nums = [(num + shift) % GENRES for shift in range(genres)]
+    genre_names = [GENRE_NAME.format(genre_num) for genre_num in genre_nums]
+    actor_nums = [(num * ACTOR_STRIDE + shift) % ACTORS for shift in range(cast)]
+    actor_rows = [
+        {
+            'id': ACTOR_ID.format(path, actor_num), 'actor_name': 'Actor',
+            'image': '', 'url': '', 'description': '', 'birth_date': BIRTH_DATE,
+        }
+        for actor_num in actor_nums
+    ]
+    return movie_row, genre_names, actor_rows
+
+
+async def cleanup(api: MoviesApi, titles: list[tuple]) -> None:
+    """Remove exactly the movies, actors and genres of the titles.
+
+    Args:
+        api (MoviesApi): Api whose session removes the rows.
+        titles (list[tuple]): Titles generated by `synthetic_title`.
+    """
+    movie_ids, actor_ids, genre_names = [], set(), set()
+    for movie_row, title_genres, actor_rows in titles:
+        movie_ids.append(movie_row['id'])
+        genre_names.update(title_genres)
+        actor_ids.update(actor_row['id'] for actor_row in actor_rows)
+    generated = (
+        (MovieActor, MovieActor.movie_id.in_(movie_ids)),
+        (MovieGenre, MovieGenre.movie_id.in_(movie_ids)),
+        (Movie, Movie.id.in_(movie_ids)),
+        (Actor, Actor.id.in_(actor_ids)),
+        (Genre, Genre.genre_name.in_(genre_names)),
+    )
+    session = api.async_session
+    async with session.begin():
+        for model, condition in generated:
+            await session.execute(delete(model).where(condition))
+    session.expunge_all()
+
+
+async def run_path(name: str, store, args: argparse.Namespace) -> None:
+    """Store synthetic titles through a path and report its cost.
+
+    Args:
+        name (str): Name of the path.
+        store (Callable): Stores a title.
+        args (Namespace): Command line arguments.
+    """
+    api = MoviesApi()
+    titles = [
+        synthetic_title(name, num, args.cast, args.genres)
+        for num in range(args.titles)
+    ]
+    with SQLCounter(get_engine()) as counter:
+        started = time.perf_counter()
+        for title in titles:
+            await store(api, *title)
+        elapsed = elapsed_ms(started)
+        statements, commits = counter.statements, counter.commits
+    await cleanup(api, titles)
+    await get_engine().dispose()
+    echo(TABLE_ROW.format(
+        name,
+        round(statements / args.titles, 1),
+        round(commits / args.titles, 1),
+        round(elapsed / args.titles, 2),
+    ))
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Benchmark the legacy and the bulk path.
+
+    Args:
+        args (Namespace): Command line arguments.
+    """
+    echo(TABLE_ROW.format('path', 'stmts/title', 'commits/title', 'ms/title'))
+    await run_path('legacy', legacy_store, args)
+    await run_path('bulk', bulk_store, args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--titles', type=int, default=DEFAULT_TITLES)
+    parser.add_argument('--cast', type=int, default=DEFAULT_CAST)
+    parser.add_argument('--genres', type=int, default=DEFAULT_GENRES)
+    asyncio.run(main(parser.parse_args()))
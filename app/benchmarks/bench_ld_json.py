@@ -0,0 +1,103 @@
+"""Benchmark of the ld+json extraction of IMDb pages.
+
+Times the scan of `db.ld_json` against parsing the whole page with lxml
+on the recorded pages of `IMDB_FIXTURES_DIR`. The fixtures keep little
+more than the head of each page, so `--body-kb` kilobytes of markup are
+added to their body, about the size of a live IMDb page by default.
+Both ways must decode the same payload.
+
+Usage, from `app/`:
+
+    python -m benchmarks.bench_ld_json --body-kb 800 --repeat 100
+"""
+
+import argparse
+import os
+import pathlib
+import statistics
+import time
+
+from benchmarks.reporting import echo, elapsed_ms
+from db.http_cache import FIXTURES_DIR
+from db.ld_json import parse_ld_json, scan_ld_json
+
+BODY_BLOCK = b''.join((
+    b'<div class="ipc-metadata-list-summary-item"><a class="ipc-title-link-wrapper" ',
+    b'href="/title/tt0000001/?ref_=nm_knf_t_1"><h3 class="ipc-title__text">Title</h3></a>',
+    b'<span class="ipc-rating-star--rating">7.5</span><ul><li>2012</li><li>2h 45m</li></ul></div>',
+))
+BODY_END = b'</body>'
+KILOBYTE = 1024
+TABLE_ROW = '{0:42} {1:>8} {2:>10} {3:>10} {4:>8}'
+DEFAULT_BODY_KB = 800
+DEFAULT_REPEAT = 100
+
+
+def padded(page: bytes, body_kb: int) -> bytes:
+    """Add markup to the body of a recorded page.
+
+    Args:
+        page (bytes): The recorded page.
+        body_kb (int): Kilobytes of markup added.
+
+    Returns:
+        bytes: The page with a body of live size.
+    """
+    body = BODY_BLOCK * (body_kb * KILOBYTE // len(BODY_BLOCK))
+    if BODY_END not in page:
+        return page + body
+    return page.replace(BODY_END, body + BODY_END, 1)
+
+
+def median_ms(parse, page: bytes, repeat: int) -> float:
+    """Time a parser on a page.
+
+    Args:
+        parse (Callable): `scan_ld_json` or `parse_ld_json`.
+        page (bytes): The page.
+        repeat (int): Number of runs.
+
+    Returns:
+        float: Median milliseconds of a run.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(page)
+        timings.append(elapsed_ms(started))
+    return statistics.median(timings)
+
+
+def main(args: argparse.Namespace) -> None:
+    """Compare both parsers on every recorded page.
+
+    Args:
+        args (Namespace): Command line arguments.
+
+    Raises:
+        RuntimeError: The parsers decoded different payloads.
+    """
+    fixtures = pathlib.Path(os.environ.get('IMDB_FIXTURES_DIR', FIXTURES_DIR))
+    echo(TABLE_ROW.format('page', 'KB', 'full ms', 'scan ms', 'speedup'))
+    for body_path in sorted(fixtures.glob('*.body')):
+        page = padded(body_path.read_bytes(), args.body_kb)
+        if scan_ld_json(page) != parse_ld_json(page):
+            raise RuntimeError('{0}: the payloads differ'.format(body_path.name))
+        full = median_ms(parse_ld_json, page, args.repeat)
+        scan = median_ms(scan_ld_json, page, args.repeat)
+        size_kb = len(page) // KILOBYTE
+        speedup = '{0:.0f}x'.format(full / scan)
+        echo(TABLE_ROW.format(
+            body_path.stem, size_kb, round(full, 3), round(scan, 3), speedup,
+        ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--body-kb', type=int, default=DEFAULT_BODY_KB, help='kilobytes of markup added',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=DEFAULT_REPEAT, help='runs of each parser per page',
+    )
+    main(parser.parse_args())
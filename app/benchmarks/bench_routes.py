@@ -0,0 +1,348 @@
+"""Route-level benchmark of the web app.
+
+Seeds the synthetic catalog of `benchmarks.catalog`, then drives every
+route of the app in-process through the Flask test client with random
+ids, cursors, filters and search terms drawn from the catalog. For each
+route it reports the throughput, the p50/p95/p99 latency and the number
+of SQL statements per request, and saves the run as JSON, tagged with
+the current commit, so runs can be compared across commits.
+
+Requests are sent one at a time: the throughput is that of a single
+client, the latency excludes the network.
+
+Usage, from `app/` with the POSTGRES_* variables set:
+
+    python -m benchmarks.bench_routes --size 100k --requests 200 --keep
+    python -m benchmarks.bench_routes --reuse --cold  # same catalog, caches off
+    python -m benchmarks.bench_routes --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import random
+import subprocess
+import time
+
+from benchmarks import catalog, reporting, route_requests
+from db.pools import get_engine, get_session_maker
+from server import create_app
+
+PAGES_WALKED = 20
+RANDOM_SEED = 3
+ERROR_STATUS = 400
+PERCENT = 100
+CACHES = ('entity_cache', 'page_cache', 'autocomplete_cache')
+TABLE_ROW = '{0:20} {1:>8} {2:>8} {3:>8} {4:>8} {5:>6} {6:>6}'
+COMPARED_ROW = '{0:20} {1:>16} {2:>16} {3:>12}'
+DEFAULT_REQUESTS = 100
+DEFAULT_WARMUP = 5
+app = create_app()
+
+
+def walk_cursors(test_client, url: str) -> list:
+    """Follow the pages of a list.
+
+    Args:
+        test_client (FlaskClient): Client of the app.
+        url (str): URL of the list.
+
+    Returns:
+        list: The cursors of the first `PAGES_WALKED` pages, `None`
+        for the first one.
+    """
+    cursors = [None]
+    for _ in range(PAGES_WALKED):
+        query_string = {'format': 'json', 'after': cursors[-1] or ''}
+        found = test_client.get(url, query_string=query_string)
+        cursor = found.get_json()['next_cursor']
+        if cursor is None:
+            break
+        cursors.append(cursor)
+    return cursors
+
+
+def clear_caches() -> None:
+    """Empty the in-process caches of the app."""
+    for name in CACHES:
+        app.extensions[name].clear()
+
+
+def summary(method: str, timings: list[float], sql_counts: list[int], errors: int) -> dict:
+    """Summarize the timed requests of a route.
+
+    Args:
+        method (str): HTTP method of the route.
+        timings (list[float]): Latencies, in ms.
+        sql_counts (list[int]): Statements of each request.
+        errors (int): Number of error responses.
+
+    Returns:
+        dict: Throughput, latency percentiles and statement counts.
+    """
+    p50, p95, p99 = reporting.percentiles(timings)
+    seconds = sum(timings) / reporting.MILLISECONDS
+    return {
+        'method': method,
+        'requests': len(timings),
+        'errors': errors,
+        'throughput_rps': round(len(timings) / seconds, 1),
+        'p50_ms': round(p50, 2),
+        'p95_ms': round(p95, 2),
+        'p99_ms': round(p99, 2),
+        'sql_mean': round(sum(sql_counts) / len(sql_counts), 2),
+        'sql_max': max(sql_counts),
+    }
+
+
+def measure_route(
+    test_client,
+    route: route_requests.Route,
+    fixture: route_requests.Fixture,
+    rnd: random.Random,
+    args: argparse.Namespace,
+        ) -> dict:
+    """Send the warm-up and the timed requests of a route.
+
+    Args:
+        test_client (FlaskClient): Client of the app.
+        route (Route): The route.
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+        args (Namespace): Command line arguments.
+
+    Returns:
+        dict: The `summary` of the timed requests.
+    """
+    timings, sql_counts, errors = [], [], 0
+    with reporting.SQLCounter(get_engine()) as counter:
+        for num in range(args.warmup + args.requests):
+            path, kwargs = route_requests.request(route, fixture, rnd)
+            if args.cold:
+                clear_caches()
+            counter.statements = 0
+            started = time.perf_counter()
+            response = test_client.open(path, method=route.method, **kwargs)
+            response.get_data()
+            elapsed = reporting.elapsed_ms(started)
+            if num >= args.warmup:
+                timings.append(elapsed)
+                sql_counts.append(counter.statements)
+                errors += response.status_code >= ERROR_STATUS
+    return summary(route.method, timings, sql_counts, errors)
+
+
+def measure(fixture: route_requests.Fixture, args: argparse.Namespace) -> dict:
+    """Benchmark every route, one after the other.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        args (Namespace): Command line arguments.
+
+    Returns:
+        dict: The `summary` of each route, by name.
+    """
+    rnd = random.Random(RANDOM_SEED)
+    routes = {}
+    with app.test_client() as test_client:
+        fixture.cursors = {
+            'index': walk_cursors(test_client, '/'),
+            'actors': walk_cursors(test_client, '/actors'),
+        }
+        for route in route_requests.ROUTES:
+            routes[route.name] = measure_route(test_client, route, fixture, rnd, args)
+            echo_route(route.name, routes[route.name])
+    covered = {benchmarked.endpoint for benchmarked in route_requests.ROUTES}
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint not in covered | {'static'}:
+            reporting.echo('not benchmarked: {0}'.format(rule.rule))
+    return routes
+
+
+def echo_route(name: str, route: dict) -> None:
+    """Report the benchmark of a route.
+
+    Args:
+        name (str): Name of the route.
+        route (dict): Its `summary`.
+    """
+    reporting.echo(TABLE_ROW.format(
+        name, route['throughput_rps'], route['p50_ms'], route['p95_ms'], route['p99_ms'],
+        route['sql_mean'], route['errors'],
+    ))
+
+
+def git(*command: str) -> str:
+    """Run a git command in the working directory.
+
+    Args:
+        command (str): Arguments of git.
+
+    Returns:
+        str: Its output, stripped.
+    """
+    arguments = ('git', *command)
+    completed = subprocess.run(arguments, capture_output=True, text=True, check=True)
+    return completed.stdout.strip()
+
+
+def commit() -> str:
+    """Identify the benchmarked code.
+
+    Returns:
+        str: The short hash of `HEAD`, suffixed with `-dirty` if tracked
+        files have changes, or `unknown` outside of a git checkout.
+    """
+    try:
+        head = git('rev-parse', '--short', 'HEAD')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    dirty = git('status', '--porcelain', '--untracked-files=no')
+    return '{0}-dirty'.format(head) if dirty else head
+
+
+async def seed(session_maker, args: argparse.Namespace) -> None:
+    """Replace the seeded catalog with one of `args.size` movies.
+
+    Args:
+        session_maker (sessionmaker): Factory of the seeding sessions.
+        args (Namespace): Command line arguments.
+    """
+    movies = catalog.parse_size(args.size)
+    actors = args.actors or movies // 2
+    await catalog.cleanup(session_maker)
+    _seeded, elapsed = await reporting.timed(catalog.seed(session_maker, movies, actors))
+    reporting.echo('seeded in {0:.1f}s'.format(elapsed / reporting.MILLISECONDS))
+
+
+def save(args: argparse.Namespace, seeded: dict, routes: dict) -> None:
+    """Save a run as JSON.
+
+    Args:
+        args (Namespace): Command line arguments.
+        seeded (dict): Number of seeded movies and actors.
+        routes (dict): The `summary` of each route, by name.
+    """
+    run = {
+        'commit': commit(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'catalog': seeded,
+        'settings': {'requests': args.requests, 'warmup': args.warmup, 'cold': args.cold},
+        'routes': routes,
+    }
+    output = args.output or 'bench_routes-{0}.json'.format(run['commit'])
+    with open(output, 'w') as output_file:
+        json.dump(run, output_file, indent=2)
+    reporting.echo('saved {0}'.format(output))
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Seed the catalog, benchmark the routes and save the run.
+
+    Args:
+        args (Namespace): Command line arguments.
+    """
+    session_maker = get_session_maker()
+    if not args.reuse:
+        await seed(session_maker, args)
+    movies, actors = await catalog.seeded_size(session_maker)
+    doomed_count = args.requests + args.warmup
+    fixture = await route_requests.sample(session_maker, doomed_count)
+    await get_engine().dispose()
+    reporting.echo('{0} movies, {1} actors, {2} requests per route'.format(
+        movies, actors, args.requests,
+    ))
+    reporting.echo(TABLE_ROW.format(
+        'route', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'sql', 'errors',
+    ))
+    async with contextlib.AsyncExitStack() as stack:
+        stack.push_async_callback(get_engine().dispose)
+        if not (args.keep or args.reuse):
+            stack.push_async_callback(catalog.cleanup, session_maker)
+        routes = await asyncio.to_thread(measure, fixture, args)
+    save(args, {'movies': movies, 'actors': actors}, routes)
+
+
+def change(old: float, new: float) -> str:
+    """Describe the change of a measurement.
+
+    Args:
+        old (float): Measurement before.
+        new (float): Measurement after.
+
+    Returns:
+        str: The new value and its relative change.
+    """
+    if not old:
+        return str(new)
+    return '{0} ({1:+.0f}%)'.format(new, (new - old) / old * PERCENT)
+
+
+def load(path: str) -> dict:
+    """Read a saved run.
+
+    Args:
+        path (str): Path of the run.
+
+    Returns:
+        dict: The run.
+    """
+    with open(path) as run_file:
+        return json.load(run_file)
+
+
+def compare(before_path: str, after_path: str) -> None:
+    """Report the changes between two saved runs.
+
+    Args:
+        before_path (str): Path of the older run.
+        after_path (str): Path of the newer run.
+    """
+    before, after = load(before_path), load(after_path)
+    reporting.echo('{0} -> {1}'.format(before['commit'], after['commit']))
+    reporting.echo(COMPARED_ROW.format('route', 'req/s', 'p95 ms', 'sql'))
+    for name, route in after['routes'].items():
+        old = before['routes'].get(name)
+        if old is None:
+            continue
+        reporting.echo(COMPARED_ROW.format(
+            name,
+            change(old['throughput_rps'], route['throughput_rps']),
+            change(old['p95_ms'], route['p95_ms']),
+            '{0} -> {1}'.format(old['sql_mean'], route['sql_mean']),
+        ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--size', default=catalog.DEFAULT_SIZE,
+        help='number of movies: 1k, 10k, 100k, 1M or a count',
+    )
+    parser.add_argument('--actors', type=int, help='number of actors, half the movies by default')
+    parser.add_argument(
+        '--requests', type=int, default=DEFAULT_REQUESTS, help='timed requests per route',
+    )
+    parser.add_argument(
+        '--warmup', type=int, default=DEFAULT_WARMUP, help='untimed requests per route',
+    )
+    parser.add_argument(
+        '--cold', action='store_true', help='clear the in-process caches before each request',
+    )
+    parser.add_argument(
+        '--reuse', action='store_true', help='benchmark (and keep) the catalog of a previous run',
+    )
+    parser.add_argument(
+        '--keep', action='store_true', help='keep the seeded catalog for the next run',
+    )
+    parser.add_argument('--output', help='path of the JSON results')
+    parser.add_argument(
+        '--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two saved runs',
+    )
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,250 @@
+"""Benchmark of the full-text search.
+
+Seeds a synthetic catalog (movies and actors with generated names and
+descriptions), then times `/search` queries backed by the GIN-indexed
+tsvector columns against the equivalent `ILIKE '%term%'` scan.
+The seeded rows, whose ids start with `ttsearch` / `nmsearch` unlike
+any IMDb id, are removed afterwards.
+
+Usage, from `app/` with the POSTGRES_* variables set:
+
+    python -m benchmarks.bench_search --movies 80000 --actors 20000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import random
+
+from benchmarks.reporting import echo, percentiles, timed
+from db.models import Actor, Movie
+from db.pools import get_engine, get_session_maker
+from search import search_statement
+from sqlalchemy import (CompoundSelect, delete, literal, or_, select, text,
+                        union_all)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+WORDS = (
+    'night', 'river', 'ghost', 'empire', 'silver', 'winter', 'city', 'dream',
+    'storm', 'garden', 'shadow', 'king', 'queen', 'war', 'love', 'road',
+    'train', 'island', 'secret', 'fire', 'ocean', 'mountain', 'letter',
+    'stranger', 'detective', 'heist', 'revenge', 'family', 'summer',
+    'machine', 'planet', 'circus', 'orchestra', 'harbour',
+)
+SYLLABLES = (
+    'ka', 'lo', 'mi', 'ra', 'ven', 'tor', 'sel', 'dun', 'bri', 'ash', 'gal',
+    'mor', 'pen', 'quo', 'zet',
+)
+SYLLABLES_PER_WORD = (2, 4)
+VOCABULARY_SIZE = 20000
+QUERIES = (
+    'heist', 'ghost train', 'silver winter', '"last train"', 'detective -city',
+    'orchestra',
+)
+PAGE_SIZE = 20
+DEFAULT_MOVIES = 80000
+DEFAULT_ACTORS = 20000
+BATCH = 5000
+MOVIE_PREFIX = 'ttsearch'
+ACTOR_PREFIX = 'nmsearch'
+MOVIE_ID = '{0}{{0:07d}}'.format(MOVIE_PREFIX)
+ACTOR_ID = '{0}{{0:07d}}'.format(ACTOR_PREFIX)
+TITLE_WORDS = 3
+NAME_WORDS = 2
+DESCRIPTION_WORDS = 20
+BIRTH_DATE = datetime.date.fromisoformat('1970-01-01')
+
+
+def vocabulary(rnd: random.Random) -> tuple[list[str], list[float]]:
+    """Generate the words of the synthetic names and descriptions.
+
+    Args:
+        rnd (Random): Source of randomness.
+
+    Returns:
+        tuple[list[str], list[float]]: The words and their weights.
+    """
+    words = list(WORDS)
+    while len(words) < VOCABULARY_SIZE:
+        syllables = range(rnd.randint(*SYLLABLES_PER_WORD))
+        words.append(''.join(rnd.choice(SYLLABLES) for _ in syllables))
+    # Zipf-like frequencies: a few words are everywhere, most are rare.
+    ranks = range(1, len(words) + 1)
+    return words, [1 / rank for rank in ranks]
+
+
+def sentence(rnd: random.Random, words: int) -> str:
+    """Draw a sentence from the vocabulary of `rnd`.
+
+    Args:
+        rnd (Random): Source of randomness with a `vocabulary`.
+        words (int): Number of words.
+
+    Returns:
+        str: The words, separated by spaces.
+    """
+    return ' '.join(rnd.choices(*rnd.vocabulary, k=words))
+
+
+def movie_rows(rnd: random.Random, count: int) -> list[dict]:
+    """Generate synthetic movies.
+
+    Args:
+        rnd (Random): Source of randomness with a `vocabulary`.
+        count (int): Number of movies.
+
+    Returns:
+        list[dict]: Column values of the movies.
+    """
+    return [
+        {
+            'id': MOVIE_ID.format(num),
+            'movie_name': sentence(rnd, TITLE_WORDS).title(),
+            'url': '', 'poster': '', 'rating': 1.0,
+            'description': sentence(rnd, DESCRIPTION_WORDS),
+        }
+        for num in range(count)
+    ]
+
+
+def actor_rows(rnd: random.Random, count: int) -> list[dict]:
+    """Generate synthetic actors.
+
+    Args:
+        rnd (Random): Source of randomness with a `vocabulary`.
+        count (int): Number of actors.
+
+    Returns:
+        list[dict]: Column values of the actors.
+    """
+    return [
+        {
+            'id': ACTOR_ID.format(num),
+            'actor_name': sentence(rnd, NAME_WORDS).title(),
+            'image': '', 'url': '', 'description': sentence(rnd, DESCRIPTION_WORDS),
+            'birth_date': BIRTH_DATE,
+        }
+        for num in range(count)
+    ]
+
+
+async def seed(
+    session_maker: async_sessionmaker[AsyncSession],
+    args: argparse.Namespace,
+        ) -> None:
+    """Seed `args.movies` movies and `args.actors` actors.
+
+    The rows left by an interrupted run are removed first.
+
+    Args:
+        session_maker (sessionmaker): Factory of the seeding session.
+        args (Namespace): Command line arguments.
+    """
+    rnd = random.Random(7)
+    rnd.vocabulary = vocabulary(rnd)
+    movies = movie_rows(rnd, args.movies)
+    actors = actor_rows(rnd, args.actors)
+    await cleanup(session_maker)
+    async with session_maker() as session:
+        async with session.begin():
+            for model, rows in ((Movie, movies), (Actor, actors)):
+                for start in range(0, len(rows), BATCH):
+                    batch = rows[start:start + BATCH]
+                    await session.execute(pg_insert(model), batch)
+        await session.execute(text('ANALYZE movie, actor'))
+
+
+async def cleanup(session_maker: async_sessionmaker[AsyncSession]) -> None:
+    """Remove the seeded movies and actors.
+
+    Args:
+        session_maker (sessionmaker): Factory of the cleanup session.
+    """
+    async with session_maker() as session:
+        async with session.begin():
+            seeded_movies = Movie.id.startswith(MOVIE_PREFIX)
+            await session.execute(delete(Movie).where(seeded_movies))
+            seeded_actors = Actor.id.startswith(ACTOR_PREFIX)
+            await session.execute(delete(Actor).where(seeded_actors))
+
+
+def ilike_statement(terms: str, limit: int) -> CompoundSelect:
+    """Build the `ILIKE` scan equivalent to a search.
+
+    Args:
+        terms (str): Searched words, in the `/search` syntax.
+        limit (int): Maximum number of results.
+
+    Returns:
+        CompoundSelect: Movies and actors containing every word.
+    """
+    words = [word for word in terms.split() if not word.startswith('-')]
+    patterns = ['%{0}%'.format(word.strip('"')) for word in words]
+    movies = select(literal('movie'), Movie.id, Movie.movie_name)
+    movies = movies.where(*[
+        or_(Movie.movie_name.ilike(pattern), Movie.description.ilike(pattern))
+        for pattern in patterns
+    ])
+    actors = select(literal('actor'), Actor.id, Actor.actor_name)
+    actors = actors.where(*[
+        or_(Actor.actor_name.ilike(pattern), Actor.description.ilike(pattern))
+        for pattern in patterns
+    ])
+    return union_all(movies, actors).order_by('id').limit(limit)
+
+
+async def time_queries(
+    session_maker: async_sessionmaker[AsyncSession],
+    build,
+    rounds: int,
+        ) -> tuple[float, float]:
+    """Time the `QUERIES`.
+
+    Args:
+        session_maker (sessionmaker): Factory of the querying session.
+        build (Callable): Builds the statement of a query.
+        rounds (int): Number of times each query is run.
+
+    Returns:
+        tuple[float, float]: The median and the 95th percentile, in ms.
+    """
+    timings = []
+    async with session_maker() as session:
+        for _ in range(rounds):
+            for terms in QUERIES:
+                statement = build(terms, PAGE_SIZE)
+                query, elapsed = await timed(session.execute(statement))
+                query.all()
+                timings.append(elapsed)
+    p50, p95, _p99 = percentiles(timings)
+    return p50, p95
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Seed the catalog, compare the searches and clean up.
+
+    Args:
+        args (Namespace): Command line arguments.
+    """
+    session_maker = get_session_maker()
+    async with contextlib.AsyncExitStack() as stack:
+        stack.push_async_callback(get_engine().dispose)
+        stack.push_async_callback(cleanup, session_maker)
+        _seeded, elapsed = await timed(seed(session_maker, args))
+        echo('seeded {0} movies and {1} actors in {2:.0f} ms'.format(
+            args.movies, args.actors, elapsed,
+        ))
+        echo('{0:10} {1:>8} {2:>8}'.format('query', 'p50 ms', 'p95 ms'))
+        for name, build in (('tsvector', search_statement), ('ilike', ilike_statement)):
+            timings = await time_queries(session_maker, build, args.rounds)
+            echo('{0:10} {1:>8.2f} {2:>8.2f}'.format(name, *timings))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=DEFAULT_MOVIES)
+    parser.add_argument('--actors', type=int, default=DEFAULT_ACTORS)
+    parser.add_argument('--rounds', type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
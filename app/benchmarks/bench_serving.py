@@ -0,0 +1,232 @@
+"""Serving benchmark of the web app.
+
+Seeds the synthetic catalog of `benchmarks.catalog`, then serves the app
+with gunicorn in a subprocess, once per mode:
+
+- `wsgi`: sync workers, as in the Dockerfile, each coroutine of a request
+  running in a new event loop;
+- `asgi`: uvicorn workers (`asgi.py`), one long-lived event loop per worker.
+
+Both modes get the same number of workers, with the in-process caches
+off so every request reaches the database. Concurrent clients send
+detail, browse, search and autocomplete requests drawn from the catalog
+over HTTP; the throughput and p50/p95/p99 latency of each mode are
+reported for each number of clients.
+
+Usage, from `app/` with the POSTGRES_* variables set:
+
+    python -m benchmarks.bench_serving --size 10k --clients 1 8 32 --requests 1000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Iterator
+
+import httpx
+from benchmarks import catalog, reporting, route_requests
+from db.pools import get_engine, get_session_maker
+
+# gunicorn arguments serving the app in each mode
+MODES = (
+    ('wsgi', ('server:create_app()',)),
+    ('asgi', ('asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker')),
+)
+MODE_NAMES = tuple(name for name, _ in MODES)
+ROUTES = ('detail', 'actor', 'browse', 'search', 'autocomplete')
+CACHES_OFF = (
+    ('ENTITY_CACHE_SIZE', '0'), ('PAGE_CACHE_SIZE', '0'), ('AUTOCOMPLETE_CACHE_SIZE', '0'),
+)
+RANDOM_SEED = 5
+PORT = 8765
+STARTUP_TIMEOUT = 30
+STARTUP_POLL = 0.2
+ERROR_STATUS = 400
+TABLE_ROW = '{0:6} {1:>8} {2:>8} {3:>8} {4:>8} {5:>8} {6:>6}'
+DEFAULT_WORKERS = 4
+DEFAULT_REQUESTS = 500
+DEFAULT_CLIENTS = (1, 8, 32)
+
+
+def draw_requests(fixture: route_requests.Fixture, count: int) -> list[tuple[str, dict]]:
+    """Draw requests to the benchmarked routes, round robin.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        count (int): Number of requests.
+
+    Returns:
+        list[tuple[str, dict]]: Path and query string of each request.
+    """
+    rnd = random.Random(RANDOM_SEED)
+    routes = [route for route in route_requests.ROUTES if route.name in ROUTES]
+    drawn = []
+    for num in range(count):
+        route = routes[num % len(routes)]
+        path, kwargs = route_requests.request(route, fixture, rnd)
+        drawn.append((path, kwargs.get('query_string', {})))
+    return drawn
+
+
+async def wait_until_up(client: httpx.AsyncClient, server: subprocess.Popen) -> None:
+    """Wait for a server to answer.
+
+    Args:
+        client (AsyncClient): Client of the server.
+        server (Popen): The server process.
+
+    Raises:
+        RuntimeError: The server exited or did not answer in time.
+    """
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('the server exited with {0}'.format(server.returncode))
+        with contextlib.suppress(httpx.TransportError):
+            await client.get('/pool_stats')
+            return
+        await asyncio.sleep(STARTUP_POLL)
+    raise RuntimeError('the server did not start in {0}s'.format(STARTUP_TIMEOUT))
+
+
+async def serve_client(
+    client: httpx.AsyncClient, pending: Iterator, timings: list, errors: list,
+        ) -> None:
+    """Send requests one after the other until none is left.
+
+    Args:
+        client (AsyncClient): Client of the server.
+        pending (Iterator):
+        Path and query string of the requests left, shared by the clients.
+        timings (list): Milliseconds each request took, appended to.
+        errors (list): Paths of the failed requests, appended to.
+    """
+    for path, query_string in pending:
+        try:
+            response, elapsed = await reporting.timed(client.get(path, params=query_string))
+        except httpx.TransportError:
+            errors.append(path)
+            continue
+        timings.append(elapsed)
+        if response.status_code >= ERROR_STATUS:
+            errors.append(path)
+
+
+async def drive(client: httpx.AsyncClient, drawn: list, clients: int) -> dict:
+    """Send requests from concurrent clients.
+
+    Args:
+        client (AsyncClient): Client of the server.
+        drawn (list): Path and query string of the requests.
+        clients (int): Number of concurrent clients.
+
+    Returns:
+        dict: Throughput, latency percentiles and errors.
+    """
+    pending = iter(drawn)
+    timings = []
+    errors = []
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        serve_client(client, pending, timings, errors) for _ in range(clients)
+    ])
+    total_ms = reporting.elapsed_ms(started)
+    p50, p95, p99 = reporting.percentiles(timings)
+    return {
+        'throughput_rps': round(len(timings) / total_ms * reporting.MILLISECONDS, 1),
+        'p50_ms': round(p50, 2),
+        'p95_ms': round(p95, 2),
+        'p99_ms': round(p99, 2),
+        'errors': len(errors),
+    }
+
+
+async def measure_mode(mode: str, drawn: list, args: argparse.Namespace) -> None:
+    """Serve the app in a mode and report each number of clients.
+
+    Args:
+        mode (str): `wsgi` or `asgi`.
+        drawn (list): Path and query string of the requests.
+        args (Namespace): Command line arguments.
+    """
+    command = (
+        sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:{0}'.format(PORT),
+        '--workers', str(args.workers), *dict(MODES)[mode],
+    )
+    limits = httpx.Limits(max_connections=max(args.clients))
+    base_url = 'http://127.0.0.1:{0}'.format(PORT)
+    warmup = drawn[:args.workers * len(ROUTES)]
+    async with contextlib.AsyncExitStack() as stack:
+        server = stack.enter_context(subprocess.Popen(
+            command, env={**os.environ, **dict(CACHES_OFF)}, stderr=subprocess.DEVNULL,
+        ))
+        stack.callback(server.terminate)
+        client = await stack.enter_async_context(
+            httpx.AsyncClient(base_url=base_url, limits=limits),
+            )
+        await wait_until_up(client, server)
+        await drive(client, warmup, args.workers)
+        for clients in args.clients:
+            measured = await drive(client, drawn, clients)
+            reporting.echo(TABLE_ROW.format(
+                mode, clients, measured['throughput_rps'], measured['p50_ms'],
+                measured['p95_ms'], measured['p99_ms'], measured['errors'],
+            ))
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Seed the catalog and benchmark each serving mode.
+
+    Args:
+        args (Namespace): Command line arguments.
+    """
+    session_maker = get_session_maker()
+    async with contextlib.AsyncExitStack() as stack:
+        stack.push_async_callback(get_engine().dispose)
+        if not (args.keep or args.reuse):
+            stack.push_async_callback(catalog.cleanup, session_maker)
+        if not args.reuse:
+            await catalog.cleanup(session_maker)
+            movies = catalog.parse_size(args.size)
+            await catalog.seed(session_maker, movies, movies // 2)
+        fixture = await route_requests.sample(session_maker, 0)
+        drawn = draw_requests(fixture, args.requests)
+        reporting.echo('{0} requests, {1} workers per mode'.format(args.requests, args.workers))
+        reporting.echo(TABLE_ROW.format(
+            'mode', 'clients', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors',
+        ))
+        for mode in args.modes:
+            await measure_mode(mode, drawn, args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--size', default=catalog.DEFAULT_SIZE,
+        help='number of movies: 1k, 10k, 100k, 1M or a count',
+    )
+    parser.add_argument(
+        '--requests', type=int, default=DEFAULT_REQUESTS, help='requests per measurement',
+    )
+    parser.add_argument(
+        '--clients', type=int, nargs='+', default=DEFAULT_CLIENTS,
+        help='numbers of concurrent clients',
+    )
+    parser.add_argument(
+        '--workers', type=int, default=DEFAULT_WORKERS, help='server processes per mode',
+    )
+    parser.add_argument(
+        '--modes', nargs='+', choices=MODE_NAMES, default=MODE_NAMES, help='serving modes',
+    )
+    parser.add_argument(
+        '--reuse', action='store_true', help='benchmark (and keep) the catalog of a previous run',
+    )
+    parser.add_argument(
+        '--keep', action='store_true', help='keep the seeded catalog for the next run',
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,180 @@
+"""Startup benchmark of the web server.
+
+Serves `server:create_app()` with gunicorn in a subprocess, once per mode:
+
+- `fork`: each worker imports the app and creates it after the fork;
+- `preload`: the master creates the app once (`--preload`) and the
+  workers share its memory pages until they write to them.
+
+For each mode, reports the time to the first response and, after a few
+requests to every worker, the resident (RSS) and private (USS) memory
+of the workers, read from `/proc/<pid>/smaps_rollup` (Linux only).
+Also reports how long `import server` takes in a fresh interpreter.
+
+Usage, from `app/` with the POSTGRES_* variables set:
+
+    python -m benchmarks.bench_startup --workers 4
+"""
+
+import argparse
+import asyncio
+import contextlib
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from benchmarks import bench_serving, reporting
+
+# gunicorn arguments of each mode
+MODES = (
+    ('fork', ()),
+    ('preload', ('--preload',)),
+)
+MODE_NAMES = tuple(name for name, _ in MODES)
+WARMUP_PATHS = ('/', '/actors', '/stats', '/browse', '/search?q=the')
+PRIVATE_FIELDS = ('Private_Clean', 'Private_Dirty')
+KILOBYTES = 1024
+TABLE_ROW = '{0:8} {1:>10} {2:>10} {3:>10} {4:>12}'
+DEFAULT_WORKERS = 4
+DEFAULT_REQUESTS = 200
+DEFAULT_IMPORTS = 5
+
+
+def import_ms(repeat: int) -> float:
+    """Time `import server` in fresh interpreters.
+
+    Args:
+        repeat (int): Number of interpreters started, the fastest counts.
+
+    Returns:
+        float: Milliseconds of the import, interpreter startup excluded.
+    """
+    timings = {}
+    for code in ('pass', 'import server'):
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run((sys.executable, '-c', code), check=True)
+            runs.append(reporting.elapsed_ms(started))
+        timings[code] = min(runs)
+    return timings['import server'] - timings['pass']
+
+
+def worker_pids(master: int) -> list[int]:
+    """List the worker processes of a gunicorn master.
+
+    Args:
+        master (int): Process id of the master.
+
+    Returns:
+        list[int]: Process ids of its children.
+    """
+    children = pathlib.Path('/proc/{0}/task/{0}/children'.format(master))
+    return [int(pid) for pid in children.read_text().split()]
+
+
+def memory_mb(pid: int) -> tuple[float, float]:
+    """Read the memory of a process.
+
+    Args:
+        pid (int): Process id.
+
+    Returns:
+        tuple[float, float]: Resident and private megabytes.
+    """
+    fields = {}
+    for line in pathlib.Path('/proc/{0}/smaps_rollup'.format(pid)).read_text().splitlines():
+        name, _, amount = line.partition(':')
+        if amount.strip().endswith('kB'):
+            fields[name] = int(amount.split()[0])
+    private = sum(fields[name] for name in PRIVATE_FIELDS)
+    return fields['Rss'] / KILOBYTES, private / KILOBYTES
+
+
+async def wait_for_workers(server: subprocess.Popen, workers: int) -> list[int]:
+    """Wait until the master has forked all its workers.
+
+    Args:
+        server (Popen): The gunicorn master.
+        workers (int): Number of workers expected.
+
+    Raises:
+        RuntimeError: The workers did not start in time.
+
+    Returns:
+        list[int]: Process ids of the workers.
+    """
+    deadline = time.monotonic() + bench_serving.STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        pids = worker_pids(server.pid)
+        if len(pids) == workers:
+            return pids
+        await asyncio.sleep(bench_serving.STARTUP_POLL)
+    raise RuntimeError('the workers did not start in {0}s'.format(
+        bench_serving.STARTUP_TIMEOUT,
+    ))
+
+
+async def measure_mode(mode: str, args: argparse.Namespace) -> None:
+    """Start the server in a mode and report its startup and memory.
+
+    Args:
+        mode (str): `fork` or `preload`.
+        args (Namespace): Command line arguments.
+    """
+    command = (
+        sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:{0}'.format(bench_serving.PORT),
+        '--workers', str(args.workers), *dict(MODES)[mode], 'server:create_app()',
+    )
+    base_url = 'http://127.0.0.1:{0}'.format(bench_serving.PORT)
+    async with contextlib.AsyncExitStack() as stack:
+        started = time.perf_counter()
+        server = stack.enter_context(subprocess.Popen(command, stderr=subprocess.DEVNULL))
+        stack.callback(server.terminate)
+        client = await stack.enter_async_context(httpx.AsyncClient(base_url=base_url))
+        await bench_serving.wait_until_up(client, server)
+        first_response = reporting.elapsed_ms(started)
+        pids = await wait_for_workers(server, args.workers)
+        for num in range(args.requests):
+            await client.get(WARMUP_PATHS[num % len(WARMUP_PATHS)])
+        rss, private = zip(*(memory_mb(pid) for pid in pids))
+        reporting.echo(TABLE_ROW.format(
+            mode, round(first_response), round(statistics.mean(rss), 1),
+            round(statistics.mean(private), 1), round(sum(private), 1),
+        ))
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Report the import time and benchmark each mode.
+
+    Args:
+        args (Namespace): Command line arguments.
+    """
+    imported = await asyncio.to_thread(import_ms, args.imports)
+    reporting.echo('import server: {0:.0f} ms'.format(imported))
+    reporting.echo('{0} workers, {1} requests'.format(args.workers, args.requests))
+    reporting.echo(TABLE_ROW.format(
+        'mode', 'first ms', 'RSS MB', 'USS MB', 'USS total MB',
+    ))
+    for mode in args.modes:
+        await measure_mode(mode, args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--workers', type=int, default=DEFAULT_WORKERS, help='server processes per mode',
+    )
+    parser.add_argument(
+        '--requests', type=int, default=DEFAULT_REQUESTS, help='requests before measuring',
+    )
+    parser.add_argument(
+        '--imports', type=int, default=DEFAULT_IMPORTS, help='interpreters timing the import',
+    )
+    parser.add_argument(
+        '--modes', nargs='+', choices=MODE_NAMES, default=MODE_NAMES, help='startup modes',
+    )
+    asyncio.run(main(parser.parse_args()))
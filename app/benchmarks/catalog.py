@@ -0,0 +1,287 @@
+"""Synthetic catalog for the route benchmarks.
+
+Seeds movies, actors, genres and their links with a realistic shape:
+ratings around 6.5, one to three genres per movie with a few dominant
+genres, casts of 4 to 15 actors drawn from a Zipf-like pool (a few actors
+appear in hundreds of movies, most in one or two) and creation dates
+spread over ten years. Seeded ids start with `ttbench` / `nmbench`, which
+no IMDb id does, so the rows are removed without touching imported ones.
+Rows are written by batches with the `COPY` loader of `db.bulk_load`.
+
+Usage, from `app/` with the POSTGRES_* variables set:
+
+    python -m benchmarks.catalog seed --size 100k
+    python -m benchmarks.catalog cleanup
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import itertools
+import random
+
+from benchmarks import bench_search, reporting
+from db.bulk_load import load_catalog
+from db.models import Actor, IngestJob, Movie, MovieActor, MovieGenre
+from db.pools import get_engine, get_session_maker
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+SIZES = (
+    ('1k', 1000), ('10k', 10000), ('100k', 100000), ('1M', 1000000),
+)
+# Genre names and their relative frequencies.
+GENRES = (
+    ('Drama', 45), ('Comedy', 30), ('Thriller', 15), ('Action', 15),
+    ('Romance', 12), ('Crime', 12), ('Horror', 10), ('Adventure', 8),
+    ('Documentary', 8), ('Mystery', 6), ('Family', 5), ('Fantasy', 5),
+    ('Sci-Fi', 5), ('Biography', 4), ('History', 3), ('Animation', 3),
+    ('Music', 2), ('War', 2), ('Sport', 2), ('Western', 1),
+)
+GENRE_NAMES = tuple(name for name, _frequency in GENRES)
+MOVIE_PREFIX = 'ttbench'
+ACTOR_PREFIX = 'nmbench'
+MOVIE_ID = '{0}{{0:07d}}'.format(MOVIE_PREFIX)
+ACTOR_ID = '{0}{{0:07d}}'.format(ACTOR_PREFIX)
+GENRES_PER_MOVIE = (1, 3)
+CAST_SIZE = (4, 15)
+TITLE_WORDS = (1, 4)
+NAME_WORDS = 2
+DESCRIPTION_WORDS = 20
+RATING_MEAN = 6.5
+RATING_DEVIATION = 1.2
+RATING_RANGE = (1, 10)
+ACTOR_POPULARITY = 0.8
+OLDEST_BIRTH = datetime.date.fromisoformat('1930-01-01')
+BIRTH_DAYS = 25000
+DAYS = 3650
+BATCH = 20000
+RANDOM_SEED = 15
+DEFAULT_SIZE = '10k'
+ANALYZED = (
+    'movie', 'actor', 'genre', 'movie_genre', 'movie_actor', 'genre_stats',
+    'actor_stats',
+)
+
+
+def parse_size(size: str) -> int:
+    """Read a catalog size.
+
+    Args:
+        size (str): One of `SIZES` or a number of movies.
+
+    Returns:
+        int: Number of movies.
+    """
+    return dict(SIZES).get(size) or int(size)
+
+
+def rating(rnd: random.Random) -> float:
+    """Draw a movie rating.
+
+    Args:
+        rnd (Random): Source of randomness.
+
+    Returns:
+        float: Rating between 1 and 10, with one decimal.
+    """
+    lowest, highest = RATING_RANGE
+    drawn = rnd.gauss(RATING_MEAN, RATING_DEVIATION)
+    return round(min(highest, max(lowest, drawn)), 1)
+
+
+def created(rnd: random.Random, now: datetime.datetime) -> datetime.datetime:
+    """Draw a creation date of the last `DAYS` days.
+
+    Args:
+        rnd (Random): Source of randomness.
+        now (datetime): Newest date.
+
+    Returns:
+        datetime: The date.
+    """
+    return now - datetime.timedelta(days=rnd.randrange(DAYS))
+
+
+def movie_rows(rnd: random.Random, nums: range, now: datetime.datetime) -> list[dict]:
+    """Generate synthetic movies.
+
+    Args:
+        rnd (Random): Source of randomness with a `vocabulary`.
+        nums (range): Numbers of the movies.
+        now (datetime): Newest creation date.
+
+    Returns:
+        list[dict]: Column values of the movies.
+    """
+    return [
+        {
+            'id': MOVIE_ID.format(num),
+            'movie_name': bench_search.sentence(rnd, rnd.randint(*TITLE_WORDS)).title(),
+            'url': '',
+            'poster': '',
+            'description': bench_search.sentence(rnd, DESCRIPTION_WORDS),
+            'rating': rating(rnd),
+            'created': created(rnd, now),
+        }
+        for num in nums
+    ]
+
+
+def actor_rows(rnd: random.Random, nums: range, now: datetime.datetime) -> list[dict]:
+    """Generate synthetic actors.
+
+    Args:
+        rnd (Random): Source of randomness with a `vocabulary`.
+        nums (range): Numbers of the actors.
+        now (datetime): Newest creation date.
+
+    Returns:
+        list[dict]: Column values of the actors.
+    """
+    return [
+        {
+            'id': ACTOR_ID.format(num),
+            'actor_name': bench_search.sentence(rnd, NAME_WORDS).title(),
+            'image': '',
+            'url': '',
+            'description': bench_search.sentence(rnd, DESCRIPTION_WORDS),
+            'birth_date': OLDEST_BIRTH + datetime.timedelta(days=rnd.randrange(BIRTH_DAYS)),
+            'created': created(rnd, now),
+        }
+        for num in nums
+    ]
+
+
+def links(
+    rnd: random.Random,
+    movie_ids: list[str],
+    actor_weights: list[float],
+        ) -> tuple[list[dict], list[dict]]:
+    """Draw the genres and the cast of movies.
+
+    Args:
+        rnd (Random): Source of randomness.
+        movie_ids (list[str]): Ids of the movies.
+        actor_weights (list[float]): Cumulated weights of the actors.
+
+    Returns:
+        tuple[list[dict], list[dict]]: Rows of `movie_genre`
+        and of `movie_actor`.
+    """
+    genre_weights = list(itertools.accumulate(frequency for _name, frequency in GENRES))
+    actor_nums = range(len(actor_weights))
+    genre_links, cast_links = [], []
+    for movie_id in movie_ids:
+        genre_count = rnd.randint(*GENRES_PER_MOVIE)
+        names = set(rnd.choices(GENRE_NAMES, cum_weights=genre_weights, k=genre_count))
+        genre_links.extend(
+            {'movie_id': movie_id, 'genre_name': name} for name in names
+        )
+        cast_size = rnd.randint(*CAST_SIZE)
+        cast = set(rnd.choices(actor_nums, cum_weights=actor_weights, k=cast_size))
+        cast_links.extend(
+            {'movie_id': movie_id, 'actor_id': ACTOR_ID.format(num)} for num in cast
+        )
+    return genre_links, cast_links
+
+
+async def seed(
+    session_maker: async_sessionmaker[AsyncSession],
+    movies: int,
+    actors: int,
+    rnd_seed: int = RANDOM_SEED,
+        ) -> None:
+    """Seed `movies` movies and `actors` actors.
+
+    Args:
+        session_maker (sessionmaker): Factory of the seeding sessions.
+        movies (int): Number of movies.
+        actors (int): Number of actors.
+        rnd_seed (int): Seed of the random generator.
+    """
+    rnd = random.Random(rnd_seed)
+    rnd.vocabulary = bench_search.vocabulary(rnd)
+    now = datetime.datetime.now()
+    for first_actor in range(0, actors, BATCH):
+        nums = range(first_actor, min(first_actor + BATCH, actors))
+        await load_catalog(session_maker, {'actors': actor_rows(rnd, nums, now)})
+    ranks = range(1, actors + 1)
+    popularity = (1 / rank ** ACTOR_POPULARITY for rank in ranks)
+    actor_weights = list(itertools.accumulate(popularity))
+    for first_movie in range(0, movies, BATCH):
+        nums = range(first_movie, min(first_movie + BATCH, movies))
+        rows = movie_rows(rnd, nums, now)
+        movie_ids = [row['id'] for row in rows]
+        genre_links, cast_links = links(rnd, movie_ids, actor_weights)
+        await load_catalog(session_maker, {
+            'movies': rows, 'movie_genre': genre_links, 'movie_actor': cast_links,
+        })
+    async with session_maker() as session:
+        await session.execute(text('ANALYZE {0}'.format(', '.join(ANALYZED))))
+
+
+async def seeded_size(session_maker: async_sessionmaker[AsyncSession]) -> tuple[int, int]:
+    """Count the seeded rows.
+
+    Args:
+        session_maker (sessionmaker): Factory of the counting session.
+
+    Returns:
+        tuple[int, int]: Number of seeded movies and actors.
+    """
+    seeded_movies = Movie.id.startswith(MOVIE_PREFIX)
+    seeded_actors = Actor.id.startswith(ACTOR_PREFIX)
+    async with session_maker() as session:
+        movies = await session.scalar(select(func.count()).where(seeded_movies))
+        actors = await session.scalar(select(func.count()).where(seeded_actors))
+    return movies, actors
+
+
+async def cleanup(session_maker: async_sessionmaker[AsyncSession]) -> None:
+    """Remove the seeded rows and the jobs queued for them.
+
+    Args:
+        session_maker (sessionmaker): Factory of the cleanup session.
+    """
+    seeded = (
+        (IngestJob, IngestJob.imdb_id.startswith(MOVIE_PREFIX)),
+        (MovieActor, MovieActor.movie_id.startswith(MOVIE_PREFIX)),
+        (MovieGenre, MovieGenre.movie_id.startswith(MOVIE_PREFIX)),
+        (Movie, Movie.id.startswith(MOVIE_PREFIX)),
+        (Actor, Actor.id.startswith(ACTOR_PREFIX)),
+    )
+    async with session_maker() as session:
+        async with session.begin():
+            for model, condition in seeded:
+                await session.execute(delete(model).where(condition))
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Remove the seeded catalog, and seed a new one.
+
+    Args:
+        args (Namespace): Command line arguments.
+    """
+    session_maker = get_session_maker()
+    async with contextlib.AsyncExitStack() as stack:
+        stack.push_async_callback(get_engine().dispose)
+        await cleanup(session_maker)
+        if args.command == 'seed':
+            movies = parse_size(args.size)
+            actors = args.actors or movies // 2
+            _seeded, elapsed = await reporting.timed(seed(session_maker, movies, actors))
+            reporting.echo('seeded {0} movies and {1} actors in {2:.0f} ms'.format(
+                movies, actors, elapsed,
+            ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('seed', 'cleanup'))
+    parser.add_argument(
+        '--size', default=DEFAULT_SIZE, help='number of movies: 1k, 10k, 100k, 1M or a count',
+    )
+    parser.add_argument('--actors', type=int, help='number of actors, half the movies by default')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,126 @@
+"""Measurements and console reports shared by the benchmarks."""
+import statistics
+import sys
+import time
+from typing import Any, Awaitable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+MILLISECONDS = 1000
+P95 = 0.95
+P99 = 0.99
+
+
+def echo(line: str) -> None:
+    """Write a line of the report to the standard output.
+
+    Args:
+        line (str): Line without its end.
+    """
+    sys.stdout.write('{0}\n'.format(line))
+
+
+def elapsed_ms(started: float) -> float:
+    """Measure the time elapsed since `started`.
+
+    Args:
+        started (float): A `time.perf_counter()` reading.
+
+    Returns:
+        float: Milliseconds since then.
+    """
+    return (time.perf_counter() - started) * MILLISECONDS
+
+
+async def timed(awaitable: Awaitable) -> tuple[Any, float]:
+    """Await and time an awaitable.
+
+    Args:
+        awaitable (Awaitable): Coroutine or future to time.
+
+    Returns:
+        tuple[Any, float]: Its result and the milliseconds it took.
+    """
+    started = time.perf_counter()
+    awaited = await awaitable
+    return awaited, elapsed_ms(started)
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """Pick a percentile of sorted timings.
+
+    Args:
+        ordered (list[float]): Timings, smallest first.
+        fraction (float): Percentile, between 0 and 1.
+
+    Returns:
+        float: The timing of the percentile.
+    """
+    return ordered[int(len(ordered) * fraction) - 1]
+
+
+def percentiles(timings: list[float]) -> tuple[float, float, float]:
+    """Summarize timings.
+
+    Args:
+        timings (list[float]): Timings, in any order.
+
+    Returns:
+        tuple[float, float, float]: The median, the 95th
+        and the 99th percentile.
+    """
+    ordered = sorted(timings)
+    return statistics.median(ordered), percentile(ordered, P95), percentile(ordered, P99)
+
+
+class SQLCounter(object):
+    """Counter of the statements and commits of an engine.
+
+    Counts while used as a context manager.
+    """
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        """Initialize the counter with zero counts.
+
+        Args:
+            engine (AsyncEngine): The engine observed.
+        """
+        self.sync_engine = engine.sync_engine
+        self.statements = 0
+        self.commits = 0
+
+    def __enter__(self) -> 'SQLCounter':
+        """Start counting.
+
+        Returns:
+            SQLCounter: The counter.
+        """
+        event.listen(self.sync_engine, 'before_cursor_execute', self.count_statement)
+        event.listen(self.sync_engine, 'commit', self.count_commit)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop counting.
+
+        Args:
+            exc_info (tuple): Exception raised in the block, if any.
+        """
+        event.remove(self.sync_engine, 'before_cursor_execute', self.count_statement)
+        event.remove(self.sync_engine, 'commit', self.count_commit)
+
+    def count_statement(self, *_args) -> None:
+        """Count a statement.
+
+        Args:
+            _args (tuple): Arguments of the engine event.
+        """
+        self.statements += 1
+
+    def count_commit(self, *_args) -> None:
+        """Count a commit.
+
+        Args:
+            _args (tuple): Arguments of the engine event.
+        """
+        self.commits += 1
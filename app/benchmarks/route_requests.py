@@ -0,0 +1,273 @@
+"""Requests of the route benchmark.
+
+Every route of the app is listed in `ROUTES` with the way to build a
+random request to it from a `Fixture`, a sample of the seeded catalog.
+"""
+
+import datetime
+import functools
+import random
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from benchmarks import catalog
+from benchmarks.bench_search import WORDS
+from db.ingest_queue import enqueue
+from db.models import Actor, Genre, Movie
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+SAMPLE = 2000
+JOBS = 10
+EXPORTED_DAYS = 30
+MIN_RATINGS = (None, 5, 6, 7, 8)
+RATING_SPAN = 2
+SEARCHED_WORDS = (1, 2)
+TYPED_LENGTHS = (2, 5)
+
+
+@dataclass
+class Fixture(object):
+    """Sample of the seeded catalog the requests are drawn from."""
+
+    movie_ids: list
+    actor_ids: list
+    genres: list
+    doomed: list
+    job_ids: list
+    cursors: dict = field(default_factory=dict)
+    since: str = ''
+
+
+@dataclass(frozen=True)
+class Route(object):
+    """A benchmarked route.
+
+    The path of the requests ends with a random item of the fixture list
+    named `path_ids`, if any; `arguments` builds the other arguments of
+    the test client.
+    """
+
+    name: str
+    endpoint: str
+    path: str
+    method: str = 'GET'
+    path_ids: str = ''
+    arguments: Optional[Callable[[Fixture, random.Random], dict]] = None
+
+
+async def sample(
+    session_maker: async_sessionmaker[AsyncSession],
+    doomed_count: int,
+        ) -> Fixture:
+    """Sample the seeded catalog and queue a few ingest jobs.
+
+    Args:
+        session_maker (sessionmaker): Factory of the sampling sessions.
+        doomed_count (int): Number of movies the benchmark deletes.
+
+    Returns:
+        Fixture: The sample.
+    """
+    movies = select(Movie.id).where(Movie.id.startswith(catalog.MOVIE_PREFIX))
+    actors = select(Actor.id).where(Actor.id.startswith(catalog.ACTOR_PREFIX))
+    movies, actors = (
+        ids.order_by(func.random()).limit(SAMPLE)
+        for ids in (movies, actors)
+    )
+    genres = select(Genre.genre_name).where(Genre.genre_name.in_(catalog.GENRE_NAMES))
+    async with session_maker() as session:
+        movie_ids = list(await session.scalars(movies))
+        actor_ids = list(await session.scalars(actors))
+        genre_names = list(await session.scalars(genres))
+    job_ids = [
+        str((await enqueue(movie_id, session_maker)).id)
+        for movie_id in movie_ids[:JOBS]
+    ]
+    since = datetime.date.today() - datetime.timedelta(days=EXPORTED_DAYS)
+    return Fixture(
+        movie_ids=movie_ids[doomed_count:], actor_ids=actor_ids, genres=genre_names,
+        doomed=movie_ids[:doomed_count], job_ids=job_ids, since=since.isoformat(),
+    )
+
+
+def request(route: Route, fixture: Fixture, rnd: random.Random) -> tuple[str, dict]:
+    """Draw a request to a route.
+
+    Args:
+        route (Route): The route.
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        tuple[str, dict]: Path of the request and the other arguments
+        of the test client.
+    """
+    kwargs = route.arguments(fixture, rnd) if route.arguments else {}
+    if not route.path_ids:
+        return route.path, kwargs
+    path_id = rnd.choice(getattr(fixture, route.path_ids))
+    return '{0}{1}'.format(route.path, path_id), kwargs
+
+
+def page(cursors: str, fixture: Fixture, rnd: random.Random) -> dict:
+    """Draw a page of a list.
+
+    Args:
+        cursors (str): Name of the list in `fixture.cursors`.
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        dict: Query string of the page.
+    """
+    after = rnd.choice(fixture.cursors[cursors])
+    return {'query_string': {'after': after} if after else {}}
+
+
+def browse_filters(fixture: Fixture, rnd: random.Random) -> dict:
+    """Draw the filters of `/browse`.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        dict: Query string with a genre, an order and maybe a rating range.
+    """
+    low = rnd.choice(MIN_RATINGS)
+    genre = rnd.choice(fixture.genres)
+    query_string = {'genre': genre, 'order': rnd.choice(('desc', 'asc'))}
+    if low is not None:
+        query_string.update(min_rating=low, max_rating=low + RATING_SPAN)
+    return {'query_string': query_string}
+
+
+def search_terms(fixture: Fixture, rnd: random.Random) -> dict:
+    """Draw the terms of `/search`.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        dict: Query string with one or two frequent words.
+    """
+    terms = rnd.sample(WORDS, rnd.randint(*SEARCHED_WORDS))
+    return {'query_string': {'q': ' '.join(terms)}}
+
+
+def typed_prefix(fixture: Fixture, rnd: random.Random) -> dict:
+    """Draw a prefix typed in the search box.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        dict: Query string with the prefix of a frequent word.
+    """
+    prefix = rnd.choice(WORDS)[:rnd.randint(*TYPED_LENGTHS)]
+    return {'query_string': {'q': prefix}}
+
+
+def exported(fixture: Fixture, rnd: random.Random) -> dict:
+    """Build the query string of the exports.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        dict: Query string exporting the last days.
+    """
+    return {'query_string': {'since': fixture.since}}
+
+
+def added_movie(fixture: Fixture, rnd: random.Random) -> dict:
+    """Draw a movie to add again.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        dict: JSON body with the id of a seeded movie.
+    """
+    return {'json': {'id': rnd.choice(fixture.movie_ids)}}
+
+
+def movie_update(fixture: Fixture, rnd: random.Random) -> dict:
+    """Draw a new rating of a movie.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        dict: JSON body with the id and the rating.
+    """
+    movie_id = rnd.choice(fixture.movie_ids)
+    new_rating = round(rnd.uniform(*catalog.RATING_RANGE), 1)
+    return {'json': {'id': movie_id, 'rating': new_rating}}
+
+
+def actor_update(fixture: Fixture, rnd: random.Random) -> dict:
+    """Draw a new description of an actor.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        dict: JSON body with the id and the description.
+    """
+    return {'json': {'id': rnd.choice(fixture.actor_ids), 'description': 'Benchmarked'}}
+
+
+def deleted_movie(fixture: Fixture, rnd: random.Random) -> dict:
+    """Take a movie to delete, each one once.
+
+    Args:
+        fixture (Fixture): Sample of the catalog.
+        rnd (Random): Source of randomness.
+
+    Returns:
+        dict: JSON body with the id of a doomed movie.
+    """
+    return {'json': {'id': fixture.doomed.pop()}}
+
+
+ROUTES = (
+    Route('index', 'pages.index', '/', arguments=functools.partial(page, 'index')),
+    Route('actors', 'pages.actors', '/actors', arguments=functools.partial(page, 'actors')),
+    Route('detail', 'pages.detail', '/detail/', path_ids='movie_ids'),
+    Route('actor', 'pages.actor', '/actor/', path_ids='actor_ids'),
+    Route('browse', 'browse.browse_catalog', '/browse', arguments=browse_filters),
+    Route('search', 'search.search_catalog', '/search', arguments=search_terms),
+    Route('autocomplete', 'autocomplete.suggestions', '/autocomplete', arguments=typed_prefix),
+    Route('stats', 'stats.catalog_stats', '/stats'),
+    Route('export_movies', 'export.export_table', '/export/movies', arguments=exported),
+    Route('export_actors', 'export.export_table', '/export/actors', arguments=exported),
+    Route(
+        'export_movie_actor', 'export.export_table', '/export/movie_actor', arguments=exported,
+    ),
+    Route(
+        'export_movie_genre', 'export.export_table', '/export/movie_genre', arguments=exported,
+    ),
+    Route('job_status', 'jobs.job_status', '/jobs/', path_ids='job_ids'),
+    Route('pool_stats', 'monitoring.database_pool_stats', '/pool_stats'),
+    Route('cache_stats', 'monitoring.cache_stats', '/cache_stats'),
+    Route('metrics', 'monitoring.metrics', '/metrics'),
+    Route('add_form', 'pages.add_movie_actor', '/add_movie_actor'),
+    Route('add', 'pages.add_movie_actor', '/add_movie_actor', 'POST', arguments=added_movie),
+    Route('update_movie_form', 'pages.update_movie', '/update_movie'),
+    Route('update_movie', 'pages.update_movie', '/update_movie', 'PUT', arguments=movie_update),
+    Route('update_actor_form', 'pages.update_actor', '/update_actor'),
+    Route('update_actor', 'pages.update_actor', '/update_actor', 'PUT', arguments=actor_update),
+    Route('delete_form', 'pages.delete_movie_actor', '/delete_movie_actor'),
+    Route(
+        'delete', 'pages.delete_movie_actor', '/delete_movie_actor', 'DELETE',
+        arguments=deleted_movie,
+    ),
+)
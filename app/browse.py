@@ -0,0 +1,200 @@
+"""Catalog browsing blueprint module.
+
+`GET /browse` lists the movies of a genre and/or rating range, sorted by
+rating and paginated by keyset like the main page. Without a genre the
+rating range and sort read `movie_rating_idx`. A genre is listed off
+`movie_genre_rating_idx` instead: its links carry a copy of the movie
+rating, so the range, sort and cursor seek apply to the links of the
+genre and only the movies of the page are read.
+"""
+import math
+from dataclasses import asdict, dataclass
+from typing import Mapping
+
+from db.loading import MOVIE_LIST
+from db.models import Genre, Movie, MovieGenre
+from flask import Blueprint, current_app, jsonify, render_template, request
+from negotiation import wants_json
+from page_cache import cached_page
+from pagination import Page, PageParams, fetch_page
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import InstrumentedAttribute
+
+BAD_REQUEST = 400
+ORDERS = ('desc', 'asc')
+
+browse = Blueprint('browse', __name__)
+
+
+def _rating(args: Mapping[str, str], name: str) -> float | None:
+    raw_value = args.get(name) or None
+    if raw_value is None:
+        return None
+    try:
+        rating = float(raw_value)
+    except ValueError:
+        rating = math.nan
+    if not math.isfinite(rating):
+        raise ValueError('Invalid `{0}` rating `{1}`'.format(name, raw_value))
+    return rating
+
+
+@dataclass
+class BrowseFilters(object):
+    """Filters and sort order of a movie listing."""
+
+    genre: str | None = None
+    min_rating: float | None = None
+    max_rating: float | None = None
+    order: str = 'desc'
+
+    @classmethod
+    def from_args(cls, args: Mapping[str, str]) -> 'BrowseFilters':
+        """Read the filters from the query string.
+
+        Args:
+            args (Mapping[str, str]): Request query arguments.
+
+        Raises:
+            ValueError: A rating is not a number or the order is unknown.
+
+        Returns:
+            BrowseFilters: Parsed filters, missing ones are not applied.
+        """
+        order = args.get('order') or 'desc'
+        if order not in ORDERS:
+            raise ValueError('Unknown order `{0}`'.format(order))
+        return cls(
+            genre=args.get('genre') or None,
+            min_rating=_rating(args, 'min_rating'),
+            max_rating=_rating(args, 'max_rating'),
+            order=order,
+        )
+
+    def as_args(self) -> dict:
+        """Serialize the applied filters back into query arguments.
+
+        Returns:
+            dict: Query arguments of the filters, for the pager links.
+        """
+        return {
+            name: filter_value
+            for name, filter_value in asdict(self).items()
+            if filter_value is not None
+        }
+
+
+def sort_keys(filters: BrowseFilters) -> tuple[InstrumentedAttribute, ...]:
+    """Pick the columns the movies matching the filters are sorted by.
+
+    Args:
+        filters (BrowseFilters): Genre and rating range.
+
+    Returns:
+        tuple: Rating and movie id, of the genre links if a genre is selected.
+    """
+    if filters.genre is None:
+        return (Movie.rating, Movie.id)
+    return (MovieGenre.rating, MovieGenre.movie_id)
+
+
+def browse_statement(filters: BrowseFilters) -> Select:
+    """Build the query of the movies matching the filters.
+
+    Args:
+        filters (BrowseFilters): Genre and rating range.
+
+    Returns:
+        Select: Query without ordering or limit, for `fetch_page`.
+    """
+    stmt = select(Movie).options(*MOVIE_LIST)
+    if filters.genre is not None:
+        genre_id = select(Genre.id).where(Genre.genre_name == filters.genre)
+        stmt = stmt.join(MovieGenre, MovieGenre.movie_id == Movie.id).where(
+            MovieGenre.genre_id == genre_id.scalar_subquery(),
+            )
+    rating = sort_keys(filters)[0]
+    if filters.min_rating is not None:
+        stmt = stmt.where(rating >= filters.min_rating)
+    if filters.max_rating is not None:
+        stmt = stmt.where(rating <= filters.max_rating)
+    return stmt
+
+
+async def browse_movies(
+    session_maker: async_sessionmaker[AsyncSession],
+    filters: BrowseFilters,
+    page_params: PageParams,
+        ) -> Page:
+    """Fetch one page of the movies matching the filters.
+
+    Movies are ordered by rating and id,
+    best first unless `filters.order` is `asc`.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        filters (BrowseFilters): Genre, rating range and sort order.
+        page_params (PageParams): Cursor and page size.
+
+    Returns:
+        Page: Movie objects of the page and cursors of its neighbours.
+    """
+    async with session_maker() as async_session:
+        return await fetch_page(
+            async_session, browse_statement(filters),
+            sort_keys(filters),
+            page_params, descending=filters.order == 'desc',
+            )
+
+
+async def genre_names(
+    session_maker: async_sessionmaker[AsyncSession],
+        ) -> list[str]:
+    """Fetch the names of all genres for the filter form.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+
+    Returns:
+        list[str]: Genre names in alphabetical order.
+    """
+    async with session_maker() as async_session:
+        query = await async_session.scalars(
+            select(Genre.genre_name).order_by(Genre.genre_name),
+            )
+        return list(query)
+
+
+@browse.get('/browse')
+@cached_page
+async def browse_catalog():
+    """Render a page of the movies matching the filters.
+
+    The `genre`, `min_rating`, `max_rating` and `order` (`desc` or `asc`)
+    query arguments select the movies, the `after`/`before` cursors
+    and `limit` the page. JSON clients get the page as a JSON document.
+
+    Returns:
+        Response: The rendered page, or 400 if a filter is invalid.
+    """
+    try:
+        filters = BrowseFilters.from_args(request.args)
+    except ValueError as exc:
+        return {'error': str(exc)}, BAD_REQUEST
+    session_maker = current_app.extensions['async_session_maker']
+    page_params = PageParams.from_args(
+        request.args, current_app.config['PAGE_SIZE'],
+        )
+    page = await browse_movies(session_maker, filters, page_params)
+    if wants_json():
+        return jsonify(page.as_dict())
+    return render_template(
+        template_name_or_list='browse.html',
+        movies=page.rows,
+        page=page,
+        filters=filters,
+        genres=await genre_names(session_maker),
+        )
@@ -0,0 +1,98 @@
+"""Bulk delete blueprint module.
+
+`DELETE /bulk_delete` removes many movies and actors at once: the body is
+a JSON list of IMDb ids, `tt...` for movies and `nm...` for actors.
+
+One transaction runs a single `DELETE ... WHERE id IN (...)` per table.
+The foreign keys of `movie_actor` and `movie_genre` cascade, so the
+database deletes the links without the ORM loading them, the
+`crawl_state` rows of the deleted ids go in one more statement. The response
+reports each id, in order: `deleted`, `not_found` or `invalid`.
+"""
+import os
+
+from db.models import Actor, CrawlState, Movie
+from flask import Blueprint, current_app, request
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+BAD_REQUEST = 400
+BULK_DELETE_MAX_IDS = int(os.environ.get('BULK_DELETE_MAX_IDS', '5000'))
+MODELS = (('tt', Movie), ('nm', Actor))
+IMDB_PREFIXES = tuple(prefix for prefix, _ in MODELS)
+
+bulk_delete = Blueprint('bulk_delete', __name__)
+
+
+async def delete_ids(
+    session_maker: async_sessionmaker[AsyncSession], ids: list[str],
+        ) -> set[str]:
+    """Delete movies and actors with their links, in one transaction.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        ids (list[str]): IMDb ids of movies and actors.
+
+    Returns:
+        set[str]: Ids of the deleted rows.
+    """
+    deleted = set()
+    async with session_maker() as async_session:
+        async with async_session.begin():
+            for prefix, model in MODELS:
+                chosen = [imdb_id for imdb_id in ids if imdb_id.startswith(prefix)]
+                if not chosen:
+                    continue
+                stmt = delete(model).where(model.id.in_(chosen))
+                stmt = stmt.returning(model.id).execution_options(synchronize_session=False)
+                deleted.update(await async_session.scalars(stmt))
+            if deleted:
+                await async_session.execute(
+                    delete(CrawlState).where(CrawlState.imdb_id.in_(deleted)),
+                    )
+    return deleted
+
+
+def id_status(imdb_id, deleted: set[str]) -> str:
+    """Describe what a bulk delete did with an id.
+
+    Args:
+        imdb_id (Any): An item of the JSON list.
+        deleted (set[str]): Ids of the deleted rows.
+
+    Returns:
+        str: `deleted`, `not_found` or `invalid`.
+    """
+    if not isinstance(imdb_id, str) or not imdb_id.startswith(IMDB_PREFIXES):
+        return 'invalid'
+    return 'deleted' if imdb_id in deleted else 'not_found'
+
+
+@bulk_delete.delete('/bulk_delete')
+async def bulk_delete_ids():
+    """Delete a list of movies and actors.
+
+    Returns:
+        tuple[dict, int]: The number of deleted rows and the result
+        of each id, or 400 if the body is not a list of ids.
+    """
+    ids = request.get_json(silent=True)
+    if not isinstance(ids, list):
+        return {'error': 'the body must be a JSON list of IMDb ids'}, BAD_REQUEST
+    if len(ids) > BULK_DELETE_MAX_IDS:
+        return {
+            'error': 'at most {0} ids per request'.format(BULK_DELETE_MAX_IDS),
+        }, BAD_REQUEST
+    valid = [imdb_id for imdb_id in ids if id_status(imdb_id, set()) != 'invalid']
+    deleted = set()
+    if valid:
+        session_maker = current_app.extensions['async_session_maker']
+        deleted = await delete_ids(session_maker, valid)
+        current_app.extensions['catalog_watch'].changed(*deleted)
+    return {
+        'deleted': len(deleted),
+        'results': [
+            {'id': imdb_id, 'status': id_status(imdb_id, deleted)} for imdb_id in ids
+        ],
+    }
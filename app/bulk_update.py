@@ -0,0 +1,246 @@
+"""Bulk update blueprint module.
+
+`PATCH /bulk_update/<table>` corrects many `movies` or `actors` at once:
+the body is a JSON list of partial records, each with the `id` of a row
+and the columns to change, e.g. `[{"id": "tt0111161", "rating": 9.3}]`.
+
+The valid records are applied in one transaction by a single
+`UPDATE ... FROM (VALUES ...)` statement, a column missing from a record
+keeping its stored value. The response reports each record, in order:
+`updated`, `not_found` or `invalid` with the reason. Records breaking
+a constraint of the models are invalid too; should the database still
+reject the statement, nothing is applied and the answer is 422.
+"""
+import os
+import types
+from datetime import date
+
+from db.models import DESCRIPTION_MAX_LENGTH, Actor, Movie
+from flask import Blueprint, current_app, request
+from sqlalchemy import Column, String, column, func
+from sqlalchemy import inspect as inspect_model
+from sqlalchemy import update, values
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+BAD_REQUEST = 400
+UNPROCESSABLE = 422
+BULK_UPDATE_MAX_ROWS = int(os.environ.get('BULK_UPDATE_MAX_ROWS', '5000'))
+MODELS = types.MappingProxyType({'movies': Movie, 'actors': Actor})
+READ_ONLY = frozenset(('id', 'created'))
+# Exclusive bounds of the text columns with a length constraint.
+MAX_LENGTHS = types.MappingProxyType({'description': DESCRIPTION_MAX_LENGTH})
+
+bulk_update = Blueprint('bulk_update', __name__)
+
+
+class InvalidRecord(Exception):
+    """Custom exception class for records that cannot be applied.
+
+    This exception is raised when a record of a bulk update
+    has no id, an unknown column or a value of the wrong type.
+    """
+
+    def __init__(self, message, *args):
+        """Initialize the exception with a human readable message.
+
+        Args:
+            message (str): Error description.
+            args (tuple): Extra exception arguments.
+        """
+        self.message = message
+        super().__init__(message, *args)
+
+
+def updatable_columns(model: type[Movie | Actor]) -> dict[str, Column]:
+    """List the columns a bulk update may change.
+
+    Args:
+        model (type): `Movie` or `Actor`.
+
+    Returns:
+        dict[str, Column]: Columns by name, the id and creation time excluded.
+    """
+    return {
+        attr.key: attr.columns[0]
+        for attr in inspect_model(model).mapper.column_attrs
+        if attr.key not in READ_ONLY
+    }
+
+
+def convert(name: str, table_column: Column, given):
+    """Check a value of a record against the type of its column.
+
+    Args:
+        name (str): Name of the column.
+        table_column (Column): The column.
+        given (Any): The value of the JSON record.
+
+    Raises:
+        InvalidRecord: The value does not fit the column.
+
+    Returns:
+        Any: The value, dates parsed from their ISO format.
+    """
+    expected = table_column.type.python_type
+    if expected is date and isinstance(given, str):
+        try:
+            return date.fromisoformat(given)
+        except ValueError:
+            raise InvalidRecord('`{0}` is not an ISO date'.format(name))
+    if expected is float and isinstance(given, int) and not isinstance(given, bool):
+        return float(given)
+    if not isinstance(given, expected):
+        raise InvalidRecord('`{0}` must be a {1}'.format(name, expected.__name__))
+    return given
+
+
+def check_length(name: str, converted):
+    """Check a converted value against the length constraint of its column.
+
+    Args:
+        name (str): Name of the column.
+        converted (Any): The value, as returned by `convert`.
+
+    Raises:
+        InvalidRecord: The value is too long for the column.
+
+    Returns:
+        Any: The value.
+    """
+    if name in MAX_LENGTHS and len(converted) >= MAX_LENGTHS[name]:
+        raise InvalidRecord('`{0}` must be shorter than {1} characters'.format(
+            name, MAX_LENGTHS[name],
+            ))
+    return converted
+
+
+def validate(record, columns: dict[str, Column]) -> dict:
+    """Check a record of a bulk update.
+
+    Args:
+        record (Any): The JSON record.
+        columns (dict[str, Column]): The updatable columns.
+
+    Raises:
+        InvalidRecord: The record cannot be applied.
+
+    Returns:
+        dict: The id and the converted values of the record.
+    """
+    record_id = record.get('id') if isinstance(record, dict) else None
+    if not isinstance(record_id, str):
+        raise InvalidRecord('a record must be an object with a string `id`')
+    changes = {name: given for name, given in record.items() if name != 'id'}
+    unknown = sorted(set(changes) - set(columns))
+    if unknown:
+        raise InvalidRecord('unknown columns: {0}'.format(', '.join(unknown)))
+    if not changes:
+        raise InvalidRecord('nothing to update')
+    converted = {'id': record_id}
+    for name, given in changes.items():
+        converted[name] = check_length(name, convert(name, columns[name], given))
+    return converted
+
+
+def check_records(
+    records: list, columns: dict[str, Column],
+        ) -> tuple[list[dict], list[dict]]:
+    """Validate the records of a bulk update.
+
+    Args:
+        records (list): The JSON records.
+        columns (dict[str, Column]): The updatable columns.
+
+    Returns:
+        tuple[list[dict], list[dict]]: The result of each record, `pending`
+        for the valid ones, and the valid records, one per id.
+    """
+    outcomes = []
+    valid = {}
+    for record in records:
+        given_id = record.get('id') if isinstance(record, dict) else None
+        try:
+            checked = validate(record, columns)
+        except InvalidRecord as error:
+            outcomes.append({'id': given_id, 'status': 'invalid', 'error': error.message})
+            continue
+        if given_id in valid:
+            outcomes.append({'id': given_id, 'status': 'invalid', 'error': 'duplicate id'})
+            continue
+        valid[given_id] = checked
+        outcomes.append({'id': given_id, 'status': 'pending'})
+    return outcomes, list(valid.values())
+
+
+async def apply_records(
+    session_maker: async_sessionmaker[AsyncSession],
+    model: type[Movie | Actor],
+    records: list[dict],
+        ) -> set[str]:
+    """Apply valid records with one `UPDATE ... FROM (VALUES ...)`.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        model (type): `Movie` or `Actor`.
+        records (list[dict]): Validated records with distinct ids.
+
+    Returns:
+        set[str]: Ids of the updated rows.
+    """
+    columns = updatable_columns(model)
+    names = sorted({name for record in records for name in record} - {'id'})
+    patch_columns = [column('id', String)]
+    patch_columns.extend(column(name, columns[name].type) for name in names)
+    rows = [
+        (record['id'], *(record.get(name) for name in names)) for record in records
+    ]
+    patch = values(*patch_columns, name='patch').data(rows)
+    # NULL, a column the record leaves out, keeps the stored value.
+    assignments = {
+        name: func.coalesce(patch.c[name], columns[name]) for name in names
+    }
+    stmt = update(model).where(model.id == patch.c.id)
+    stmt = stmt.values(assignments).returning(model.id)
+    stmt = stmt.execution_options(synchronize_session=False)
+    async with session_maker() as async_session:
+        async with async_session.begin():
+            return set(await async_session.scalars(stmt))
+
+
+@bulk_update.patch('/bulk_update/<any(movies, actors):table>')
+async def bulk_update_table(table: str):
+    """Apply a list of partial records to movies or actors.
+
+    Args:
+        table (str): `movies` or `actors`.
+
+    Returns:
+        tuple[dict, int]: The number of updated rows and the result
+        of each record, 400 if the body is not a list of records
+        or 422 if the database rejects the update.
+    """
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        return {'error': 'the body must be a JSON list of records'}, BAD_REQUEST
+    if len(records) > BULK_UPDATE_MAX_ROWS:
+        return {
+            'error': 'at most {0} records per request'.format(BULK_UPDATE_MAX_ROWS),
+        }, BAD_REQUEST
+    model = MODELS[table]
+    outcomes, valid = check_records(records, updatable_columns(model))
+    updated = set()
+    if valid:
+        session_maker = current_app.extensions['async_session_maker']
+        try:
+            updated = await apply_records(session_maker, model, valid)
+        except (DataError, IntegrityError) as exc:
+            return {
+                'error': 'rejected by the database: {0}'.format(exc.orig.diag.message_primary),
+            }, UNPROCESSABLE
+        current_app.extensions['catalog_watch'].changed(*updated)
+    for outcome in outcomes:
+        if outcome['status'] == 'pending':
+            outcome['status'] = 'updated' if outcome['id'] in updated else 'not_found'
+    return {'updated': len(updated), 'results': outcomes}
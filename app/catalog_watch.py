@@ -0,0 +1,217 @@
+"""Catalog change listener module.
+
+Database triggers send the ids of the movies, actors and genres whose
+rows or links change on the `catalog_changes` channel, whichever process
+commits them. Each process runs one `CatalogWatch` thread listening to
+it: a notification drops the cached entities tagged with its id (see
+`entity_cache`) and forgets the catalog version, so cache hits do not
+read the version row and a write only retires what it touched.
+
+While the listener is not connected, on start or after losing its
+connection, the version is read by every request and nothing is cached
+across requests; the whole entity cache is dropped once it is back.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any
+
+import psycopg
+from db.models import CatalogVersion
+from db.pools import get_db_url
+from entity_cache import NEGATIVE, EntityCache, EntityKey, entity_tags
+from sqlalchemy import Row, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+CHANNEL = 'catalog_changes'
+# Payload of a change that may touch any entity (bulk loads, reconnects).
+EVERYTHING = '*'
+RECONNECT_DELAY = 1  # seconds
+
+
+def connect() -> psycopg.Connection:
+    """Open an autocommit connection for the notifications.
+
+    Returns:
+        psycopg.Connection: A connection outside the SQLAlchemy pools.
+    """
+    return psycopg.connect(get_db_url().replace('+psycopg', ''), autocommit=True)
+
+
+class CatalogWatch(object):
+    """Catalog version and entity cache kept current by notifications."""
+
+    def __init__(self, entity_cache: EntityCache) -> None:
+        """Initialize a watch, its listener thread starts on first use.
+
+        Args:
+            entity_cache (EntityCache): Cache of the entities to invalidate.
+        """
+        self.entity_cache = entity_cache
+        # Set while the listener is connected and cached data can be trusted.
+        self.listening = threading.Event()
+        self.generation = 0
+        self._version: Row | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        # Flush tokens sent through the channel, set once they come back.
+        self._flushes: dict[str, threading.Event] = {}
+        os.register_at_fork(after_in_child=self.forget)
+
+    def forget(self) -> None:
+        """Drop the state inherited by a forked child, its listener stays behind."""
+        self._lock = threading.Lock()
+        self.listening = threading.Event()
+        self._version = None
+        self._thread = None
+
+    def start(self) -> None:
+        """Start the listener thread unless it runs."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.listen, name='catalog-watch', daemon=True,
+                    )
+                self._thread.start()
+
+    def listen(self) -> None:
+        """Apply notifications as they arrive, reconnecting on failure."""
+        while True:  # noqa: WPS457
+            try:
+                with connect() as conn:
+                    self.follow(conn)
+            except psycopg.Error as exc:
+                logging.warning('Catalog listener disconnected: %r', exc)
+            self.listening.clear()
+            self.changed(EVERYTHING)
+            time.sleep(RECONNECT_DELAY)
+
+    def follow(self, conn: psycopg.Connection) -> None:
+        """Listen on a connection and apply its notifications until it fails.
+
+        Args:
+            conn (psycopg.Connection): An autocommit connection.
+        """
+        conn.execute('LISTEN {0}'.format(CHANNEL))
+        # Changes made before LISTEN were never notified.
+        self.changed(EVERYTHING)
+        self.listening.set()
+        for notify in conn.notifies():
+            self.receive(notify.payload)
+
+    def receive(self, payload: str) -> None:
+        """Apply a notification.
+
+        Args:
+            payload (str): A changed id, `EVERYTHING` or a flush token.
+        """
+        flushed = self._flushes.get(payload)
+        if flushed is None:
+            self.changed(payload)
+        else:
+            flushed.set()
+
+    def flush(self, timeout: float) -> bool:
+        """Wait until the changes committed so far by any process are applied.
+
+        Notifications arrive in commit order, so once a token sent
+        now comes back, every earlier change has been applied.
+
+        Args:
+            timeout (float): Seconds to wait for the listener, then for the token.
+
+        Returns:
+            bool: True if the changes were applied in time.
+        """
+        self.start()
+        if not self.listening.wait(timeout):
+            return False
+        token = 'flush:{0}'.format(uuid.uuid4().hex)
+        arrived = self._flushes.setdefault(token, threading.Event())
+        with connect() as conn:
+            conn.execute('SELECT pg_notify(%s, %s)', (CHANNEL, token))
+        flushed = arrived.wait(timeout)
+        self._flushes.pop(token)
+        return flushed
+
+    def changed(self, *ids: str) -> None:
+        """Retire the cached version and the entities depending on changed ids.
+
+        Called by the listener, and by local writers right after they
+        commit, so a process reads its own writes without waiting for them.
+
+        Args:
+            ids (str): Changed movie, actor or genre ids, or `EVERYTHING`.
+        """
+        with self._lock:
+            self.generation += 1
+            self._version = None
+            if EVERYTHING in ids:
+                self.entity_cache.clear()
+            else:
+                self.entity_cache.invalidate(*ids)
+
+    def snapshot(self) -> int | None:
+        """Mark the start of a read whose result may be cached.
+
+        Returns:
+            int | None: Generation to check with `unchanged_since`,
+            None while the listener is not connected.
+        """
+        self.start()
+        if not self.listening.is_set():
+            return None
+        return self.generation
+
+    def unchanged_since(self, snapshot: int | None) -> bool:
+        """Check that a read may be cached: no change was applied while it ran.
+
+        Args:
+            snapshot (int | None): Generation taken by `snapshot` before the read.
+
+        Returns:
+            bool: True if the read may be cached.
+        """
+        return snapshot is not None and self.listening.is_set() and snapshot == self.generation
+
+    def keep(self, key: EntityKey, cached: Any, snapshot: int | None) -> None:
+        """Cache an entity read since a snapshot, unless a change was applied meanwhile.
+
+        The entity may predate a change applied during the read,
+        whose invalidation already went by.
+
+        Args:
+            key (EntityKey): Key of the entity.
+            cached (Any): The entity, or `NEGATIVE` for a missing id.
+            snapshot (int | None): Generation taken by `snapshot` before the read.
+        """
+        tags = {key[1]} if cached is NEGATIVE else entity_tags(cached)
+        with self._lock:
+            if self.unchanged_since(snapshot):
+                self.entity_cache.put(key, cached, tags)
+
+    async def version(self, session_maker: async_sessionmaker[AsyncSession]) -> Row:
+        """Return the catalog version, read once per change.
+
+        Args:
+            session_maker (sessionmaker):
+            An asynchronous session maker for interacting with the database.
+
+        Returns:
+            Row: `counter` and `modified` time of the version.
+        """
+        cached = self._version
+        if cached is not None:
+            return cached
+        snapshot = self.snapshot()
+        async with session_maker() as async_session:
+            query = await async_session.execute(
+                select(CatalogVersion.counter, CatalogVersion.modified),
+                )
+            version = query.one()
+        with self._lock:
+            if self.unchanged_since(snapshot):
+                self._version = version
+        return version
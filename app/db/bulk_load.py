@@ -0,0 +1,302 @@
+"""Bulk catalog loader module.
+
+Seeds or restores the catalog with `COPY ... FROM STDIN` instead of one
+INSERT per ORM object. Every table is first copied into a temporary
+staging table, then moved into place with one `INSERT ... SELECT` per
+table, in foreign key order: genres, movies, actors, then the links.
+The moves skip duplicates and rows already stored (or update them), and
+drop links to movies or actors that do not exist. Genres are created
+from the names the links use. Everything happens in one transaction.
+
+The row triggers of the catalog tables would run once per moved row,
+so the load runs with `session_replication_role = replica` (superuser,
+or `GRANT SET ON PARAMETER session_replication_role`) and does their
+work once per table instead: the links get their movie rating, the
+`name_word` dictionary, `genre_stats` and `actor_stats` of the touched
+rows are recomputed, the catalog version is bumped once and the web
+servers are told to drop all their cached entities. Foreign keys are not
+checked either: the moves join the rows they link, and the catalog tables
+are locked against other writers until the load commits.
+
+The input rows have the shape of the `GET /export/<table>` NDJSON lines,
+so an export can be restored as is.
+
+Usage, from `app/` with the POSTGRES_* variables set:
+
+    python -m db.bulk_load DIRECTORY [--update]
+
+DIRECTORY holds any of `genres.ndjson` (`genre_name` lines),
+`movies.ndjson`, `actors.ndjson`, `movie_genre.ndjson` and
+`movie_actor.ndjson`, as saved from `/export/<table>`.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import pathlib
+import time
+from typing import Iterable, Iterator
+
+from db.bulk_maintenance import maintenance
+from db.models import Actor, Genre, Movie, MovieActor, MovieGenre
+from db.pools import get_engine, get_session_maker
+from sqlalchemy import (Column, Insert, MetaData, Table, func, inspect, select,
+                        union)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import (AsyncConnection, AsyncSession,
+                                    async_sessionmaker)
+
+TABLES = ('genres', 'movies', 'actors', 'movie_genre', 'movie_actor')
+ENTITIES = (('movies', Movie), ('actors', Actor))
+CATALOG_TABLES = ('genre', 'movie', 'actor', 'movie_genre', 'movie_actor')
+SECONDS_PER_MINUTE = 60
+
+
+def staging_tables(metadata: MetaData) -> dict[str, Table]:
+    """Describe the staging tables, dropped when the load commits.
+
+    Args:
+        metadata (MetaData): Metadata collecting the tables.
+
+    Returns:
+        dict[str, Table]: Staging table of each loaded table.
+    """
+    columns = {
+        'genres': (Genre.genre_name,),
+        'movie_genre': (MovieGenre.movie_id, Genre.genre_name),
+        'movie_actor': (MovieActor.movie_id, MovieActor.actor_id),
+    }
+    for name, model in ENTITIES:
+        columns[name] = inspect(model).columns
+    return {
+        table: Table(
+            'load_{0}'.format(table), metadata,
+            *[Column(column.key, column.type) for column in columns[table]],
+            prefixes=['TEMPORARY'], postgresql_on_commit='DROP',
+            )
+        for table in TABLES
+    }
+
+
+async def copy_rows(driver_connection, staged: Table, rows: Iterable[dict]) -> int:
+    """Stream rows into a staging table with `COPY ... FROM STDIN`.
+
+    Missing values are copied as NULL.
+
+    Args:
+        driver_connection (AsyncConnection): psycopg connection of the load.
+        staged (Table): The staging table.
+        rows (Iterable[dict]): Column values of the rows.
+
+    Returns:
+        int: Number of copied rows.
+    """
+    keys = staged.columns.keys()
+    statement = 'COPY {0} ({1}) FROM STDIN'.format(staged.name, ', '.join(keys))
+    copied = 0
+    async with driver_connection.cursor() as cursor:
+        async with cursor.copy(statement) as copy:
+            for row in rows:
+                await copy.write_row([row.get(key) for key in keys])
+                copied += 1
+    return copied
+
+
+def move_genres(staged: dict[str, Table]) -> Insert:
+    """Build the insert of the genres named by the staged rows.
+
+    Args:
+        staged (dict[str, Table]): The staging tables.
+
+    Returns:
+        Insert: Statement adding the missing genres.
+    """
+    names = union(
+        select(staged['genres'].c.genre_name),
+        select(staged['movie_genre'].c.genre_name),
+        ).subquery()
+    new_genres = select(func.gen_random_uuid(), names.c.genre_name)
+    new_genres = new_genres.order_by(names.c.genre_name)
+    stmt = pg_insert(Genre).from_select([Genre.id, Genre.genre_name], new_genres)
+    return stmt.on_conflict_do_nothing(index_elements=[Genre.genre_name])
+
+
+def move_entities(staged: Table, model: type, update: bool) -> Insert:
+    """Build the insert of the staged movies or actors.
+
+    A missing creation time defaults to the time of the load.
+
+    Args:
+        staged (Table): The staging table.
+        model (type): `Movie` or `Actor`.
+        update (bool): Overwrite the stored rows with the staged ones.
+
+    Returns:
+        Insert: Statement moving the rows, the first of duplicates wins.
+    """
+    keys = staged.columns.keys()
+    created = func.coalesce(staged.c.created, func.now())
+    selected = [created if key == 'created' else staged.c[key] for key in keys]
+    rows = select(*selected).distinct(staged.c.id)
+    rows = rows.order_by(staged.c.id)
+    stmt = pg_insert(model).from_select(keys, rows)
+    if not update:
+        return stmt.on_conflict_do_nothing(index_elements=[model.id])
+    return stmt.on_conflict_do_update(
+        index_elements=[model.id],
+        set_={key: stmt.excluded[key] for key in keys if key != 'id'},
+        )
+
+
+def move_links(staged: dict[str, Table]) -> tuple[Insert, Insert]:
+    """Build the inserts of the staged links.
+
+    Args:
+        staged (dict[str, Table]): The staging tables.
+
+    Returns:
+        tuple[Insert, Insert]: Statements moving the `movie_genre` links,
+        with the rating of their movie, and the `movie_actor` links whose ends exist.
+    """
+    genre_links = staged['movie_genre']
+    genre_rows = select(genre_links.c.movie_id, Genre.id, Movie.rating)
+    genre_rows = genre_rows.join(Genre, Genre.genre_name == genre_links.c.genre_name)
+    genre_rows = genre_rows.join(Movie, Movie.id == genre_links.c.movie_id)
+    genre_order = (genre_links.c.movie_id, Genre.id)
+    genre_rows = genre_rows.distinct().order_by(*genre_order)
+    cast_links = staged['movie_actor']
+    cast_rows = select(cast_links.c.movie_id, cast_links.c.actor_id).join(
+        Movie, Movie.id == cast_links.c.movie_id,
+        ).join(Actor, Actor.id == cast_links.c.actor_id)
+    cast_order = (cast_links.c.movie_id, cast_links.c.actor_id)
+    cast_rows = cast_rows.distinct().order_by(*cast_order)
+    return (
+        pg_insert(MovieGenre).from_select(
+            [MovieGenre.movie_id, MovieGenre.genre_id, MovieGenre.rating], genre_rows,
+            ).on_conflict_do_nothing(),
+        pg_insert(MovieActor).from_select(
+            [MovieActor.movie_id, MovieActor.actor_id], cast_rows,
+            ).on_conflict_do_nothing(),
+    )
+
+
+async def move_rows(
+    connection: AsyncConnection,
+    moves: Iterable[tuple[str, Insert]],
+    staged: dict[str, Table],
+    update: bool,
+        ) -> dict[str, int]:
+    """Move the staged rows with the row triggers off, then do their work.
+
+    Args:
+        connection (AsyncConnection): Connection of the load transaction.
+        moves (Iterable[tuple[str, Insert]]): Moves of each table, in order.
+        staged (dict[str, Table]): The staging tables.
+        update (bool): Whether the moves overwrite stored movies and actors.
+
+    Returns:
+        dict[str, int]: Number of rows added (or updated) in each table.
+    """
+    await connection.exec_driver_sql(
+        'LOCK TABLE {0} IN SHARE ROW EXCLUSIVE MODE'.format(', '.join(CATALOG_TABLES)),
+        )
+    await connection.exec_driver_sql('SET LOCAL session_replication_role = replica')
+    loaded = {}
+    for table, move in moves:
+        # Inserts drop their row count unless asked to keep it.
+        moved = await connection.execute(
+            move, execution_options={'preserve_rowcount': True},
+            )
+        loaded[table] = moved.rowcount
+    for statement in maintenance(staged, update):
+        await connection.execute(statement)
+    return loaded
+
+
+async def load_catalog(
+    session_maker: async_sessionmaker[AsyncSession],
+    sources: dict[str, Iterable[dict]],
+    update: bool = False,
+        ) -> dict[str, int]:
+    """Load catalog rows in one transaction.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        sources (dict[str, Iterable[dict]]):
+        Rows of any of `TABLES`, shaped like the `/export/<table>` lines.
+        update (bool): Overwrite stored movies and actors, instead of keeping them.
+
+    Returns:
+        dict[str, int]: Number of rows added (or updated) in each table.
+    """
+    metadata = MetaData()
+    staged = staging_tables(metadata)
+    entity_moves = [
+        (name, move_entities(staged[name], model, update))
+        for name, model in ENTITIES
+    ]
+    moves = (
+        ('genres', move_genres(staged)),
+        *entity_moves,
+        *zip(('movie_genre', 'movie_actor'), move_links(staged)),
+    )
+    async with session_maker() as async_session:
+        async with async_session.begin():
+            connection = await async_session.connection()
+            await connection.run_sync(metadata.create_all)
+            raw_connection = await connection.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+            for source, rows in sources.items():
+                await copy_rows(driver_connection, staged[source], rows)
+            return await move_rows(connection, moves, staged, update)
+
+
+def read_ndjson(path: pathlib.Path) -> Iterator[dict]:
+    """Read the rows of an NDJSON file lazily.
+
+    Args:
+        path (Path): The file.
+
+    Yields:
+        dict: One row per non-blank line.
+    """
+    with open(path, encoding='utf-8') as lines:
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Load the NDJSON files of a directory.
+
+    Args:
+        args (Namespace): Command line arguments.
+    """
+    paths = {name: args.directory / '{0}.ndjson'.format(name) for name in TABLES}
+    sources = {
+        name: read_ndjson(path)
+        for name, path in paths.items()
+        if path.exists()
+    }
+    started = time.perf_counter()
+    loaded = await load_catalog(get_session_maker(), sources, update=args.update)
+    elapsed = time.perf_counter() - started
+    await get_engine().dispose()
+    rows = sum(loaded.values())
+    logging.info('Loaded {0} in {1:.1f}s, {2:.0f} rows per minute'.format(
+        loaded, elapsed, rows / elapsed * SECONDS_PER_MINUTE,
+        ))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s :: %(levelname)s :: %(message)s',
+    )
+    parser = argparse.ArgumentParser(description='Load catalog NDJSON files with COPY.')
+    parser.add_argument('directory', type=pathlib.Path)
+    parser.add_argument(
+        '--update', action='store_true', help='overwrite stored movies and actors',
+        )
+    asyncio.run(main(parser.parse_args()))
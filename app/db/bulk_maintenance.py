@@ -0,0 +1,140 @@
+"""Bulk load maintenance module.
+
+`db.bulk_load` moves its rows with the row triggers of the catalog tables
+off. These statements do their work once per load instead of once per
+row, for the rows of the staging tables: set-based equivalents of the
+`name_word`, `movie_genre.rating`, `genre_stats` / `actor_stats`,
+`catalog_version` and change notification triggers.
+"""
+from db.models import (Actor, ActorStats, CatalogVersion, GenreStats, Movie,
+                       MovieActor, MovieGenre, NameWord)
+from sqlalchemy import (Executable, Numeric, Update, cast, func, select, true,
+                        union)
+from sqlalchemy import update as update_table
+from sqlalchemy.dialects.postgresql import Insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.schema import Column, Table
+
+NAMES = (('movies', Movie.movie_name), ('actors', Actor.actor_name))
+# Same split as the `collect_name_words` trigger.
+WORD_SEPARATORS = r'[\s[:punct:]]+'
+# Listened to by `catalog_watch`, `*` drops every cached entity.
+CHANGES_CHANNEL = 'catalog_changes'
+
+
+def collect_words(staged: Table, name_column: Column) -> Insert:
+    """Build the insert of the words of the moved names into `name_word`.
+
+    Args:
+        staged (Table): The staging table of the movies or actors.
+        name_column (Column): `Movie.movie_name` or `Actor.actor_name`.
+
+    Returns:
+        Insert: Statement adding the missing words of the stored names.
+    """
+    model = name_column.class_
+    words = func.regexp_split_to_table(func.lower(name_column), WORD_SEPARATORS)
+    words = words.table_valued('word').render_derived()
+    rows = select(words.c.word).select_from(model)
+    rows = rows.join(staged, staged.c.id == model.id)
+    rows = rows.join(words, true())
+    rows = rows.where(func.length(words.c.word) > 1)
+    stmt = pg_insert(NameWord).from_select([NameWord.word], rows.distinct())
+    return stmt.on_conflict_do_nothing()
+
+
+def copy_ratings(staged: Table) -> Update:
+    """Build the update of the links of overwritten movies to their new rating.
+
+    Args:
+        staged (Table): The staging table of the movies.
+
+    Returns:
+        Update: Statement setting the rating of the `movie_genre` links.
+    """
+    return update_table(MovieGenre).where(
+        MovieGenre.movie_id == Movie.id,
+        Movie.id == staged.c.id,
+        MovieGenre.rating != Movie.rating,
+        ).values(rating=Movie.rating)
+
+
+def recount_genres(staged: dict[str, Table]) -> Insert:
+    """Build the recount of `genre_stats` for the genres of the loaded movies and links.
+
+    Args:
+        staged (dict[str, Table]): The staging tables.
+
+    Returns:
+        Insert: Statement overwriting the summary rows of the touched genres.
+    """
+    movie_ids = union(
+        select(staged['movies'].c.id), select(staged['movie_genre'].c.movie_id),
+        )
+    touched = select(MovieGenre.genre_id).where(MovieGenre.movie_id.in_(movie_ids))
+    rating_sum = func.sum(cast(MovieGenre.rating, Numeric))
+    rows = select(MovieGenre.genre_id, func.count(), rating_sum)
+    rows = rows.where(MovieGenre.genre_id.in_(touched))
+    rows = rows.group_by(MovieGenre.genre_id).order_by(MovieGenre.genre_id)
+    stmt = pg_insert(GenreStats).from_select(
+        [GenreStats.genre_id, GenreStats.movies, GenreStats.rating_sum], rows,
+        )
+    return stmt.on_conflict_do_update(
+        index_elements=[GenreStats.genre_id],
+        set_={'movies': stmt.excluded.movies, 'rating_sum': stmt.excluded.rating_sum},
+        )
+
+
+def recount_actors(staged: dict[str, Table]) -> Insert:
+    """Build the recount of `actor_stats` for the actors of the loaded links.
+
+    Args:
+        staged (dict[str, Table]): The staging tables.
+
+    Returns:
+        Insert: Statement overwriting the summary rows of the touched actors.
+    """
+    touched = select(staged['movie_actor'].c.actor_id)
+    rows = select(MovieActor.actor_id, func.count())
+    rows = rows.where(MovieActor.actor_id.in_(touched))
+    rows = rows.group_by(MovieActor.actor_id).order_by(MovieActor.actor_id)
+    columns = [ActorStats.actor_id, ActorStats.movies]
+    stmt = pg_insert(ActorStats).from_select(columns, rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[ActorStats.actor_id], set_={'movies': stmt.excluded.movies},
+        )
+
+
+def bump_version() -> Update:
+    """Build the update of the catalog version, once for the whole load.
+
+    Returns:
+        Update: Statement bumping the `catalog_version` row.
+    """
+    return update_table(CatalogVersion).where(CatalogVersion.id == 1).values(
+        counter=CatalogVersion.counter + 1,
+        modified=func.greatest(CatalogVersion.modified, func.clock_timestamp()),
+        txid=func.txid_current(),
+        )
+
+
+def maintenance(staged: dict[str, Table], update: bool) -> list[Executable]:
+    """Build the statements doing the work of the bypassed row triggers.
+
+    Args:
+        staged (dict[str, Table]): The staging tables.
+        update (bool): Whether stored movies were overwritten.
+
+    Returns:
+        list[Executable]: Statements to run after the moves, in order.
+    """
+    statements = [collect_words(staged[name], column) for name, column in NAMES]
+    if update:
+        statements.append(copy_ratings(staged['movies']))
+    return [
+        *statements,
+        recount_genres(staged),
+        recount_actors(staged),
+        bump_version(),
+        select(func.pg_notify(CHANGES_CHANNEL, '*')),
+    ]
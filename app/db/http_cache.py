@@ -0,0 +1,350 @@
+"""Disk-backed HTTP response cache module.
+
+Responses are stored one file per URL (`<key>.body` with a `<key>.json`
+metadata file next to it), so a recorded cache directory doubles as a set
+of fixtures for offline runs.
+
+Modes (`IMDB_HTTP_MODE`): `live` serves fresh entries from the cache,
+revalidates stale ones with `If-None-Match` / `If-Modified-Since` and fetches
+the rest; `record` always fetches and stores the responses in the fixtures
+directory; `replay` never touches the network and serves the fixtures only.
+Requests sent to the network spend the process rate budget (`db.rate_budget`).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Mapping
+
+from db.rate_budget import RateBudget, get_rate_budget
+
+LIVE = 'live'
+RECORD = 'record'
+REPLAY = 'replay'
+NOT_MODIFIED = 304
+MEGABYTE = 1024 * 1024
+KEY_SLUG_LENGTH = 80
+KEY_DIGEST_LENGTH = 12
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / 'fixtures' / 'imdb'
+
+
+class ReplayMiss(Exception):
+    """Custom exception class for a missing fixture in replay mode.
+
+    This exception is raised when replay mode is asked
+    for a URL that has no recorded response.
+    """
+
+    def __init__(self, message, *args):
+        """Initialize the exception with a human readable message.
+
+        Args:
+            message (str): Error description.
+            args (tuple): Extra exception arguments.
+        """
+        self.message = message
+        super().__init__(message, *args)
+
+
+@dataclass
+class CacheEntry(object):
+    """Cached response body with its validators."""
+
+    url: str
+    stored_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+    body: bytes = b''
+
+    def validators(self) -> dict:
+        """Build the headers of a conditional request for the entry.
+
+        Returns:
+            dict: `If-None-Match` / `If-Modified-Since` headers.
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache(object):
+    """Response cache stored in a directory, keyed by URL."""
+
+    def __init__(
+        self, directory: str | Path, ttl: float | None, max_bytes: int | None,
+            ) -> None:
+        """Initialize the cache and create its directory.
+
+        Args:
+            directory (str | Path): Where the responses are stored.
+            ttl (float | None): Seconds an entry stays fresh, forever if None.
+            max_bytes (int | None): Size bound of the stored bodies, unbounded if None.
+        """
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Bytes of the stored bodies, None until the first eviction scan.
+        # Writes of other processes only show at the next scan.
+        self._stored_bytes: int | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str) -> str:
+        """Build a readable, collision-safe file name for a URL.
+
+        Args:
+            url (str): The cached URL.
+
+        Returns:
+            str: File name without extension.
+        """
+        slug = re.sub('[^A-Za-z0-9]+', '_', url.split('://')[-1])
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return '{0}-{1}'.format(
+            slug.strip('_')[:KEY_SLUG_LENGTH], digest[:KEY_DIGEST_LENGTH],
+            )
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        """Read the entry of a URL and mark it as recently used.
+
+        Args:
+            url (str): The cached URL.
+
+        Returns:
+            CacheEntry | None: The entry, or None if the URL is not cached.
+        """
+        key = self.key(url)
+        body_path = self.directory / '{0}.body'.format(key)
+        meta_path = self.directory / '{0}.json'.format(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+        try:
+            body = body_path.read_bytes()
+        except OSError:
+            return None
+        if self.max_bytes is not None:
+            body_path.touch()
+        return CacheEntry(body=body, **meta)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """Check whether an entry can be served without revalidation.
+
+        Args:
+            entry (CacheEntry): The cached entry.
+
+        Returns:
+            bool: True while the entry is younger than the TTL.
+        """
+        if self.ttl is None:
+            return True
+        return time.time() - entry.stored_at < self.ttl
+
+    def store(self, url: str, body: bytes, headers: Mapping[str, str]) -> CacheEntry:
+        """Store a response, then evict old entries over the size bound.
+
+        Args:
+            url (str): The requested URL.
+            body (bytes): The response body.
+            headers (Mapping[str, str]): The response headers.
+
+        Returns:
+            CacheEntry: The stored entry.
+        """
+        entry = CacheEntry(
+            url=url,
+            stored_at=time.time(),
+            etag=headers.get('ETag'),
+            last_modified=headers.get('Last-Modified'),
+            body=body,
+            )
+        self.save(entry)
+        self.evict()
+        return entry
+
+    def save(self, entry: CacheEntry) -> None:
+        """Write an entry atomically, replacing the previous one.
+
+        Args:
+            entry (CacheEntry): The entry to write.
+        """
+        key = self.key(entry.url)
+        meta = asdict(entry)
+        meta.pop('body')
+        body_path = self.directory / '{0}.body'.format(key)
+        try:
+            replaced = body_path.stat().st_size
+        except OSError:
+            replaced = 0
+        self._write(body_path, entry.body)
+        with self._lock:
+            if self._stored_bytes is not None:
+                self._stored_bytes += len(entry.body) - replaced
+        self._write(
+            self.directory / '{0}.json'.format(key),
+            json.dumps(meta, indent=2).encode(),
+            )
+
+    def revalidated(self, entry: CacheEntry) -> CacheEntry:
+        """Restart the TTL of an entry confirmed by a 304 response.
+
+        Args:
+            entry (CacheEntry): The revalidated entry.
+
+        Returns:
+            CacheEntry: The same entry with a new storage time.
+        """
+        entry.stored_at = time.time()
+        self.save(entry)
+        return entry
+
+    def evict(self) -> int:
+        """Remove the least recently used entries over the size bound.
+
+        The directory is only scanned when the bodies stored
+        since the last scan may have crossed the bound.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        if self.max_bytes is None:
+            return 0
+        with self._lock:
+            if self._stored_bytes is not None and self._stored_bytes <= self.max_bytes:
+                return 0
+        bodies = [(path, path.stat()) for path in self.directory.glob('*.body')]
+        total = sum(stat.st_size for _, stat in bodies)
+        removed = 0
+        bodies.sort(key=lambda body: body[1].st_mtime)
+        for path, stat in bodies:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            path.with_suffix('.json').unlink(missing_ok=True)
+            total -= stat.st_size
+            removed += 1
+        with self._lock:
+            self._stored_bytes = total
+        return removed
+
+    def _write(self, path: Path, payload: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(payload)
+        os.replace(tmp_path, path)
+
+
+class CachingFetcher(object):
+    """Fetch pages through an `HttpCache` according to the mode."""
+
+    def __init__(
+        self, session: Any, cache: HttpCache, mode: str = LIVE, timeout: float | None = None,
+            ) -> None:
+        """Initialize the fetcher.
+
+        Its requests spend the rate budget of the process (`budget`).
+
+        Args:
+            session (Any): Async HTTP session with a requests-like `get`.
+            cache (HttpCache): Where the responses are kept.
+            mode (str): One of `live`, `record` or `replay`.
+            timeout (float | None): Seconds to wait for a response.
+        """
+        self.session = session
+        self.cache = cache
+        self.mode = mode
+        self.timeout = timeout
+        self.budget: RateBudget | None = get_rate_budget()
+
+    @classmethod
+    def from_env(cls, session: Any, timeout: float | None = None) -> 'CachingFetcher':
+        """Configure a fetcher from the `IMDB_*` environment variables.
+
+        Args:
+            session (Any): Async HTTP session with a requests-like `get`.
+            timeout (float | None): Seconds to wait for a response.
+
+        Returns:
+            CachingFetcher: The configured fetcher.
+        """
+        mode = os.environ.get('IMDB_HTTP_MODE', LIVE)
+        if mode in {RECORD, REPLAY}:
+            cache = HttpCache(
+                os.environ.get('IMDB_FIXTURES_DIR', FIXTURES_DIR), ttl=None, max_bytes=None,
+                )
+        else:
+            cache = HttpCache(
+                os.environ.get(
+                    'IMDB_CACHE_DIR', Path(tempfile.gettempdir()) / 'imdb_cache',
+                    ),
+                ttl=float(os.environ.get('IMDB_CACHE_TTL', '86400')),
+                max_bytes=int(os.environ.get('IMDB_CACHE_MAX_MB', '256')) * MEGABYTE,
+                )
+        return cls(session, cache, mode=mode, timeout=timeout)
+
+    async def fetch(self, url: str, headers: dict, revalidate: bool = False) -> bytes:
+        """Return the body of a page, from the cache when possible.
+
+        Args:
+            url (str): The page URL.
+            headers (dict): Request headers.
+            revalidate (bool): Revalidate a cached page even if it is fresh (live mode).
+
+        Returns:
+            bytes: The response body.
+        """
+        if self.mode == REPLAY:
+            return self.replay(url)
+        entry = self.cache.lookup(url)
+        if self.mode == LIVE and entry is not None:
+            if self.cache.is_fresh(entry) and not revalidate:
+                return entry.body
+            headers = {**headers, **entry.validators()}
+        response = await self.request(url, headers)
+        if response.status_code == NOT_MODIFIED and entry is not None:
+            logging.info('Revalidated {0}'.format(url))
+            return self.cache.revalidated(entry).body
+        response.raise_for_status()
+        return self.cache.store(url, response.content, response.headers).body
+
+    def replay(self, url: str) -> bytes:
+        """Return the recorded body of a page.
+
+        Args:
+            url (str): The page URL.
+
+        Raises:
+            ReplayMiss: No fixture for the URL.
+
+        Returns:
+            bytes: The recorded body.
+        """
+        entry = self.cache.lookup(url)
+        if entry is None:
+            raise ReplayMiss('No recorded response for `{0}`'.format(url))
+        return entry.body
+
+    async def request(self, url: str, headers: dict) -> Any:
+        """Send a request within the rate budget.
+
+        Args:
+            url (str): The page URL.
+            headers (dict): Request headers.
+
+        Returns:
+            Any: The response.
+        """
+        if self.budget is not None:
+            await self.budget.acquire()
+        return await self.session.get(url=url, headers=headers, timeout=self.timeout)
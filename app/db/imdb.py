@@ -0,0 +1,457 @@
+"""IMDb ingestion api module."""
+import asyncio
+import functools
+import html as HTML
+import logging
+import os
+import time
+import types
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from db.http_cache import CachingFetcher
+from db.ld_json import extract_ld_json
+from db.metrics import span
+from db.models import Actor, Base, Genre, Movie, MovieActor, MovieGenre
+from db.pools import get_session_maker
+from db.refresh import crawl_rows, stamp
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests_html import AsyncHTMLSession
+from sqlalchemy import literal, select, update
+from sqlalchemy.dialects.postgresql import Insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+IMDB_HEADERS = types.MappingProxyType({
+    'Accept': 'application/json, text/plain, */*',
+    'User-Agent': (
+        'Mozilla (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) ' +
+        'Chrome/84.0.4147.105 Safari/537.36'
+    ),
+    'Referer': 'https://www.imdb.com/',
+})
+MOVIE_FIELDS = ('movie_name', 'url', 'poster', 'description', 'rating')
+ACTOR_FIELDS = ('actor_name', 'image', 'url', 'description', 'birth_date')
+
+
+def upsert(model: type[Base], update_fields: tuple[str, ...]) -> Insert:
+    """Build an `INSERT ... ON CONFLICT (id) DO UPDATE` statement.
+
+    Args:
+        model (type[Base]): Mapped class with an `id` primary key.
+        update_fields (tuple[str, ...]): Columns refreshed for existing rows.
+
+    Returns:
+        Insert: Statement to execute with a list of rows.
+    """
+    stmt = pg_insert(model)
+    return stmt.on_conflict_do_update(
+        index_elements=[model.id],
+        set_={field_name: stmt.excluded[field_name] for field_name in update_fields},
+        )
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s :: %(levelname)s :: %(message)s',
+)
+
+
+class SharedHTMLSession(AsyncHTMLSession):
+    """Keep-alive HTTP session that can be shared between event loops.
+
+    `AsyncHTMLSession` binds the event loop it was created in,
+    this one runs requests in the loop of the caller, so a single
+    session (and its connection pool) serves the whole process.
+    """
+
+    def __init__(self, workers: int, pool_size: int) -> None:
+        """Initialize the session and size its connection pools.
+
+        Args:
+            workers (int): Threads running the blocking requests.
+            pool_size (int): Kept-alive connections per host.
+        """
+        super().__init__(workers=workers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, *args, **kwargs) -> asyncio.Future:
+        """Run a request in the thread pool of the session.
+
+        Args:
+            args (tuple): Positional arguments of `requests.Session.request`.
+            kwargs (dict): Keyword arguments of `requests.Session.request`.
+
+        Returns:
+            asyncio.Future: The pending response.
+        """
+        blocking_request = functools.partial(Session.request, self, *args, **kwargs)
+        return asyncio.get_running_loop().run_in_executor(self.thread_pool, blocking_request)
+
+    def pool_stats(self) -> dict:
+        """Collect statistics of the kept-alive connection pools.
+
+        Returns:
+            dict: Number of host pools, opened connections and sent requests.
+        """
+        host_pools = self.get_adapter('https://').poolmanager.pools
+        host_pools = [host_pools[host] for host in host_pools.keys()]
+        return {
+            'hosts': len(host_pools),
+            'connections': sum(pool.num_connections for pool in host_pools),
+            'requests': sum(pool.num_requests for pool in host_pools),
+        }
+
+
+@functools.cache
+def get_http_session() -> SharedHTMLSession:
+    """Return the HTTP session shared by the whole process.
+
+    Its size comes from `HTTP_WORKERS` (threads, 16 by default)
+    and `HTTP_POOL_SIZE` (connections per host, 16 by default).
+
+    Returns:
+        SharedHTMLSession: The session, created on first use.
+    """
+    return SharedHTMLSession(
+        workers=int(os.environ.get('HTTP_WORKERS', '16')),
+        pool_size=int(os.environ.get('HTTP_POOL_SIZE', '16')),
+        )
+
+
+@dataclass
+class IngestReport(object):
+    """Outcome and latency of one imported title."""
+
+    imdb_id: str
+    actors_added: int = 0
+    actors_failed: list[str] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+class MoviesApi(object):
+    """Main API class for handling movie, actor, and genre operations."""
+
+    def __init__(
+        self,
+        concurrency: int | None = None,
+        fetch_timeout: float | None = None,
+            ) -> None:
+        """Initialize the MoviesApi instance with database and session setup.
+
+        The database engine and the HTTP session are shared by the process,
+        so creating an instance does not open any connection.
+
+        Args:
+            concurrency (int): Maximum number of person pages fetched at once,
+                `IMDB_CONCURRENCY` or 8 by default.
+            fetch_timeout (float): Seconds to wait for a single page,
+                `IMDB_FETCH_TIMEOUT` or 10 by default.
+        """
+        self.concurrency = concurrency or int(os.environ.get('IMDB_CONCURRENCY', '8'))
+        self.fetch_timeout = fetch_timeout or float(os.environ.get('IMDB_FETCH_TIMEOUT', '10'))
+        self.async_session = get_session_maker()()
+        self.session = get_http_session()
+        self.fetcher = CachingFetcher.from_env(self.session, self.fetch_timeout)
+
+    @staticmethod
+    def get_id(url: str):
+        """Extract the ID from a given URL.
+
+        Args:
+            url (str): The URL from which to extract the ID.
+
+        Returns:
+            str: The extracted ID.
+        """
+        return url.split('/')[-2]
+
+    @staticmethod
+    def movie_row(movie_id: str, movie: dict) -> dict:
+        """Build a `movie` table row from IMDb title data.
+
+        Args:
+            movie_id (str): The IMDb ID of the movie.
+            movie (dict): The title ld+json payload.
+
+        Returns:
+            dict: Column values of the movie.
+        """
+        return {
+            'id': movie_id,
+            'movie_name': HTML.unescape(movie['name']),
+            'url': movie['url'],
+            'poster': movie['image'],
+            'description':  HTML.unescape(movie['description']),
+            'rating': movie['aggregateRating']['ratingValue'],
+        }
+
+    @staticmethod
+    def actor_row(actor_id: str, person: dict) -> dict:
+        """Build an `actor` table row from an IMDb person page.
+
+        Imports and refreshes both build it here, so their
+        content hashes are comparable.
+
+        Args:
+            actor_id (str): The IMDb ID of the actor.
+            person (dict): The person ld+json payload, its `mainEntity` holds the actor.
+
+        Returns:
+            dict: Column values of the actor.
+        """
+        actor_info = person['mainEntity']
+        return {
+            'id': actor_id,
+            'actor_name': actor_info['name'],
+            'image': actor_info['image'],
+            'url': actor_info['url'],
+            'description': HTML.unescape(actor_info['description']),
+            'birth_date': datetime.strptime(
+                actor_info['birthDate'],
+                '%Y-%m-%d',
+                ).date(),
+        }
+
+    async def store_genres(self, movie_id: str, genre_names: list[str]) -> None:
+        """Link a movie to its genres, creating the missing ones.
+
+        Runs in the transaction of `store_movie`.
+
+        Args:
+            movie_id (str): The IMDb ID of the movie.
+            genre_names (list[str]): Sorted names of the movie genres.
+        """
+        session = self.async_session
+        await session.execute(
+            pg_insert(Genre).on_conflict_do_nothing(index_elements=[Genre.genre_name]),
+            [{'genre_name': genre_name} for genre_name in genre_names],
+            )
+        genre_ids = select(literal(movie_id), Genre.id).where(
+            Genre.genre_name.in_(genre_names),
+            )
+        genre_ids = genre_ids.order_by(Genre.id)
+        await session.execute(
+            pg_insert(MovieGenre).from_select(
+                [MovieGenre.movie_id, MovieGenre.genre_id], genre_ids,
+                ).on_conflict_do_nothing(),
+            )
+
+    async def store_movie(
+        self, movie_row: dict, genre_names: list[str], actor_rows: list[dict],
+            ) -> None:
+        """Write a movie with its genres and cast in a single transaction.
+
+        Every table is written with one set-based
+        `INSERT ... ON CONFLICT` statement, genre names are resolved
+        to ids inside the database, so the number of round trips
+        does not depend on the size of the cast. Rows are written in
+        key order, so concurrent ingests sharing genres and actors
+        lock them in the same order instead of deadlocking.
+        The fetch of the movie and its cast is stamped in `crawl_state`.
+
+        Args:
+            movie_row (dict): Column values of the movie.
+            genre_names (list[str]): Names of the movie genres.
+            actor_rows (list[dict]): Column values of the cast.
+        """
+        genre_names = sorted(set(genre_names))
+        actors = {actor_row['id']: actor_row for actor_row in actor_rows}
+        actor_rows = [actors[actor_id] for actor_id in sorted(actors)]
+        session = self.async_session
+        async with session.begin():
+            await session.execute(upsert(Movie, MOVIE_FIELDS), [movie_row])
+            if genre_names:
+                await self.store_genres(movie_row['id'], genre_names)
+            if actor_rows:
+                await session.execute(upsert(Actor, ACTOR_FIELDS), actor_rows)
+                await session.execute(
+                    pg_insert(MovieActor).on_conflict_do_nothing(),
+                    [
+                        {'movie_id': movie_row['id'], 'actor_id': actor_row['id']}
+                        for actor_row in actor_rows
+                    ],
+                    )
+            fetched = crawl_rows([movie_row, *actor_rows], datetime.now())
+            await session.execute(stamp(), fetched)
+
+    async def fetch_ld_json(self, url: str, revalidate: bool = False) -> dict:
+        """Fetch an IMDb page and parse its ld+json payload.
+
+        The download and the parsing are timed
+        as the `fetch` and `parse` ingestion stages. Parsing stops
+        at the end of the ld+json script (`db.ld_json`).
+
+        Args:
+            url (str): URL of the page.
+            revalidate (bool): Revalidate a cached page even if it is fresh.
+
+        Returns:
+            dict: The ld+json payload of the page.
+        """
+        with span('fetch'):
+            page = await self.fetcher.fetch(url, dict(IMDB_HEADERS), revalidate=revalidate)
+        with span('parse'):
+            return extract_ld_json(page, url)
+
+    async def get_person(self, actor_id: str) -> dict:
+        """Fetch and returns person data from IMDb based on the provided actor ID.
+
+        Args:
+            actor_id (str): The IMDb ID of the actor.
+
+        Returns:
+            dict: A dictionary containing the actor's details.
+        """
+        url = 'https://www.imdb.com/name/{0}/'.format(actor_id)
+        logging.info(url)
+        return await self.fetch_ld_json(url)
+
+    async def get_movie(self, movie_id: str) -> dict:
+        """Fetch and returns movie data from IMDb based on the provided movie ID.
+
+        Args:
+            movie_id (str): The IMDb ID of the movie.
+
+        Returns:
+            dict: A dictionary containing the movie's details.
+        """
+        url = 'https://www.imdb.com/title/{0}/'.format(movie_id)
+        logging.info(url)
+        return await self.fetch_ld_json(url)
+
+    async def fetch_actor(self, actor_id: str, semaphore: asyncio.Semaphore) -> dict:
+        """Fetch an actor of a movie cast from IMDb.
+
+        Args:
+            actor_id (str): The IMDb ID of the actor.
+            semaphore (asyncio.Semaphore): Limits the number of concurrent fetches.
+
+        Returns:
+            dict: Column values of the actor.
+        """
+        async with semaphore:
+            logging.info('Producing actor: {0}'.format(actor_id))
+            person = await asyncio.wait_for(
+                self.get_person(actor_id), timeout=self.fetch_timeout,
+                )
+        return self.actor_row(actor_id, person)
+
+    async def fetch_cast(self, actor_ids: list[str]) -> list[dict | Exception]:
+        """Fetch the actors of a movie cast concurrently.
+
+        Args:
+            actor_ids (list[str]): IMDb IDs of the cast.
+
+        Returns:
+            list[dict | Exception]: Actor row or the error raised
+            while fetching it, in the order of `actor_ids`.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(
+            *[self.fetch_actor(actor_id, semaphore) for actor_id in actor_ids],
+            return_exceptions=True,
+            )
+
+    async def add_movie(self, movie_url: str) -> IngestReport:
+        """Add a new movie to the database based on the provided URL.
+
+        Person pages of the cast are fetched concurrently,
+        at most `concurrency` at a time. An actor that fails
+        or times out is logged and skipped without aborting the others.
+        The movie, its genres and cast are then written in one transaction.
+
+        Args:
+            movie_url (str): The URL of the movie to add.
+
+        Returns:
+            IngestReport: Added and failed actors and the time spent per stage.
+        """
+        started = time.perf_counter()
+        movie_id = self.get_id(movie_url)
+        report = IngestReport(imdb_id=movie_id)
+        movie = await self.get_movie(movie_id)
+        report.timings['movie_fetch'] = time.perf_counter() - started
+        logging.info('Producing movie: {0}'.format(movie_id))
+        movie_row = self.movie_row(movie_id, movie)
+        stage_started = time.perf_counter()
+        actor_ids = [self.get_id(actor['url']) for actor in movie['actor']]
+        actor_rows = []
+        for actor_id, act in zip(actor_ids, await self.fetch_cast(actor_ids)):
+            if isinstance(act, Exception):
+                logging.error('Failed to fetch actor {0}: {1!r}'.format(actor_id, act))
+                report.actors_failed.append(actor_id)
+            else:
+                actor_rows.append(act)
+        report.timings['actors_fetch'] = time.perf_counter() - stage_started
+        stage_started = time.perf_counter()
+        with span('write'):
+            await self.store_movie(movie_row, movie['genre'], actor_rows)
+        report.actors_added = len(actor_rows)
+        report.timings['write'] = time.perf_counter() - stage_started
+        report.timings['total'] = time.perf_counter() - started
+        logging.info('Ingested movie {0} in {1:.2f}s ({2} actors added, {3} failed)'.format(
+            movie_id,
+            report.timings['total'],
+            report.actors_added,
+            len(report.actors_failed),
+            ))
+        return report
+
+    async def add_actor(self, actor_url: str):
+        """Add a new actor to the database based on the provided URL.
+
+        Args:
+            actor_url (str): The URL of the actor to add.
+        """
+        actor_id = self.get_id(actor_url)
+        logging.info('Producing actor: {0}'.format(actor_id))
+        actor_row = self.actor_row(actor_id, await self.get_person(actor_id))
+        with span('write'):
+            async with self.async_session.begin():
+                await self.async_session.execute(upsert(Actor, ACTOR_FIELDS), [actor_row])
+                await self.async_session.execute(
+                    stamp(), crawl_rows([actor_row], datetime.now()),
+                    )
+
+    async def refresh(self, imdb_id: str, known_hash: str | None) -> bool:
+        """Fetch a stored movie or actor again, write it back if it changed.
+
+        The page is revalidated with a conditional request even if
+        the HTTP cache holds a fresh copy. Only the columns of the entity
+        itself are refreshed, not its genres or cast. A row whose
+        content hash matches `known_hash` is left untouched, only its
+        fetch is stamped in `crawl_state`. The write uses a session of
+        its own, so refreshes of one instance can run concurrently.
+
+        Args:
+            imdb_id (str): The IMDb ID of a movie (`tt...`) or an actor (`nm...`).
+            known_hash (str | None): Content hash of the last fetch, None if unknown.
+
+        Returns:
+            bool: True if the row changed and was written.
+        """
+        if imdb_id.startswith('tt'):
+            url = 'https://www.imdb.com/title/{0}/'.format(imdb_id)
+            model = Movie
+            row = self.movie_row(imdb_id, await self.fetch_ld_json(url, revalidate=True))
+        else:
+            url = 'https://www.imdb.com/name/{0}/'.format(imdb_id)
+            model = Actor
+            person = await self.fetch_ld_json(url, revalidate=True)
+            row = self.actor_row(imdb_id, person)
+        crawl_row = crawl_rows([row], datetime.now())
+        changed = crawl_row[0]['content_hash'] != known_hash
+        with span('write'):
+            async with get_session_maker().begin() as async_session:
+                if changed:
+                    columns = {name: row[name] for name in row.keys() - {'id'}}
+                    stmt = update(model).where(model.id == imdb_id)
+                    stmt = stmt.values(**columns)
+                    await async_session.execute(
+                        stmt.execution_options(synchronize_session=False),
+                        )
+                await async_session.execute(stamp(), crawl_row)
+        return changed
@@ -0,0 +1,165 @@
+"""Postgres-backed ingestion queue module.
+
+Jobs live in the `ingest_job` table. Workers claim them with
+`SELECT ... FOR UPDATE SKIP LOCKED`, so any number of worker processes
+can share the queue without double-processing a job. A failed job waits
+`RETRY_DELAY`, doubled at each attempt, before it can be claimed again,
+unless its failure is permanent and would only repeat.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from db.models import IngestJob
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(seconds=float(os.environ.get('INGEST_RETRY_DELAY', '30')))
+
+
+async def enqueue(
+    imdb_id: str,
+    session_maker: async_sessionmaker[AsyncSession],
+        ) -> IngestJob:
+    """Add an IMDb id to the ingestion queue.
+
+    Args:
+        imdb_id (str): The IMDb ID of a movie (`tt...`) or an actor (`nm...`).
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+
+    Returns:
+        IngestJob: The queued job.
+    """
+    async with session_maker() as async_session:
+        async with async_session.begin():
+            job = IngestJob(imdb_id=imdb_id)
+            async_session.add(job)
+    return job
+
+
+async def get_job(
+    job_id: uuid.UUID,
+    session_maker: async_sessionmaker[AsyncSession],
+        ) -> tuple[IngestJob | None, int]:
+    """Fetch a job with its position in the queue.
+
+    Args:
+        job_id (uuid.UUID): The ID of the job.
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+
+    Returns:
+        tuple[IngestJob | None, int]: The job, or None if it does not exist,
+        and the number of queued jobs ahead of it.
+    """
+    async with session_maker() as async_session:
+        job = await async_session.get(IngestJob, job_id)
+        if job is None or job.status != QUEUED:
+            return job, 0
+        ahead = await async_session.scalar(
+            select(func.count()).select_from(IngestJob).where(
+                IngestJob.status == QUEUED, IngestJob.created < job.created,
+                ),
+            )
+        return job, ahead
+
+
+async def claim(session_maker: async_sessionmaker[AsyncSession]) -> IngestJob | None:
+    """Take the oldest queued job and mark it as running.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+
+    Returns:
+        IngestJob | None: The claimed job, or None if no job is due.
+    """
+    async with session_maker() as async_session:
+        async with async_session.begin():
+            stmt = select(IngestJob).where(
+                IngestJob.status == QUEUED, IngestJob.run_after <= datetime.now(),
+                )
+            job = await async_session.scalar(
+                stmt.order_by(IngestJob.created).limit(1).with_for_update(skip_locked=True),
+                )
+            if job is not None:
+                job.status = RUNNING
+                job.attempts += 1
+                job.started = datetime.now()
+    return job
+
+
+async def finish(
+    job: IngestJob,
+    session_maker: async_sessionmaker[AsyncSession],
+    report: dict | None = None,
+    error: str | None = None,
+    permanent: bool = False,
+        ) -> None:
+    """Record the outcome of a claimed job.
+
+    A failed job goes back to the queue, to be retried after
+    `RETRY_DELAY` doubled at each attempt, until it used up `MAX_ATTEMPTS`.
+    A permanent failure fails the job at once.
+
+    Args:
+        job (IngestJob): The claimed job.
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        report (dict | None): Timings and results of a successful import.
+        error (str | None): Description of the failure.
+        permanent (bool): The failure would repeat on a retry.
+    """
+    finished = datetime.now()
+    columns = {'report': report, 'error': error, 'finished': finished}
+    if error is None:
+        columns['status'] = DONE
+    elif permanent or job.attempts >= MAX_ATTEMPTS:
+        columns['status'] = FAILED
+    else:
+        columns['status'] = QUEUED
+        columns['run_after'] = finished + RETRY_DELAY * 2 ** (job.attempts - 1)
+    async with session_maker() as async_session:
+        async with async_session.begin():
+            await async_session.execute(
+                update(IngestJob).where(IngestJob.id == job.id).values(**columns),
+                )
+
+
+async def requeue_stale(
+    timeout: float,
+    session_maker: async_sessionmaker[AsyncSession],
+        ) -> int:
+    """Put back jobs left running by a worker that died.
+
+    They are retried after the same delay as failed jobs; jobs that
+    already used up `MAX_ATTEMPTS` are marked as failed instead.
+
+    Args:
+        timeout (float): Seconds after which a running job is considered lost.
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+
+    Returns:
+        int: Number of requeued jobs.
+    """
+    now = datetime.now()
+    backoff = func.power(2, IngestJob.attempts - 1)
+    async with session_maker() as async_session:
+        async with async_session.begin():
+            query = await async_session.execute(
+                update(IngestJob).where(
+                    IngestJob.status == RUNNING,
+                    IngestJob.started < now - timedelta(seconds=timeout),
+                    ).values(
+                    status=case((IngestJob.attempts < MAX_ATTEMPTS, QUEUED), else_=FAILED),
+                    run_after=now + RETRY_DELAY * backoff,
+                    ),
+                )
+    return query.rowcount
@@ -0,0 +1,73 @@
+"""IMDb ld+json extraction module.
+
+IMDb pages carry their data in an `application/ld+json` script near the
+top of the page. `extract_ld_json` scans the raw bytes for the first such
+script and decodes it, leaving the rest of the page (hundreds of
+kilobytes of markup) unread. Script contents are raw text in HTML, so
+the bytes between the tags are exactly the text lxml would give.
+
+A page whose layout does not fit the scan (no script found, or a block
+that is not valid JSON, e.g. commented out) is parsed whole with lxml.
+"""
+import json
+import logging
+import re
+
+from lxml import html
+
+LD_JSON_START = re.compile(
+    rb'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json\b[^>]*>', re.IGNORECASE,
+)
+SCRIPT_END = re.compile(rb'</script\s*>', re.IGNORECASE)
+LD_JSON_XPATH = "//script[@type='application/ld+json']"
+
+
+def scan_ld_json(page: bytes) -> dict | None:
+    """Decode the first ld+json script of a page, stopping at its end.
+
+    Args:
+        page (bytes): The HTML page.
+
+    Returns:
+        dict | None: The payload, None if the scan found no valid block.
+    """
+    start = LD_JSON_START.search(page)
+    if start is None:
+        return None
+    end = SCRIPT_END.search(page, start.end())
+    if end is None:
+        return None
+    try:
+        return json.loads(page[start.end():end.start()])
+    except ValueError:
+        return None
+
+
+def parse_ld_json(page: bytes) -> dict:
+    """Parse the whole page and decode its first ld+json script.
+
+    Args:
+        page (bytes): The HTML page.
+
+    Returns:
+        dict: The payload.
+    """
+    scripts = html.fromstring(page).xpath(LD_JSON_XPATH)
+    return json.loads(scripts[0].text)
+
+
+def extract_ld_json(page: bytes, url: str = '') -> dict:
+    """Decode the ld+json payload of a page, by scanning when possible.
+
+    Args:
+        page (bytes): The HTML page.
+        url (str): URL of the page, for the log.
+
+    Returns:
+        dict: The payload.
+    """
+    payload = scan_ld_json(page)
+    if payload is None:
+        logging.warning('Unexpected layout of {0}, parsing the whole page'.format(url))
+        payload = parse_ld_json(page)
+    return payload
@@ -0,0 +1,30 @@
+"""Per-view loading profiles module.
+
+Relationships in `db.models` are never loaded implicitly (`lazy='raise'`),
+so every query states what the page it serves actually renders.
+Pass a profile to `select(...).options(*PROFILE)`.
+"""
+
+from db.models import Actor, Genre, Movie
+from sqlalchemy.orm import load_only, selectinload
+
+# Poster grid of `index.html`: no relationships, only the tile columns.
+MOVIE_LIST = (
+    load_only(Movie.id, Movie.movie_name, Movie.poster, Movie.rating),
+)
+
+# Actor grid of `actors.html`.
+ACTOR_LIST = (
+    load_only(Actor.id, Actor.actor_name, Actor.image, Actor.birth_date),
+)
+
+# `detail.html`: the movie plus one hop to its cast and genres.
+MOVIE_DETAIL = (
+    selectinload(Movie.actors).load_only(Actor.id, Actor.actor_name),
+    selectinload(Movie.genres).load_only(Genre.genre_name),
+)
+
+# `actor.html`: the actor plus one hop to the filmography.
+ACTOR_DETAIL = (
+    selectinload(Actor.movies).load_only(Movie.id, Movie.movie_name),
+)
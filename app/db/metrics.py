@@ -0,0 +1,144 @@
+"""Process metrics module.
+
+Durations and counts are aggregated into histograms kept in the
+process, one series per label value, and rendered in the Prometheus
+text format: the web server serves them on `GET /metrics`, the worker
+on `WORKER_METRICS_PORT`. Each process reports its own series,
+scrape every gunicorn worker (or sum them in Prometheus).
+"""
+import contextlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterator
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@dataclass
+class Series(object):
+    """Bucket counts, count and sum of the measures of one label value."""
+
+    buckets: list[int] = field(default_factory=list)
+    count: int = 0
+    total: float = 0
+
+
+class Histogram(object):
+    """Thread-safe Prometheus histogram with one label."""
+
+    def __init__(self, name: str, description: str, label: str, buckets: tuple) -> None:
+        """Initialize a histogram without series.
+
+        Args:
+            name (str): Metric name.
+            description (str): Help text of the metric.
+            label (str): Name of the label telling the series apart.
+            buckets (tuple): Upper bounds of the buckets, ascending.
+        """
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self._series: dict[str, Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, measured: float) -> None:
+        """Add a measure to the series of a label value.
+
+        Args:
+            label_value (str): Value of the label.
+            measured (float): The measure.
+        """
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = Series([0 for _ in self.buckets])
+                self._series[label_value] = series
+            for index, bound in enumerate(self.buckets):
+                if measured <= bound:
+                    series.buckets[index] += 1
+            series.count += 1
+            series.total += measured
+
+    def render(self) -> list[str]:
+        """Render the histogram in the Prometheus text format.
+
+        Returns:
+            list[str]: Lines of the metric, cumulative bucket counts,
+            count and sum of every series.
+        """
+        lines = [
+            '# HELP {0} {1}'.format(self.name, self.description),
+            '# TYPE {0} histogram'.format(self.name),
+        ]
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                label = '{0}="{1}"'.format(self.label, label_value)
+                bounds = [*self.buckets, '+Inf']
+                for bound, bucket_count in zip(bounds, [*series.buckets, series.count]):
+                    lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(
+                        self.name, label, bound, bucket_count,
+                        ))
+                lines.append('{0}_count{{{1}}} {2}'.format(self.name, label, series.count))
+                lines.append('{0}_sum{{{1}}} {2}'.format(self.name, label, series.total))
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to answer a request.', 'route', DURATION_BUCKETS,
+    )
+REQUEST_SQL_SECONDS = Histogram(
+    'http_request_sql_seconds', 'Time spent in SQL statements per request.',
+    'route', DURATION_BUCKETS,
+    )
+REQUEST_SQL_STATEMENTS = Histogram(
+    'http_request_sql_statements', 'SQL statements run per request.', 'route', COUNT_BUCKETS,
+    )
+REQUEST_RENDER_SECONDS = Histogram(
+    'http_request_render_seconds', 'Time spent rendering templates per request.',
+    'route', DURATION_BUCKETS,
+    )
+INGEST_SECONDS = Histogram(
+    'ingest_stage_duration_seconds', 'Time spent in each IMDb ingestion stage.',
+    'stage', DURATION_BUCKETS,
+    )
+HISTOGRAMS = (
+    REQUEST_SECONDS,
+    REQUEST_SQL_SECONDS,
+    REQUEST_SQL_STATEMENTS,
+    REQUEST_RENDER_SECONDS,
+    INGEST_SECONDS,
+)
+
+
+@contextlib.contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time an ingestion stage, `fetch`, `parse` or `write`.
+
+    Args:
+        stage (str): Name of the stage.
+
+    Yields:
+        None: Control while the stage runs.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        INGEST_SECONDS.observe(stage, time.perf_counter() - started)
+
+
+def render_metrics() -> str:
+    """Render all the histograms in the Prometheus text format.
+
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.append('')
+    return '\n'.join(lines)
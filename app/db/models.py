@@ -1,24 +1,63 @@
-"""Models and api module."""
-import html as HTML
-import json
-import logging
-import os
+"""Models module."""
 import uuid
 from datetime import date, datetime
+from decimal import Decimal
 
-from lxml import html
-from requests_html import AsyncHTMLSession
-from sqlalchemy import CheckConstraint, ForeignKey, UniqueConstraint, select
-from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
-                                    create_async_engine)
+from sqlalchemy import (BigInteger, CheckConstraint, DateTime, ForeignKey,
+                        Index, UniqueConstraint, func, inspect)
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.orm import (DeclarativeBase, Mapped, MappedColumn,
                             mapped_column, relationship)
-from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import Column, Computed
+
+# Checked by the `description_valid_length` constraints.
+DESCRIPTION_MAX_LENGTH = 300
 
 
 class Base(DeclarativeBase):
     """Base class for declarative models."""
 
+    def as_dict(self) -> dict:
+        """Serialize the loaded column attributes of the instance.
+
+        Attributes deferred by the query are skipped,
+        so serializing never triggers a lazy load.
+
+        Returns:
+            dict: Column names mapped to their values.
+        """
+        state = inspect(self)
+        return {
+            c_attr.key: getattr(self, c_attr.key)
+            for c_attr in state.mapper.column_attrs
+            if c_attr.key not in state.unloaded
+        }
+
+
+def search_vector(title_column: str) -> Column:
+    """Build a generated full-text search column.
+
+    Postgres computes the column from the title (weight A)
+    and the description (weight B) on every insert and update.
+    It is not mapped (see `exclude_properties`), so the ORM never
+    loads or writes it, queries use it as `Movie.search`.
+
+    Args:
+        title_column (str): Name of the title column.
+
+    Returns:
+        Column: The `search` tsvector column.
+    """
+    return Column(
+        'search',
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce({0}, '')), 'A') || ".format(title_column) +
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+    )
+
 
 class CreatedMixin(object):
     """Mixin class to automatically set the creation timestamp."""
@@ -30,16 +69,43 @@ class MovieActor(Base):
     """Association table between movies and actors."""
 
     __tablename__ = 'movie_actor'
-    movie_id: Mapped[str] = mapped_column(ForeignKey('movie.id'), primary_key=True)
-    actor_id: Mapped[str] = mapped_column(ForeignKey('actor.id'), primary_key=True)
+    movie_id: Mapped[str] = mapped_column(
+        ForeignKey('movie.id', ondelete='CASCADE'), primary_key=True,
+        )
+    actor_id: Mapped[str] = mapped_column(
+        ForeignKey('actor.id', ondelete='CASCADE'), primary_key=True,
+        )
+    # Set by the database, also for links added through the relationships.
+    created: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    # The primary key starts with movie_id: filmographies need the reverse.
+    __table_args__ = (
+        Index('movie_actor_actor_idx', 'actor_id', 'movie_id'),
+        Index('movie_actor_created_idx', 'created'),
+    )
 
 
 class MovieGenre(Base):
     """Association table between movies and genres."""
 
     __tablename__ = 'movie_genre'
-    movie_id: Mapped[str] = mapped_column(ForeignKey('movie.id'), primary_key=True)
-    genre_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('genre.id'), primary_key=True)
+    movie_id: Mapped[str] = mapped_column(
+        ForeignKey('movie.id', ondelete='CASCADE'), primary_key=True,
+        )
+    genre_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True,
+        )
+    # Copy of the movie rating, set and kept by database triggers,
+    # so the best movies of a genre are read off one index.
+    rating: Mapped[float]
+    # Set by the database, also for links added through the relationships.
+    created: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    __table_args__ = (
+        Index('movie_genre_genre_idx', 'genre_id', 'movie_id'),
+        Index('movie_genre_rating_idx', 'genre_id', 'rating', 'movie_id'),
+        Index('movie_genre_created_idx', 'created'),
+    )
 
 
 class Movie(CreatedMixin, Base):
@@ -53,22 +119,31 @@ class Movie(CreatedMixin, Base):
     poster: MappedColumn[str]
     description: MappedColumn[str]
     rating: MappedColumn[float]
+    search = search_vector('movie_name')
 
     genres: Mapped[list['Genre']] = relationship(
         secondary='movie_genre',
         back_populates='movies',
-        lazy='selectin',
+        lazy='raise',
+        passive_deletes=True,
         )
 
     actors: Mapped[list['Actor']] = relationship(
         secondary='movie_actor',
         back_populates='movies',
-        lazy='selectin',
+        lazy='raise',
+        passive_deletes=True,
         )
 
     __table_args__ = (
-        CheckConstraint('length(description) < 300', 'description_valid_length'),
+        CheckConstraint(
+            'length(description) < {0}'.format(DESCRIPTION_MAX_LENGTH), 'description_valid_length',
+            ),
+        Index('movie_search_idx', 'search', postgresql_using='gin'),
+        Index('movie_rating_idx', 'rating', 'id'),
+        Index('movie_created_idx', 'created'),
     )
+    __mapper_args__ = {'exclude_properties': ['search']}
 
 
 class Actor(CreatedMixin, Base):
@@ -82,16 +157,34 @@ class Actor(CreatedMixin, Base):
     url: MappedColumn[str]
     description: MappedColumn[str]
     birth_date: MappedColumn[date]
+    search = search_vector('actor_name')
 
     movies: Mapped[list[Movie]] = relationship(
         secondary='movie_actor',
         back_populates='actors',
-        lazy='selectin',
+        lazy='raise',
+        passive_deletes=True,
         )
 
     __table_args__ = (
-        CheckConstraint('length(description) < 300', 'description_valid_length'),
+        CheckConstraint(
+            'length(description) < {0}'.format(DESCRIPTION_MAX_LENGTH), 'description_valid_length',
+            ),
+        Index('actor_search_idx', 'search', postgresql_using='gin'),
+        Index('actor_name_idx', 'actor_name', 'id'),
+        Index('actor_created_idx', 'created'),
     )
+    __mapper_args__ = {'exclude_properties': ['search']}
+
+
+# Typeahead prefix lookups: the pattern ops let `LIKE 'abc%'` and
+# `ORDER BY ... USING ~<~` walk the index whatever the database collation.
+for folded_name in (Movie.movie_name, Actor.actor_name):
+    Index(
+        '{0}_prefix_idx'.format(folded_name.key),
+        func.lower(folded_name).label('folded'),
+        postgresql_ops={'folded': 'text_pattern_ops'},
+        )
 
 
 class Genre(Base):
@@ -104,7 +197,8 @@ class Genre(Base):
     movies: Mapped[list[Movie]] = relationship(
         secondary='movie_genre',
         back_populates='genres',
-        lazy='selectin',
+        lazy='raise',
+        passive_deletes=True,
         )
 
     __table_args__ = (
@@ -113,249 +207,116 @@ class Genre(Base):
     )
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s :: %(levelname)s :: %(message)s',
-)
+class IngestJob(Base):
+    """Represents a queued IMDb import handled by the background worker."""
 
+    __tablename__ = 'ingest_job'
 
-class MoviesApi(object):
-    """Main API class for handling movie, actor, and genre operations."""
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    imdb_id: MappedColumn[str]
+    status: Mapped[str] = mapped_column(default='queued')
+    attempts: Mapped[int] = mapped_column(default=0)
+    error: Mapped[str | None]
+    report: Mapped[dict | None] = mapped_column(JSONB)
+    created: Mapped[datetime] = mapped_column(default=datetime.now)
+    started: Mapped[datetime | None]
+    finished: Mapped[datetime | None]
+    # Earliest time a queued job is claimed, pushed back after each failure.
+    run_after: Mapped[datetime] = mapped_column(default=datetime.now)
 
-    def __init__(self) -> None:
-        """Initialize the MoviesApi instance with database and session setup."""
-        self.engine = create_async_engine(self.get_db_url(), poolclass=NullPool)
-        self.async_session = async_sessionmaker(
-            self.engine, expire_on_commit=False,
-        )()
-        Base.metadata.bind = self.engine
-        self.session = AsyncHTMLSession()
+    __table_args__ = (
+        Index(
+            'ingest_job_queued_idx', 'created',
+            postgresql_where="status = 'queued'",
+            ),
+    )
 
-    @staticmethod
-    def get_db_url() -> str:
-        """Generate the database URL using environment variables.
 
-        This function constructs the database URL
-        using the provided environment variables
-        for the PostgreSQL database connection.
+class CrawlState(Base):
+    """Last IMDb fetch of a movie or an actor, read by the refresher.
 
-        Returns:
-            str: The constructed database URL.
-        """
-        pg_vars = (
-            'POSTGRES_INNER_HOST',
-            'POSTGRES_INNER_PORT',
-            'POSTGRES_USER',
-            'POSTGRES_PASSWORD',
-            'POSTGRES_DB',
-            )
-        credentials = {pr: os.environ.get(pr) for pr in pg_vars}
-        return (
-            'postgresql+psycopg://' +
-            '{POSTGRES_USER}:{POSTGRES_PASSWORD}' +
-            '@{POSTGRES_INNER_HOST}:{POSTGRES_INNER_PORT}' +
-            '/{POSTGRES_DB}'
-        ).format(**credentials)
-
-    @staticmethod
-    def get_id(url: str):
-        """Extract the ID from a given URL.
-
-        Args:
-            url (str): The URL from which to extract the ID.
+    Kept apart from `movie` and `actor`: stamping a fetch or counting
+    a view does not change the catalog, so it must not bump its version.
+    """
 
-        Returns:
-            str: The extracted ID.
-        """
-        return url.split('/')[-2]
+    __tablename__ = 'crawl_state'
 
-    async def insert_data_movie_genre(self, movie: Movie, genre: Genre, session: AsyncSession):
-        """Insert or associates a movie with a genre in the database.
+    imdb_id: Mapped[str] = mapped_column(primary_key=True)
+    last_fetched: Mapped[datetime | None]
+    # SHA-256 of the columns stored from the page at the last fetch.
+    content_hash: Mapped[str | None]
+    views: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
 
-        Args:
-            movie (Movie): The movie entity.
-            genre (Genre): The genre entity.
-            session (AsyncSession): The database session.
+    __table_args__ = (
+        Index('crawl_state_last_fetched_idx', 'last_fetched'),
+        Index('crawl_state_views_idx', 'views'),
+    )
 
-        """
-        async with session.begin():
-            movie_stmt = (
-                await session.execute(
-                    select(Movie).where(Movie.id == movie.id),
-                    )
-                )
-            genre_stmt = (
-                await session.execute(
-                    select(Genre).where(Genre.genre_name == genre.genre_name),
-                    )
-                )
-            movie_result = movie_stmt.scalars().first()
-            genre_result = genre_stmt.scalars().first()
-            if genre_result is not None:
-                genre = genre_result
-            else:
-                session.add(genre)
-            if movie_result is not None:
-                movie = movie_result
-            else:
-                session.add(movie)
-            movie.genres.append(genre)
-
-    async def insert_data_movie_actor(self, movie: Movie, actor: Actor, session: AsyncSession):
-        """Insert or associates a movie with an actor in the database.
-
-        Args:
-            movie (Movie): The movie entity.
-            actor (Actor): The actor entity.
-            session (AsyncSession): The database session.
 
-        """
-        async with session.begin():
-            movie_stmt = (
-                await session.execute(
-                    select(Movie).where(Movie.id == movie.id),
-                    )
-                )
-            actor_stmt = (
-                await session.execute(
-                    select(Actor).where(Actor.id == actor.id),
-                    )
-                )
-            movie_result = movie_stmt.scalars().first()
-            actor_result = actor_stmt.scalars().first()
-            if actor_result is not None:
-                actor = actor_result
-            else:
-                session.add(actor)
-            if movie_result is not None:
-                movie = movie_result
-            else:
-                session.add(movie)
-            movie.actors.append(actor)
-
-    async def get_person(self, actor_id: str) -> dict:
-        """Fetch and returns person data from IMDb based on the provided actor ID.
-
-        Args:
-            actor_id (str): The IMDb ID of the actor.
+class CatalogVersion(Base):
+    """Single-row counter of catalog changes.
 
-        Returns:
-            dict: A dictionary containing the actor's details.
-        """
-        url = 'https://www.imdb.com/name/{0}/'.format(actor_id)
-        logging.info(url)
-        headers = {
-            'Accept': 'application/json, text/plain, */*',
-            'User-Agent': (
-                'Mozilla (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) ' +
-                'Chrome/84.0.4147.105 Safari/537.36'
-            ),
-            'Referer': 'https://www.imdb.com/',
-            }
+    Database triggers bump it when a transaction that changed movies,
+    actors, genres or their links commits, whichever process made it.
+    """
 
-        response = await self.session.get(url=url, headers=headers)
-        res_result = html.fromstring(response.content)
-        res_result = res_result.xpath("//script[@type='application/ld+json']")
-        return json.loads(res_result[0].text)
+    __tablename__ = 'catalog_version'
 
-    async def get_movie(self, movie_id: str) -> dict:
-        """Fetch and returns movie data from IMDb based on the provided movie ID.
+    id: Mapped[int] = mapped_column(primary_key=True)
+    counter: Mapped[int] = mapped_column(BigInteger, default=0)
+    modified: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    txid: Mapped[int | None] = mapped_column(BigInteger)
 
-        Args:
-            movie_id (str): The IMDb ID of the movie.
 
-        Returns:
-            dict: A dictionary containing the movie's details.
-        """
-        url = 'https://www.imdb.com/title/{0}/'.format(movie_id)
-        logging.info(url)
-        headers = {
-            'Accept': 'application/json, text/plain, */*',
-            'User-Agent': (
-                'Mozilla (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) ' +
-                'Chrome/84.0.4147.105 Safari/537.36'
+class NameWord(Base):
+    """Dictionary of the words of movie and actor names.
+
+    Filled by database triggers when names are written, and used to
+    correct typos in the typeahead. Words are never removed.
+    """
+
+    __tablename__ = 'name_word'
+
+    word: Mapped[str] = mapped_column(primary_key=True)
+
+    __table_args__ = (
+        Index(
+            'name_word_trgm_idx', 'word',
+            postgresql_using='gist', postgresql_ops={'word': 'gist_trgm_ops'},
             ),
-            'Referer': 'https://www.imdb.com/',
-            }
+    )
 
-        response = await self.session.get(url=url, headers=headers)
-        res_result = html.fromstring(response.content)
-        res_result = res_result.xpath("//script[@type='application/ld+json']")
-        return json.loads(res_result[0].text)
 
-    async def add_movie(self, movie_url: str):
-        """Add a new movie to the database based on the provided URL.
+class GenreStats(Base):
+    """Movie count and rating total of a genre.
 
-        Args:
-            movie_url (str): The URL of the movie to add.
-        """
-        movie_id = self.get_id(movie_url)
-        movie = await self.get_movie(movie_id)
-        logging.info('Producing movie: {0}'.format(movie_id))
-        mv = Movie(
-            **{
-                'id': movie_id,
-                'movie_name': HTML.unescape(movie['name']),
-                'url': movie['url'],
-                'poster': movie['image'],
-                'description':  HTML.unescape(movie['description']),
-                'rating': movie['aggregateRating']['ratingValue'],
-            })
-        for genre in movie['genre']:
-            logging.info('Producing genre: {0}'.format(genre))
-            gn = Genre(
-                **{
-                    'genre_name': genre,
-                })
-            try:
-                await self.insert_data_movie_genre(mv, gn, self.async_session)
-            except Exception as err:
-                logging.exception(err)
-        for actor in movie['actor']:
-            actor_id = self.get_id(actor['url'])
-            logging.info('Producing actor: {0}'.format(actor_id))
-            actor_info = await self.get_person(actor_id)
-            actor_info = actor_info['mainEntity']
-            act = Actor(
-                **{
-                    'id': actor_id,
-                    'actor_name': actor_info['name'],
-                    'image': actor_info['image'],
-                    'url': actor_info['url'],
-                    'description': HTML.unescape(actor_info['description']),
-                    'birth_date': datetime.strptime(
-                        actor_info['birthDate'],
-                        '%Y-%m-%d',
-                        ).date(),
-                })
-            try:
-                await self.insert_data_movie_actor(mv, act, self.async_session)
-            except Exception as exc:
-                logging.exception(exc)
-
-    async def add_actor(self, actor_url: str):
-        """Add a new actor to the database based on the provided URL.
-
-        Args:
-            actor_url (str): The URL of the actor to add.
-        """
-        actor_id = self.get_id(actor_url)
-        logging.info('Producing actor: {0}'.format(actor_id))
-        actor_info = await self.get_person(actor_id)
-        actor = Actor(
-            **{
-                'id': actor_id,
-                'actor_name': actor_info['name'],
-                'image': actor_info['image'],
-                'url': actor_info['url'],
-                'description': HTML.unescape(actor_info['description']),
-                'birth_date': datetime.strptime(
-                    actor_info['birthDate'],
-                    '%Y-%m-%d',
-                    ).date(),
-            })
-        with self.async_session.begin():
-            try:
-                self.async_session.add(actor)
-            except Exception as exc:
-                logging.exception(exc)
+    Database triggers add the changes of `movie_genre` and of movie
+    ratings to the row of each affected genre.
+    """
+
+    __tablename__ = 'genre_stats'
+
+    genre_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True,
+        )
+    movies: Mapped[int]
+    rating_sum: Mapped[Decimal]
+
+
+class ActorStats(Base):
+    """Filmography size of an actor.
+
+    Database triggers add the changes of `movie_actor` to the row
+    of each affected actor.
+    """
+
+    __tablename__ = 'actor_stats'
+
+    actor_id: Mapped[str] = mapped_column(
+        ForeignKey('actor.id', ondelete='CASCADE'), primary_key=True,
+        )
+    movies: Mapped[int]
+
+    __table_args__ = (
+        Index('actor_stats_movies_idx', 'movies', 'actor_id'),
+    )
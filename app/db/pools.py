@@ -0,0 +1,177 @@
+"""Process-wide database connection pool module.
+
+The web server, the ingestion worker and `MoviesApi` share one engine per
+process, so connections are reused across requests and imports instead of
+being opened for every `MoviesApi` instance.
+
+Pool settings come from the environment: `DB_POOL_SIZE`, `DB_MAX_OVERFLOW`,
+`DB_POOL_TIMEOUT` (seconds to wait for a free connection) and
+`DB_POOL_RECYCLE` (seconds before a connection is replaced).
+
+A forked child (gunicorn workers of a preloaded app) starts with an
+empty pool of its own instead of sharing the connections of its parent.
+"""
+import functools
+import os
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import (AsyncEngine, AsyncSession,
+                                    async_sessionmaker, create_async_engine)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+def get_db_url() -> str:
+    """Generate the database URL using environment variables.
+
+    This function constructs the database URL
+    using the provided environment variables
+    for the PostgreSQL database connection.
+
+    Returns:
+        str: The constructed database URL.
+    """
+    pg_vars = (
+        'POSTGRES_INNER_HOST',
+        'POSTGRES_INNER_PORT',
+        'POSTGRES_USER',
+        'POSTGRES_PASSWORD',
+        'POSTGRES_DB',
+        )
+    credentials = {pr: os.environ.get(pr) for pr in pg_vars}
+    return (
+        'postgresql+psycopg://' +
+        '{POSTGRES_USER}:{POSTGRES_PASSWORD}' +
+        '@{POSTGRES_INNER_HOST}:{POSTGRES_INNER_PORT}' +
+        '/{POSTGRES_DB}'
+    ).format(**credentials)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that measures how long checkouts wait for a connection.
+
+    Only checkouts of a pool at capacity wait, for another one to check
+    a connection in. Opening new connections is timed apart.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Initialize the pool with empty checkout counters.
+
+        Args:
+            args (tuple): Positional arguments of `AsyncAdaptedQueuePool`.
+            kwargs (dict): Keyword arguments of `AsyncAdaptedQueuePool`.
+        """
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0
+        self.wait_max = 0
+        self.connects = 0
+        self.connect_total = 0
+
+    def connect(self):
+        """Check out a connection, counting the checkouts that time out.
+
+        Raises:
+            exc.TimeoutError: No connection was freed within the pool timeout.
+
+        Returns:
+            PoolProxiedConnection: The checked out connection.
+        """
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        self.checkouts += 1
+        return connection
+
+    def _do_get(self):
+        """Take a connection, recording the wait of a pool at capacity.
+
+        Returns:
+            ConnectionPoolEntry: A pooled or a new connection.
+        """
+        if self.overflow() < self._max_overflow or self._max_overflow < 0:
+            return super()._do_get()
+        started = time.perf_counter()
+        entry = super()._do_get()
+        waited = time.perf_counter() - started
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return entry
+
+    def _create_connection(self):
+        """Open a new connection, recording the time it takes.
+
+        Returns:
+            ConnectionPoolEntry: The new connection.
+        """
+        started = time.perf_counter()
+        connection = super()._create_connection()
+        self.connects += 1
+        self.connect_total += time.perf_counter() - started
+        return connection
+
+
+@functools.cache
+def get_engine() -> AsyncEngine:
+    """Return the engine shared by the whole process.
+
+    Returns:
+        AsyncEngine: The pooled engine, created on first use.
+    """
+    return create_async_engine(
+        get_db_url(),
+        poolclass=TimedQueuePool,
+        pool_size=int(os.environ.get('DB_POOL_SIZE', '5')),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', '10')),
+        pool_timeout=float(os.environ.get('DB_POOL_TIMEOUT', '30')),
+        pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+        pool_pre_ping=True,
+    )
+
+
+@functools.cache
+def get_session_maker() -> async_sessionmaker[AsyncSession]:
+    """Return the session maker bound to the shared engine.
+
+    Returns:
+        async_sessionmaker[AsyncSession]: The shared session maker.
+    """
+    return async_sessionmaker(get_engine(), expire_on_commit=False)
+
+
+def pool_stats() -> dict:
+    """Collect the statistics of the shared connection pool.
+
+    Returns:
+        dict: Pool size, checked in/out and overflow connections,
+        number of checkouts, timeouts and the time spent waiting for them,
+        number of connections opened and the time spent opening them.
+    """
+    pool = get_engine().pool
+    return {
+        'size': pool.size(),
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': pool.overflow(),
+        'checkouts': pool.checkouts,
+        'timeouts': pool.timeouts,
+        'wait_seconds_total': pool.wait_total,
+        'wait_seconds_max': pool.wait_max,
+        'connects': pool.connects,
+        'connect_seconds_total': pool.connect_total,
+    }
+
+
+def reset_after_fork() -> None:
+    """Forget the connections inherited from the parent process.
+
+    They are left open for the parent: the child opens its own.
+    """
+    if get_engine.cache_info().currsize:
+        get_engine().sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
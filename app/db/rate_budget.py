@@ -0,0 +1,73 @@
+"""IMDb request-rate budget module.
+
+Every request sent to IMDb by a process, imports and refreshes alike,
+takes a token from one bucket refilled at `IMDB_RATE_LIMIT` tokens per
+second, up to `IMDB_RATE_BURST`. A request finding the bucket empty
+reserves the next token and sleeps until it is due, so waiting requests
+leave in order and the process never exceeds the rate. Cache hits and
+replayed pages are free.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+
+
+class RateBudget(object):
+    """Thread-safe token bucket shared by the event loops of a process."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        """Initialize a full bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            burst (float): Capacity of the bucket.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RateBudget | None':
+        """Configure a budget from the `IMDB_RATE_*` environment variables.
+
+        Returns:
+            RateBudget | None: The budget, None if `IMDB_RATE_LIMIT` is 0 (unlimited).
+        """
+        rate = float(os.environ.get('IMDB_RATE_LIMIT', '0'))
+        if rate <= 0:
+            return None
+        return cls(rate, burst=float(os.environ.get('IMDB_RATE_BURST', '5')))
+
+    def reserve(self) -> float:
+        """Take a token, borrowing it from the future if the bucket is empty.
+
+        Returns:
+            float: Seconds to wait before using the token.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0, -self._tokens / self.rate)
+
+    async def acquire(self) -> None:
+        """Wait for a token."""
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+@functools.cache
+def get_rate_budget() -> RateBudget | None:
+    """Return the request-rate budget shared by the whole process.
+
+    Returns:
+        RateBudget | None: The budget, created on first use, None if unlimited.
+    """
+    return RateBudget.from_env()
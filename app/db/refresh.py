@@ -0,0 +1,198 @@
+"""Incremental re-crawl module.
+
+Ratings and descriptions drift on IMDb after a title is imported. The
+`crawl_state` table keeps, per stored movie and actor, when its page was
+last fetched, a hash of the columns stored from it and how often its
+detail page was viewed. The worker refresher (`REFRESH_INTERVAL`) asks
+`pick_due` for the entries not fetched for `REFRESH_MAX_AGE`, fetches them
+again with conditional requests and writes back only the rows whose hash
+changed: an unchanged page only stamps `crawl_state`, so it does not bump
+the catalog version and the caches of the web servers stay warm.
+"""
+import functools
+import hashlib
+import heapq
+import json
+import math
+from datetime import datetime, timedelta
+from typing import Mapping
+
+from db.models import Actor, Base, CrawlState, Movie
+from sqlalchemy import Row, Select, or_, select
+from sqlalchemy.dialects.postgresql import Insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+CRAWLED_MODELS = (Movie, Actor)
+DUE_ORDERS = (
+    CrawlState.last_fetched.asc().nulls_first(),
+    CrawlState.views.desc().nulls_last(),
+)
+
+
+def content_hash(row: dict) -> str:
+    """Hash the columns stored from an IMDb page.
+
+    Args:
+        row (dict): Column values of a movie or an actor.
+
+    Returns:
+        str: Hex SHA-256 digest, the same for equal rows.
+    """
+    payload = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def crawl_rows(rows: list[dict], fetched: datetime) -> list[dict]:
+    """Build the `crawl_state` rows of freshly fetched movies or actors.
+
+    Args:
+        rows (list[dict]): Column values of the fetched movies or actors.
+        fetched (datetime): When their pages were fetched.
+
+    Returns:
+        list[dict]: Rows for `stamp`, in key order.
+    """
+    return [
+        {'imdb_id': row['id'], 'last_fetched': fetched, 'content_hash': content_hash(row)}
+        for row in sorted(rows, key=lambda row: row['id'])
+    ]
+
+
+def stamp() -> Insert:
+    """Build the statement recording fetches in `crawl_state`.
+
+    Returns:
+        Insert: Upsert to execute with `crawl_rows`, view counts are kept.
+    """
+    stmt = pg_insert(CrawlState)
+    return stmt.on_conflict_do_update(
+        index_elements=[CrawlState.imdb_id],
+        set_={
+            'last_fetched': stmt.excluded.last_fetched,
+            'content_hash': stmt.excluded.content_hash,
+        },
+        )
+
+
+async def postpone(session_maker: async_sessionmaker[AsyncSession], imdb_id: str) -> None:
+    """Stamp a failed fetch, so the entry waits `REFRESH_MAX_AGE` to be retried.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        imdb_id (str): The IMDb ID of the entry.
+    """
+    stmt = pg_insert(CrawlState).values(imdb_id=imdb_id, last_fetched=datetime.now())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CrawlState.imdb_id],
+        set_={'last_fetched': stmt.excluded.last_fetched},
+        )
+    async with session_maker() as async_session:
+        async with async_session.begin():
+            await async_session.execute(stmt)
+
+
+async def record_views(
+    session_maker: async_sessionmaker[AsyncSession], counts: Mapping[str, int],
+        ) -> None:
+    """Add view counts to `crawl_state`, in one statement.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        counts (Mapping[str, int]): Views per IMDb id.
+    """
+    stmt = pg_insert(CrawlState)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CrawlState.imdb_id],
+        set_={'views': CrawlState.views + stmt.excluded.views},
+        )
+    async with session_maker() as async_session:
+        async with async_session.begin():
+            await async_session.execute(
+                stmt,
+                [{'imdb_id': imdb_id, 'views': counts[imdb_id]} for imdb_id in sorted(counts)],
+                )
+
+
+def priority(last_fetched: datetime | None, views: int | None, now: datetime) -> float:
+    """Rank a due entry: its staleness weighted by its views.
+
+    Args:
+        last_fetched (datetime | None): Last fetch, None if never fetched.
+        views (int | None): Views of its detail page.
+        now (datetime): Time of the ranking.
+
+    Returns:
+        float: The higher the sooner it is refreshed, infinite if never fetched.
+    """
+    if last_fetched is None:
+        return math.inf
+    return (now - last_fetched).total_seconds() * (1 + (views or 0))
+
+
+def due_rank(row: Row, now: datetime) -> tuple:
+    """Sort key of a due entry, the highest priority first.
+
+    Args:
+        row (Row): Id, last fetch and views of the entry.
+        now (datetime): Time of the ranking.
+
+    Returns:
+        tuple: Priority, then views, then id.
+    """
+    views = row.views or 0
+    return (-priority(row.last_fetched, views, now), -views, row.id)
+
+
+def due_entries(model: type[Base], due_before: datetime) -> Select:
+    """Select the movies or actors not fetched since a given time.
+
+    Args:
+        model (type[Base]): `Movie` or `Actor`.
+        due_before (datetime): Entries fetched before are due.
+
+    Returns:
+        Select: Id, last fetch, views and content hash of the due entries.
+    """
+    columns = (CrawlState.last_fetched, CrawlState.views, CrawlState.content_hash)
+    stmt = select(model.id, *columns)
+    stmt = stmt.outerjoin(CrawlState, CrawlState.imdb_id == model.id)
+    return stmt.where(or_(
+        CrawlState.last_fetched.is_(None), CrawlState.last_fetched < due_before,
+        ))
+
+
+async def pick_due(
+    session_maker: async_sessionmaker[AsyncSession], max_age: timedelta, batch: int,
+        ) -> list[tuple[str, str | None]]:
+    """Pick the movies and actors to refresh next.
+
+    The stalest and the most viewed entries not fetched for `max_age`
+    of each table are ranked by `priority` in a heap, the first `batch`
+    are returned. Entries without `crawl_state`, stored before it
+    existed or bulk loaded, count as never fetched.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        max_age (timedelta): Age from which an entry is due.
+        batch (int): Number of entries picked.
+
+    Returns:
+        list[tuple[str, str | None]]: IMDb id and content hash of the picked entries.
+    """
+    now = datetime.now()
+    candidates = {}
+    async with session_maker() as async_session:
+        for model in CRAWLED_MODELS:
+            due = due_entries(model, now - max_age)
+            for order in DUE_ORDERS:
+                stmt = due.order_by(order, model.id).limit(batch)
+                rows = await async_session.execute(stmt)
+                candidates.update((row.id, row) for row in rows)
+    picked = heapq.nsmallest(
+        batch, candidates.values(), key=functools.partial(due_rank, now=now),
+        )
+    return [(row.id, row.content_hash) for row in picked]
@@ -0,0 +1,41 @@
+"""Cascade link deletes
+
+Revision ID: 1e73cd4d1074
+Revises: 29271d0d0057
+Create Date: 2026-10-17 09:12:40.318522
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1e73cd4d1074'
+down_revision: Union[str, None] = '29271d0d0057'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Deleting a movie, actor or genre deletes its links in the database.
+LINK_KEYS = (
+    ('movie_actor', 'movie_id', 'movie'),
+    ('movie_actor', 'actor_id', 'actor'),
+    ('movie_genre', 'movie_id', 'movie'),
+    ('movie_genre', 'genre_id', 'genre'),
+)
+
+
+def replace_keys(ondelete) -> None:
+    for table, column, referred in LINK_KEYS:
+        name = '{0}_{1}_fkey'.format(table, column)
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    replace_keys('CASCADE')
+
+
+def downgrade() -> None:
+    replace_keys(None)
@@ -0,0 +1,41 @@
+"""Link creation time
+
+Revision ID: 29271d0d0057
+Revises: c1e3e8de2d2f
+Create Date: 2026-10-17 06:31:52.140877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '29271d0d0057'
+down_revision: Union[str, None] = 'c1e3e8de2d2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LINK_TABLES = ('movie_actor', 'movie_genre')
+
+
+def upgrade() -> None:
+    for table in LINK_TABLES:
+        op.add_column(table, sa.Column('created', sa.DateTime(), server_default=sa.text('now()'), nullable=True))
+        # Existing links date from their movie, as the exports assumed so far.
+        op.execute(
+            'UPDATE {0} SET created = coalesce(movie.created, {0}.created) '
+            'FROM movie WHERE movie.id = {0}.movie_id'.format(table)
+        )
+    # The catalog version triggers are deferred: fire them before altering.
+    op.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    for table in LINK_TABLES:
+        op.alter_column(table, 'created', nullable=False)
+        op.create_index('{0}_created_idx'.format(table), table, ['created'], unique=False)
+
+
+def downgrade() -> None:
+    for table in LINK_TABLES:
+        op.drop_index('{0}_created_idx'.format(table), table_name=table)
+        op.drop_column(table, 'created')
@@ -0,0 +1,143 @@
+"""Incremental catalog summaries
+
+Revision ID: 2934dd05984e
+Revises: cff934f92c33
+Create Date: 2026-10-17 05:06:43.795628
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '2934dd05984e'
+down_revision: Union[str, None] = 'cff934f92c33'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Deltas are added with ordered upserts: concurrent writers lock the
+# summary rows in the same order and `x = x + delta` never loses a change.
+ADD_GENRE_DELTAS = (
+    'INSERT INTO genre_stats (genre_id, movies, rating_sum) {0} ORDER BY 1 '
+    'ON CONFLICT (genre_id) DO UPDATE SET '
+    'movies = genre_stats.movies + excluded.movies, '
+    'rating_sum = genre_stats.rating_sum + excluded.rating_sum'
+)
+ADD_ACTOR_DELTAS = (
+    'INSERT INTO actor_stats (actor_id, movies) {0} ORDER BY 1 '
+    'ON CONFLICT (actor_id) DO UPDATE SET movies = actor_stats.movies + excluded.movies'
+)
+# The links carry the rating of their movie, so the delta of a link
+# deleted along with its movie (raw SQL, ON DELETE CASCADE) is still
+# known. Links of a genre or an actor deleted in the same statement no
+# longer join: their summary row went with it.
+GENRE_LINK_DELTAS = (
+    'SELECT changed.genre_id, {0} count(*), {0} sum(changed.rating::numeric) '
+    'FROM changed JOIN genre ON genre.id = changed.genre_id GROUP BY 1'
+)
+ACTOR_LINK_DELTAS = (
+    'SELECT changed.actor_id, {0} count(*) '
+    'FROM changed JOIN actor ON actor.id = changed.actor_id GROUP BY 1'
+)
+# Copies the new ratings to the links, and adds the differences.
+RATING_DELTAS = """
+    WITH moved AS (
+        UPDATE movie_genre SET rating = new_rows.rating
+        FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id
+        WHERE movie_genre.movie_id = new_rows.id AND new_rows.rating <> old_rows.rating
+        RETURNING movie_genre.genre_id, new_rows.rating::numeric - old_rows.rating::numeric AS delta
+    )
+    {0}
+"""
+TRIGGERS = (
+    ('movie_genre_stats_insert', 'INSERT ON movie_genre', 'NEW TABLE AS changed', 'genre_stats_links'),
+    ('movie_genre_stats_delete', 'DELETE ON movie_genre', 'OLD TABLE AS changed', 'genre_stats_links'),
+    ('movie_actor_stats_insert', 'INSERT ON movie_actor', 'NEW TABLE AS changed', 'actor_stats_links'),
+    ('movie_actor_stats_delete', 'DELETE ON movie_actor', 'OLD TABLE AS changed', 'actor_stats_links'),
+    ('movie_rating_stats', 'UPDATE ON movie', 'OLD TABLE AS old_rows NEW TABLE AS new_rows', 'genre_stats_ratings'),
+)
+FUNCTION = """
+    CREATE FUNCTION {0}() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        {1}
+        RETURN NULL;
+    END
+    $$
+"""
+
+
+def link_function(name, add_deltas, link_deltas):
+    return FUNCTION.format(name, """
+        IF TG_OP = 'INSERT' THEN
+            {0};
+        ELSE
+            {1};
+        END IF;
+    """.format(add_deltas.format(link_deltas.format('')), add_deltas.format(link_deltas.format('-'))))
+
+
+def upgrade() -> None:
+    op.add_column('movie_genre', sa.Column('rating', sa.Float(), nullable=True))
+    op.execute('UPDATE movie_genre SET rating = movie.rating FROM movie WHERE movie.id = movie_genre.movie_id')
+    # Fires the deferred catalog_version triggers: the table cannot be
+    # altered while they are pending.
+    op.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    op.alter_column('movie_genre', 'rating', nullable=False)
+    op.create_index('movie_genre_rating_idx', 'movie_genre', ['genre_id', 'rating', 'movie_id'], unique=False)
+    # FOR SHARE waits for a concurrent rating update to commit, whose
+    # trigger cannot see this link yet, and then reads its new rating.
+    op.execute("""
+        CREATE FUNCTION movie_genre_rating() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.rating := (SELECT rating FROM movie WHERE id = NEW.movie_id FOR SHARE);
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute(
+        'CREATE TRIGGER movie_genre_rating BEFORE INSERT ON movie_genre '
+        'FOR EACH ROW EXECUTE FUNCTION movie_genre_rating()'
+    )
+    op.execute('DELETE FROM genre_stats')
+    op.add_column('genre_stats', sa.Column('rating_sum', sa.Numeric(), nullable=False))
+    op.drop_column('genre_stats', 'avg_rating')
+    op.drop_column('genre_stats', 'top_movie_ids')
+    op.execute(
+        'INSERT INTO genre_stats (genre_id, movies, rating_sum) '
+        'SELECT genre_id, count(*), sum(rating::numeric) FROM movie_genre GROUP BY genre_id'
+    )
+    op.execute(link_function('genre_stats_links', ADD_GENRE_DELTAS, GENRE_LINK_DELTAS))
+    op.execute(link_function('actor_stats_links', ADD_ACTOR_DELTAS, ACTOR_LINK_DELTAS))
+    rating_deltas = ADD_GENRE_DELTAS.format('SELECT genre_id, 0, sum(delta) FROM moved GROUP BY 1')
+    op.execute(FUNCTION.format('genre_stats_ratings', RATING_DELTAS.format(rating_deltas) + ';'))
+    # Statement triggers: a bulk write applies one aggregated delta per genre/actor.
+    for trigger, event, transition, function in TRIGGERS:
+        op.execute(
+            'CREATE TRIGGER {0} AFTER {1} REFERENCING {2} '
+            'FOR EACH STATEMENT EXECUTE FUNCTION {3}()'.format(trigger, event, transition, function)
+        )
+
+
+def downgrade() -> None:
+    for trigger, event, _transition, _function in TRIGGERS:
+        op.execute('DROP TRIGGER {0} ON {1}'.format(trigger, event.split(' ON ')[1]))
+    op.execute('DROP TRIGGER movie_genre_rating ON movie_genre')
+    for function in ('genre_stats_links', 'actor_stats_links', 'genre_stats_ratings', 'movie_genre_rating'):
+        op.execute('DROP FUNCTION {0}()'.format(function))
+    op.drop_index('movie_genre_rating_idx', table_name='movie_genre')
+    op.drop_column('movie_genre', 'rating')
+    op.execute('DELETE FROM genre_stats')
+    op.add_column('genre_stats', sa.Column('top_movie_ids', postgresql.ARRAY(sa.TEXT()), autoincrement=False, nullable=False))
+    op.add_column('genre_stats', sa.Column('avg_rating', sa.DOUBLE_PRECISION(precision=53), autoincrement=False, nullable=True))
+    op.drop_column('genre_stats', 'rating_sum')
+    op.execute(
+        'INSERT INTO genre_stats (genre_id, movies, avg_rating, top_movie_ids) '
+        'SELECT movie_genre.genre_id, count(*), avg(movie.rating), '
+        '(array_agg(movie.id ORDER BY movie.rating DESC NULLS LAST, movie.id))[1:5] '
+        'FROM movie_genre JOIN movie ON movie.id = movie_genre.movie_id '
+        'GROUP BY movie_genre.genre_id'
+    )
@@ -0,0 +1,40 @@
+"""Ingest job queue
+
+Revision ID: 5d0c2a7e91b4
+Revises: 38b8ee8c7ddf
+Create Date: 2026-10-17 09:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d0c2a7e91b4'
+down_revision: Union[str, None] = '38b8ee8c7ddf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ingest_job',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('imdb_id', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('report', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('started', sa.DateTime(), nullable=True),
+    sa.Column('finished', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ingest_job_queued_idx', 'ingest_job', ['created'], unique=False, postgresql_where="status = 'queued'")
+
+
+def downgrade() -> None:
+    op.drop_index('ingest_job_queued_idx', table_name='ingest_job', postgresql_where="status = 'queued'")
+    op.drop_table('ingest_job')
@@ -0,0 +1,37 @@
+"""Crawl state
+
+Revision ID: 61cb79457e6e
+Revises: 1e73cd4d1074
+Create Date: 2026-10-17 06:43:50.331863
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '61cb79457e6e'
+down_revision: Union[str, None] = '1e73cd4d1074'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # No rows for the stored movies and actors: the refresher takes them as never fetched.
+    op.create_table('crawl_state',
+    sa.Column('imdb_id', sa.String(), nullable=False),
+    sa.Column('last_fetched', sa.DateTime(), nullable=True),
+    sa.Column('content_hash', sa.String(), nullable=True),
+    sa.Column('views', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('imdb_id')
+    )
+    op.create_index('crawl_state_last_fetched_idx', 'crawl_state', ['last_fetched'], unique=False)
+    op.create_index('crawl_state_views_idx', 'crawl_state', ['views'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('crawl_state_views_idx', table_name='crawl_state')
+    op.drop_index('crawl_state_last_fetched_idx', table_name='crawl_state')
+    op.drop_table('crawl_state')
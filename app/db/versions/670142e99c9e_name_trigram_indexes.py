@@ -0,0 +1,69 @@
+"""Name trigram indexes
+
+Revision ID: 670142e99c9e
+Revises: e0e51b686cb1
+Create Date: 2026-10-17 03:45:06.973770
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '670142e99c9e'
+down_revision: Union[str, None] = 'e0e51b686cb1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NAME_COLUMNS = (('movie', 'movie_name'), ('actor', 'actor_name'))
+NAME_WORDS = r"regexp_split_to_table(lower({0}), '[\s[:punct:]]+') AS word"
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('actor_name_prefix_idx', 'actor', [sa.text('lower(actor_name) text_pattern_ops')], unique=False)
+    op.create_index('movie_name_prefix_idx', 'movie', [sa.text('lower(movie_name) text_pattern_ops')], unique=False)
+    op.create_table('name_word',
+    sa.Column('word', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('word')
+    )
+    op.create_index('name_word_trgm_idx', 'name_word', ['word'], unique=False, postgresql_using='gist', postgresql_ops={'word': 'gist_trgm_ops'})
+    # Insert-only: ON CONFLICT DO NOTHING takes no lock on known words,
+    # so concurrent imports do not queue behind each other here.
+    op.execute("""
+        CREATE FUNCTION collect_name_words() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO name_word (word)
+            SELECT DISTINCT word
+            FROM {0}
+            WHERE length(word) > 1
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END
+        $$
+    """.format(NAME_WORDS.format('to_jsonb(NEW) ->> TG_ARGV[0]')))
+    for table, column in NAME_COLUMNS:
+        op.execute(
+            'CREATE TRIGGER {0}_name_words '
+            'AFTER INSERT OR UPDATE OF {1} ON {0} '
+            "FOR EACH ROW EXECUTE FUNCTION collect_name_words('{1}')".format(table, column)
+        )
+        op.execute(
+            'INSERT INTO name_word (word) '
+            'SELECT DISTINCT word FROM {0}, {1} '
+            'WHERE length(word) > 1 ON CONFLICT DO NOTHING'.format(table, NAME_WORDS.format(column))
+        )
+
+
+def downgrade() -> None:
+    for table, _column in NAME_COLUMNS:
+        op.execute('DROP TRIGGER {0}_name_words ON {0}'.format(table))
+    op.execute('DROP FUNCTION collect_name_words()')
+    op.drop_index('name_word_trgm_idx', table_name='name_word', postgresql_using='gist', postgresql_ops={'word': 'gist_trgm_ops'})
+    op.drop_table('name_word')
+    op.drop_index('movie_name_prefix_idx', table_name='movie')
+    op.drop_index('actor_name_prefix_idx', table_name='actor')
+    op.execute('DROP EXTENSION IF EXISTS pg_trgm')
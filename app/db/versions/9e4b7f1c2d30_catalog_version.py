@@ -0,0 +1,60 @@
+"""Catalog version
+
+Revision ID: 9e4b7f1c2d30
+Revises: 5d0c2a7e91b4
+Create Date: 2026-10-17 11:40:07.512904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b7f1c2d30'
+down_revision: Union[str, None] = '5d0c2a7e91b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CATALOG_TABLES = ('movie', 'actor', 'genre', 'movie_actor', 'movie_genre')
+
+
+def upgrade() -> None:
+    op.create_table('catalog_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('counter', sa.BigInteger(), nullable=False),
+    sa.Column('modified', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('txid', sa.BigInteger(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('INSERT INTO catalog_version (id, counter, modified) VALUES (1, 0, now())')
+    # Deferred until commit, so the version row is locked last and only
+    # once per transaction: writers never wait on it while holding other rows.
+    op.execute("""
+        CREATE FUNCTION bump_catalog_version() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE catalog_version
+            SET counter = counter + 1,
+                modified = greatest(modified, clock_timestamp()),
+                txid = txid_current()
+            WHERE id = 1 AND txid IS DISTINCT FROM txid_current();
+            RETURN NULL;
+        END
+        $$
+    """)
+    for table in CATALOG_TABLES:
+        op.execute(
+            'CREATE CONSTRAINT TRIGGER {0}_catalog_version '
+            'AFTER INSERT OR UPDATE OR DELETE ON {0} '
+            'DEFERRABLE INITIALLY DEFERRED FOR EACH ROW '
+            'EXECUTE FUNCTION bump_catalog_version()'.format(table)
+        )
+
+
+def downgrade() -> None:
+    for table in CATALOG_TABLES:
+        op.execute('DROP TRIGGER {0}_catalog_version ON {0}'.format(table))
+    op.execute('DROP FUNCTION bump_catalog_version()')
+    op.drop_table('catalog_version')
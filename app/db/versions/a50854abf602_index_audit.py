@@ -0,0 +1,36 @@
+"""Index audit
+
+Revision ID: a50854abf602
+Revises: 670142e99c9e
+Create Date: 2026-10-17 04:33:31.149575
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a50854abf602'
+down_revision: Union[str, None] = '670142e99c9e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('actor_created_idx', 'actor', ['created'], unique=False)
+    op.create_index('actor_name_idx', 'actor', ['actor_name', 'id'], unique=False)
+    op.create_index('movie_created_idx', 'movie', ['created'], unique=False)
+    op.create_index('movie_rating_idx', 'movie', ['rating', 'id'], unique=False)
+    op.create_index('movie_actor_actor_idx', 'movie_actor', ['actor_id', 'movie_id'], unique=False)
+    op.create_index('movie_genre_genre_idx', 'movie_genre', ['genre_id', 'movie_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('movie_genre_genre_idx', table_name='movie_genre')
+    op.drop_index('movie_actor_actor_idx', table_name='movie_actor')
+    op.drop_index('movie_rating_idx', table_name='movie')
+    op.drop_index('movie_created_idx', table_name='movie')
+    op.drop_index('actor_name_idx', table_name='actor')
+    op.drop_index('actor_created_idx', table_name='actor')
@@ -0,0 +1,67 @@
+"""Catalog change notifications
+
+Revision ID: aa6654134d10
+Revises: 61cb79457e6e
+Create Date: 2026-10-17 14:12:31.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'aa6654134d10'
+down_revision: Union[str, None] = '61cb79457e6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columns holding the ids of the cached entities a row change shows in.
+# Genre links only change the movie: tagging its genres would retire
+# every cached movie of the genre.
+NOTIFIED_IDS = {
+    'movie': ('id',),
+    'actor': ('id',),
+    'genre': ('id',),
+    'movie_actor': ('movie_id', 'actor_id'),
+    'movie_genre': ('movie_id',),
+}
+
+
+def upgrade() -> None:
+    # Notifications are delivered on commit only, and identical ones
+    # of a transaction are sent once.
+    op.execute("""
+        CREATE FUNCTION notify_catalog_change() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            changed jsonb;
+            id_column text;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := to_jsonb(OLD);
+            ELSE
+                changed := to_jsonb(NEW);
+            END IF;
+            FOREACH id_column IN ARRAY TG_ARGV LOOP
+                PERFORM pg_notify('catalog_changes', changed ->> id_column);
+            END LOOP;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for table, columns in NOTIFIED_IDS.items():
+        op.execute(
+            'CREATE TRIGGER {0}_notify_change '
+            'AFTER INSERT OR UPDATE OR DELETE ON {0} FOR EACH ROW '
+            'EXECUTE FUNCTION notify_catalog_change({1})'.format(
+                table, ', '.join("'{0}'".format(column) for column in columns),
+            )
+        )
+
+
+def downgrade() -> None:
+    for table in NOTIFIED_IDS:
+        op.execute('DROP TRIGGER {0}_notify_change ON {0}'.format(table))
+    op.execute('DROP FUNCTION notify_catalog_change()')
@@ -0,0 +1,28 @@
+"""Ingest job retry backoff
+
+Revision ID: c1e3e8de2d2f
+Revises: 2934dd05984e
+Create Date: 2026-10-17 06:02:17.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1e3e8de2d2f'
+down_revision: Union[str, None] = '2934dd05984e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ingest_job', sa.Column('run_after', sa.DateTime(), nullable=True))
+    op.execute('UPDATE ingest_job SET run_after = created')
+    op.alter_column('ingest_job', 'run_after', nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column('ingest_job', 'run_after')
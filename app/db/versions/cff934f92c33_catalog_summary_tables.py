@@ -0,0 +1,55 @@
+"""Catalog summary tables
+
+Revision ID: cff934f92c33
+Revises: a50854abf602
+Create Date: 2026-10-17 04:38:36.737980
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'cff934f92c33'
+down_revision: Union[str, None] = 'a50854abf602'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('actor_stats',
+    sa.Column('actor_id', sa.String(), nullable=False),
+    sa.Column('movies', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['actor_id'], ['actor.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('actor_id')
+    )
+    op.create_index('actor_stats_movies_idx', 'actor_stats', ['movies', 'actor_id'], unique=False)
+    op.create_table('genre_stats',
+    sa.Column('genre_id', sa.Uuid(), nullable=False),
+    sa.Column('movies', sa.Integer(), nullable=False),
+    sa.Column('avg_rating', sa.Float(), nullable=True),
+    sa.Column('top_movie_ids', postgresql.ARRAY(postgresql.TEXT()), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('genre_id')
+    )
+    # Full computation, once: afterwards db.summary refreshes the rows
+    # of the genres and actors touched by each write.
+    op.execute(
+        'INSERT INTO genre_stats (genre_id, movies, avg_rating, top_movie_ids) '
+        'SELECT movie_genre.genre_id, count(*), avg(movie.rating), '
+        '(array_agg(movie.id ORDER BY movie.rating DESC NULLS LAST, movie.id))[1:5] '
+        'FROM movie_genre JOIN movie ON movie.id = movie_genre.movie_id '
+        'GROUP BY movie_genre.genre_id'
+    )
+    op.execute(
+        'INSERT INTO actor_stats (actor_id, movies) '
+        'SELECT actor_id, count(*) FROM movie_actor GROUP BY actor_id'
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('genre_stats')
+    op.drop_index('actor_stats_movies_idx', table_name='actor_stats')
+    op.drop_table('actor_stats')
@@ -0,0 +1,32 @@
+"""Full-text search
+
+Revision ID: e0e51b686cb1
+Revises: 9e4b7f1c2d30
+Create Date: 2026-10-17 03:34:14.690483
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e0e51b686cb1'
+down_revision: Union[str, None] = '9e4b7f1c2d30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('actor', sa.Column('search', postgresql.TSVECTOR(), sa.Computed("setweight(to_tsvector('english', coalesce(actor_name, '')), 'A') || setweight(to_tsvector('english', coalesce(description, '')), 'B')", persisted=True), nullable=True))
+    op.create_index('actor_search_idx', 'actor', ['search'], unique=False, postgresql_using='gin')
+    op.add_column('movie', sa.Column('search', postgresql.TSVECTOR(), sa.Computed("setweight(to_tsvector('english', coalesce(movie_name, '')), 'A') || setweight(to_tsvector('english', coalesce(description, '')), 'B')", persisted=True), nullable=True))
+    op.create_index('movie_search_idx', 'movie', ['search'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('movie_search_idx', table_name='movie', postgresql_using='gin')
+    op.drop_column('movie', 'search')
+    op.drop_index('actor_search_idx', table_name='actor', postgresql_using='gin')
+    op.drop_column('actor', 'search')
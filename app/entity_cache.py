@@ -0,0 +1,178 @@
+"""In-process entity cache module.
+
+Detail pages read movies and actors far more often than they change,
+so `get_movie` / `get_actor` keep the loaded objects in an LRU cache
+with a TTL. Missing ids are cached too (negative caching), with a shorter
+TTL, so probing unknown ids does not reach the database either.
+
+Entries are stored with tags, the ids they were built from: a movie is
+tagged with its own id and the ids of its actors and genres, an actor with
+its own id and the ids of its movies. `CatalogWatch` invalidates the tags
+of every change committed by any process, a web server worker or the
+ingestion worker, so a write only drops the entries that show it.
+"""
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Hashable, Iterable
+
+from db.models import Base
+from sqlalchemy import inspect
+
+MISSING = object()
+NEGATIVE = object()
+COUNTERS = ('hits', 'negative_hits', 'misses', 'evictions', 'invalidations')
+EntityKey = tuple[type[Base], str]
+
+
+class EntityCache(object):
+    """Thread-safe LRU cache whose entries expire after a TTL."""
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            maxsize (int): Number of entries kept, the least recently used go first.
+            ttl (float): Seconds a cached entity stays valid.
+            negative_ttl (float): Seconds a cached missing id stays valid.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.counters: Counter[str] = Counter()
+        self._entries: OrderedDict[Hashable, tuple[float, Any, frozenset]] = OrderedDict()
+        self._tagged: dict[str, set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'EntityCache':
+        """Configure a cache from the `ENTITY_CACHE_*` environment variables.
+
+        Returns:
+            EntityCache: The configured cache.
+        """
+        return cls(
+            maxsize=int(os.environ.get('ENTITY_CACHE_SIZE', '1024')),
+            ttl=float(os.environ.get('ENTITY_CACHE_TTL', '300')),
+            negative_ttl=float(os.environ.get('ENTITY_CACHE_NEGATIVE_TTL', '30')),
+        )
+
+    def get(self, key: Hashable) -> Any:
+        """Look up an entry and mark it as recently used.
+
+        Args:
+            key (Hashable): The entry key.
+
+        Returns:
+            Any: The cached object, `NEGATIVE` for a cached missing id,
+            or `MISSING` if the key is not cached or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._drop(key)
+                self.counters['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            if entry[1] is NEGATIVE:
+                self.counters['negative_hits'] += 1
+            else:
+                self.counters['hits'] += 1
+            return entry[1]
+
+    def put(self, key: Hashable, cached: Any, tags: Iterable[str] = ()) -> None:
+        """Store an entry, evicting the least recently used over the size bound.
+
+        Args:
+            key (Hashable): The entry key.
+            cached (Any): The object, or `NEGATIVE` for a missing id.
+            tags (Iterable[str]): Ids whose change invalidates the entry.
+        """
+        ttl = self.negative_ttl if cached is NEGATIVE else self.ttl
+        tags = frozenset(tags)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, cached, tags)
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.counters['evictions'] += 1
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop the entries carrying any of the tags.
+
+        Args:
+            tags (str): Ids of the changed entities.
+        """
+        with self._lock:
+            for tag in tags:
+                for key in self._tagged.get(tag, set()).copy():
+                    self._drop(key)
+                    self.counters['invalidations'] += 1
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._tagged.clear()
+
+    def stats(self) -> dict:
+        """Collect the cache counters.
+
+        Returns:
+            dict: Size and hit, miss, eviction and invalidation counters.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                **{counter: self.counters[counter] for counter in COUNTERS},
+            }
+
+    def _drop(self, key: Hashable) -> None:
+        """Drop an entry and its tags, the lock being held.
+
+        Args:
+            key (Hashable): The entry key.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tagged[tag]
+            keys.discard(key)
+            if not keys:
+                self._tagged.pop(tag)
+
+
+def entity_key(model: type[Base], entity_id: str) -> EntityKey:
+    """Build the cache key of an entity.
+
+    Args:
+        model (type[Base]): `Movie` or `Actor`.
+        entity_id (str): The IMDb ID of the entity.
+
+    Returns:
+        EntityKey: Mapped class and id.
+    """
+    return model, entity_id
+
+
+def entity_tags(entity: Base) -> set[str]:
+    """Collect the ids an entity is built from.
+
+    Args:
+        entity (Base): A movie or an actor with its loaded relationships.
+
+    Returns:
+        set[str]: Its own id and the ids of the loaded related entities.
+    """
+    state = inspect(entity)
+    tags = {str(entity.id)}
+    for relationship in state.mapper.relationships:
+        if relationship.key not in state.unloaded:
+            related = getattr(entity, relationship.key)
+            tags.update(str(other.id) for other in related)
+    return tags
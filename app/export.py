@@ -0,0 +1,129 @@
+"""Catalog export blueprint module.
+
+`GET /export/<table>` streams the catalog as NDJSON, one row per line,
+for `movies`, `actors` and the `movie_actor` / `movie_genre` edges.
+Rows are read through a server-side cursor in batches of
+`EXPORT_BATCH_SIZE`, so memory stays flat at any catalog size.
+
+`since=YYYY-MM-DD` limits the export to rows created on or after that date,
+edges included: each link has its own creation time, so a cast member added
+to an old movie is exported too. Updates and deletes are not represented,
+an incremental pull only adds rows; pull without `since` to resynchronize.
+"""
+import asyncio
+import contextlib
+import json
+import os
+from datetime import date
+from typing import AsyncIterator, Iterator
+
+from db.models import Actor, Genre, Movie, MovieActor, MovieGenre
+from flask import Blueprint, Response, current_app, request
+from sqlalchemy import Select, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+BAD_REQUEST = 400
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+
+export = Blueprint('export', __name__)
+
+
+def export_statement(table: str, since: date | None) -> Select:
+    """Build the query of an exported table.
+
+    Args:
+        table (str): `movies`, `actors`, `movie_actor` or `movie_genre`.
+        since (date | None): Only rows created on or after this date.
+
+    Returns:
+        Select: Query ordered by primary key.
+    """
+    if table == 'movies':
+        stmt = select(*inspect(Movie).columns).order_by(Movie.id)
+    elif table == 'actors':
+        stmt = select(*inspect(Actor).columns).order_by(Actor.id)
+    elif table == 'movie_actor':
+        stmt = select(MovieActor.movie_id, MovieActor.actor_id).order_by(
+            MovieActor.movie_id, MovieActor.actor_id,
+            )
+    else:
+        stmt = select(MovieGenre.movie_id, Genre.genre_name).join(Genre).order_by(
+            MovieGenre.movie_id, Genre.genre_name,
+            )
+    if since is None:
+        return stmt
+    created = {
+        'movies': Movie.created,
+        'actors': Actor.created,
+        'movie_actor': MovieActor.created,
+        'movie_genre': MovieGenre.created,
+    }[table]
+    return stmt.where(created >= since)
+
+
+async def stream_rows(
+    session_maker: async_sessionmaker[AsyncSession], stmt: Select,
+        ) -> AsyncIterator[str]:
+    """Run a query through a server-side cursor and encode its rows.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        stmt (Select): The export query.
+
+    Yields:
+        str: NDJSON lines of one batch of rows.
+    """
+    async with session_maker() as async_session:
+        rows = await async_session.stream(
+            stmt.execution_options(yield_per=EXPORT_BATCH_SIZE),
+            )
+        async for partition in rows.mappings().partitions():
+            yield ''.join(
+                '{0}\n'.format(json.dumps(dict(row), default=str, ensure_ascii=False))
+                for row in partition
+            )
+
+
+def iterate_sync(chunks: AsyncIterator[str]) -> Iterator[str]:
+    """Drive an async iterator from the synchronous response iterable.
+
+    The WSGI server pulls the response body synchronously,
+    so every chunk is produced in a private event loop.
+    Closing the response (e.g. the client went away) closes the cursor.
+
+    Args:
+        chunks (AsyncIterator[str]): The async iterator.
+
+    Yields:
+        str: Items of `chunks`.
+    """
+    loop = asyncio.new_event_loop()
+    with contextlib.ExitStack() as stack:
+        stack.callback(loop.close)
+        stack.callback(loop.run_until_complete, chunks.aclose())
+        chunk = loop.run_until_complete(anext(chunks, None))
+        while chunk is not None:
+            yield chunk
+            chunk = loop.run_until_complete(anext(chunks, None))
+
+
+@export.get('/export/<any(movies, actors, movie_actor, movie_genre):table>')
+def export_table(table: str):
+    """Stream a catalog table as NDJSON.
+
+    Args:
+        table (str): `movies`, `actors`, `movie_actor` or `movie_genre`.
+
+    Returns:
+        Response: Streamed `application/x-ndjson` body,
+        or 400 if `since` is not an ISO date.
+    """
+    since = request.args.get('since')
+    try:
+        since = date.fromisoformat(since) if since else None
+    except ValueError:
+        return {'error': 'Invalid `since` date `{0}`'.format(since)}, BAD_REQUEST
+    stmt = export_statement(table, since)
+    chunks = stream_rows(current_app.extensions['async_session_maker'], stmt)
+    return Response(iterate_sync(chunks), mimetype='application/x-ndjson')
@@ -0,0 +1,270 @@
+"""Image proxy blueprint module.
+
+Catalog pages used to hotlink the full-size IMDb posters and headshots.
+`GET /images/<variant>?src=<url>` fetches an image once, keeps it on disk
+and generates all its size variants in a thread pool: `thumb` for the
+grid tiles, `detail` for the detail pages. Concurrent requests of an image
+not cached yet wait for the first one, which fetches and resizes it once
+for all. Originals and variants share one `HttpCache` directory
+(`IMAGE_CACHE_DIR`), least recently used entries go first over
+`IMAGE_CACHE_MAX_MB`.
+
+IMDb image URLs never change content, so variants are served with
+a one-year `immutable` cache lifetime. Only images of `IMAGE_PROXY_HOSTS`
+are proxied, the `image_url` template global links other URLs as they are.
+"""
+import asyncio
+import io
+import os
+import tempfile
+import types
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+from db.http_cache import MEGABYTE, HttpCache
+from flask import Blueprint, current_app, request, url_for
+from PIL import Image
+
+BAD_REQUEST = 400
+BAD_GATEWAY = 502
+ONE_YEAR = 31536000  # seconds
+JPEG_QUALITY = 85
+# Bounding boxes: grid tiles are at most 300px wide, detail images 700px.
+VARIANTS = types.MappingProxyType({'thumb': (300, 450), 'detail': (700, 700)})
+DECODE_ERRORS = (OSError, Image.DecompressionBombError)
+
+images = Blueprint('images', __name__)
+
+
+class ImageUnavailable(Exception):
+    """Custom exception class for an image that cannot be proxied.
+
+    This exception is raised when the original image
+    cannot be fetched or decoded.
+    """
+
+    def __init__(self, message, *args):
+        """Initialize the exception with a human readable message.
+
+        Args:
+            message (str): Error description.
+            args (tuple): Extra exception arguments.
+        """
+        self.message = message
+        super().__init__(message, *args)
+
+
+def variant_key(src: str, variant: str) -> str:
+    """Build the cache key of an image variant.
+
+    Args:
+        src (str): URL of the original image.
+        variant (str): Name of the variant.
+
+    Returns:
+        str: Key of the variant, next to the original in the cache.
+    """
+    return '{0}#{1}'.format(src, variant)
+
+
+def resize(body: bytes, box: tuple[int, int]) -> bytes:
+    """Shrink an image to fit a bounding box, keeping its proportions.
+
+    Args:
+        body (bytes): The original image.
+        box (tuple[int, int]): Maximum width and height.
+
+    Returns:
+        bytes: The JPEG variant.
+    """
+    output = io.BytesIO()
+    with Image.open(io.BytesIO(body)) as image:
+        image.thumbnail(box)
+        image.convert('RGB').save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+class ImageStore(object):
+    """Originals and resized variants of the proxied images."""
+
+    def __init__(
+        self, cache: HttpCache, hosts: frozenset[str], workers: int, timeout: float,
+            ) -> None:
+        """Initialize the store, its resizing threads start on first use.
+
+        Args:
+            cache (HttpCache): Where the originals and variants are kept.
+            hosts (frozenset[str]): Hosts whose images are proxied.
+            workers (int): Threads resizing images.
+            timeout (float): Seconds to wait for an original.
+        """
+        self.cache = cache
+        self.hosts = hosts
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='resize')
+        # Transport of the HTTP client, the default network one if None.
+        self.transport: httpx.AsyncBaseTransport | None = None
+        # Variants being generated, by original URL. Thread-safe futures:
+        # requests served by different event loops wait on the same one.
+        self._pending: dict[str, Future] = {}
+
+    @classmethod
+    def from_env(cls) -> 'ImageStore':
+        """Configure a store from the `IMAGE_*` environment variables.
+
+        Returns:
+            ImageStore: The configured store.
+        """
+        cache = HttpCache(
+            os.environ.get('IMAGE_CACHE_DIR', Path(tempfile.gettempdir()) / 'image_cache'),
+            ttl=None,
+            max_bytes=int(os.environ.get('IMAGE_CACHE_MAX_MB', '512')) * MEGABYTE,
+            )
+        hosts = os.environ.get('IMAGE_PROXY_HOSTS', 'm.media-amazon.com')
+        return cls(
+            cache,
+            hosts=frozenset(hosts.split(',')),
+            workers=int(os.environ.get('IMAGE_RESIZE_WORKERS', '4')),
+            timeout=float(os.environ.get('IMAGE_FETCH_TIMEOUT', '10')),
+            )
+
+    def allowed(self, src: str) -> bool:
+        """Check whether an image URL is proxied.
+
+        Args:
+            src (str): URL of the image.
+
+        Returns:
+            bool: True for https URLs of the proxied hosts.
+        """
+        parts = urlsplit(src)
+        return parts.scheme == 'https' and parts.hostname in self.hosts
+
+    async def download(self, src: str) -> bytes:
+        """Fetch an original image and keep it in the cache.
+
+        Args:
+            src (str): URL of the image.
+
+        Raises:
+            ImageUnavailable: The image could not be fetched.
+
+        Returns:
+            bytes: The original image.
+        """
+        async with httpx.AsyncClient(transport=self.transport, timeout=self.timeout) as client:
+            try:
+                response = await client.get(src)
+            except httpx.HTTPError as exc:
+                raise ImageUnavailable('Failed to fetch `{0}`: {1!r}'.format(src, exc))
+        if response.is_error:
+            raise ImageUnavailable('Failed to fetch `{0}`: {1}'.format(src, response.status_code))
+        return self.cache.store(src, response.content, response.headers).body
+
+    async def variant(self, src: str, variant: str) -> bytes:
+        """Return a variant of an image, generating all of them if missing.
+
+        Args:
+            src (str): URL of the original image.
+            variant (str): One of `VARIANTS`.
+
+        Returns:
+            bytes: The JPEG variant.
+        """
+        entry = self.cache.lookup(variant_key(src, variant))
+        if entry is not None:
+            return entry.body
+        candidate = Future()
+        # Atomic: exactly one concurrent request gets its own future back.
+        pending = self._pending.setdefault(src, candidate)
+        if pending is candidate:
+            await self.lead(src, pending)
+        variants = await asyncio.wrap_future(pending)
+        return variants[variant]
+
+    async def lead(self, src: str, pending: Future) -> None:
+        """Generate the variants of an image for every request waiting on them.
+
+        Args:
+            src (str): URL of the original image.
+            pending (Future): Where the variants, or the failure, are set.
+        """
+        try:
+            pending.set_result(await self.generate(src))
+        except Exception as exc:
+            pending.set_exception(exc)
+        finally:
+            self._pending.pop(src)
+            # Cancelled before the variants were made: the waiters give up too.
+            pending.cancel()
+
+    async def generate(self, src: str) -> dict[str, bytes]:
+        """Resize an image into all its variants and keep them in the cache.
+
+        Args:
+            src (str): URL of the original image.
+
+        Raises:
+            ImageUnavailable: The image could not be decoded.
+
+        Returns:
+            dict[str, bytes]: The JPEG variants, by name.
+        """
+        original = self.cache.lookup(src)
+        body = await self.download(src) if original is None else original.body
+        loop = asyncio.get_running_loop()
+        try:
+            resized = await asyncio.gather(*[
+                loop.run_in_executor(self.pool, resize, body, box) for box in VARIANTS.values()
+            ])
+        except DECODE_ERRORS as exc:
+            raise ImageUnavailable('Failed to decode `{0}`: {1!r}'.format(src, exc))
+        variants = dict(zip(VARIANTS, resized))
+        for name, variant_body in variants.items():
+            self.cache.store(variant_key(src, name), variant_body, {})
+        return variants
+
+
+@images.app_template_global()
+def image_url(src: str, variant: str) -> str:
+    """Link an image variant through the proxy.
+
+    Args:
+        src (str): URL of the original image.
+        variant (str): One of `VARIANTS`.
+
+    Returns:
+        str: URL of the variant, `src` itself if it is not proxied.
+    """
+    if not current_app.extensions['image_store'].allowed(src):
+        return src
+    return url_for('images.image_variant', variant=variant, src=src)
+
+
+@images.get('/images/<any(thumb, detail):variant>')
+async def image_variant(variant: str):
+    """Serve a resized variant of a proxied image.
+
+    Args:
+        variant (str): `thumb` or `detail`.
+
+    Returns:
+        Response: The JPEG variant, cached by clients for a year,
+        400 if `src` is not proxied or 502 if it is unavailable.
+    """
+    src = request.args.get('src', '')
+    image_store = current_app.extensions['image_store']
+    if not image_store.allowed(src):
+        return {'error': 'not a proxied image URL: {0}'.format(src)}, BAD_REQUEST
+    try:
+        body = await image_store.variant(src, variant)
+    except ImageUnavailable as exc:
+        return {'error': exc.message}, BAD_GATEWAY
+    response = current_app.response_class(body, mimetype='image/jpeg')
+    response.cache_control.public = True
+    response.cache_control.max_age = ONE_YEAR
+    response.cache_control.immutable = True
+    response.add_etag()
+    return response.make_conditional(request)
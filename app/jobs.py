@@ -0,0 +1,27 @@
+"""Ingestion jobs blueprint module."""
+import uuid
+
+from db.ingest_queue import get_job
+from flask import Blueprint, abort, current_app
+
+NOT_FOUND = 404
+
+jobs = Blueprint('jobs', __name__)
+
+
+@jobs.get('/jobs/<uuid:job_id>')
+async def job_status(job_id: uuid.UUID):
+    """Report the progress of an ingestion job.
+
+    Args:
+        job_id (uuid.UUID): The ID returned by `add_movie_actor`.
+
+    Returns:
+        dict: Status, attempts, timings and error of the job,
+        and for a queued job the number of jobs ahead of it.
+    """
+    session_maker = current_app.extensions['async_session_maker']
+    job, ahead = await get_job(job_id, session_maker)
+    if job is None:
+        abort(NOT_FOUND)
+    return {**job.as_dict(), 'queue_position': ahead}
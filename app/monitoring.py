@@ -0,0 +1,44 @@
+"""Monitoring blueprint module."""
+from db.metrics import CONTENT_TYPE, render_metrics
+from db.pools import pool_stats
+from flask import Blueprint, Response, current_app
+
+monitoring = Blueprint('monitoring', __name__)
+
+
+@monitoring.get('/pool_stats')
+def database_pool_stats():
+    """Report the usage of the shared database connection pool.
+
+    Returns:
+        dict: Checked in/out and overflow connections,
+        number of checkouts, timeouts and the time spent waiting for them,
+        number of connections opened and the time spent opening them.
+    """
+    return pool_stats()
+
+
+@monitoring.get('/cache_stats')
+def cache_stats():
+    """Report the counters of the in-process caches.
+
+    Returns:
+        dict: Size and hit, miss, eviction and invalidation counters
+        of every `*_cache` extension of the app.
+    """
+    return {
+        name: extension.stats()
+        for name, extension in current_app.extensions.items()
+        if name.endswith('_cache')
+    }
+
+
+@monitoring.get('/metrics')
+def metrics():
+    """Expose the histograms of this process to Prometheus.
+
+    Returns:
+        Response: Request, SQL, rendering and ingestion timings
+        in the Prometheus text format.
+    """
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,13 @@
+"""Content negotiation module."""
+from flask import request
+
+
+def wants_json() -> bool:
+    """Check whether the client asked for a JSON response.
+
+    Returns:
+        bool: True for `?format=json` or a JSON `Accept` header.
+    """
+    if request.args.get('format') == 'json':
+        return True
+    return request.accept_mimetypes.best == 'application/json'
@@ -0,0 +1,99 @@
+"""Rendered page cache module.
+
+Catalog pages are cached as rendered bytes, keyed on the request
+and the catalog version. The version lives in the `catalog_version` row,
+which database triggers bump whenever a transaction that changed
+the catalog commits, so REST updates and deletes as well as imports
+made by the worker retire every cached page at once. Between changes,
+`catalog_watch` keeps the version in process.
+
+Responses carry a strong `ETag` (digest of the body) and a `Last-Modified`
+time (the last catalog change), clients revalidating get 304 Not Modified.
+"""
+import functools
+import hashlib
+import os
+from typing import Callable
+
+from entity_cache import MISSING, EntityCache
+from flask import Response, current_app
+from flask import g as request_globals
+from flask import make_response, request
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+OK = 200
+ETAG_LENGTH = 32
+
+
+def create_page_cache() -> EntityCache:
+    """Configure the cache of rendered pages from the environment.
+
+    `PAGE_CACHE_SIZE` bounds the number of kept pages.
+    Entries of an old catalog version are never read again
+    and leave the cache as least recently used.
+
+    Returns:
+        EntityCache: The configured cache.
+    """
+    return EntityCache(
+        maxsize=int(os.environ.get('PAGE_CACHE_SIZE', '512')),
+        ttl=float(os.environ.get('PAGE_CACHE_TTL', '3600')),
+        negative_ttl=0,
+    )
+
+
+async def catalog_version(session_maker: async_sessionmaker[AsyncSession]) -> Row:
+    """Read the current catalog version, once per request.
+
+    Pages served by a request are cached under the version read first,
+    before any of them is loaded, so a cached page is never older than
+    its version. The `catalog_watch` extension keeps the version
+    between changes, so a cached page costs no query.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+
+    Returns:
+        Row: `counter` and `modified` time of the version.
+    """
+    if 'catalog_version' not in request_globals:
+        watch = current_app.extensions['catalog_watch']
+        request_globals.catalog_version = await watch.version(session_maker)
+    return request_globals.catalog_version
+
+
+def cached_page(view: Callable) -> Callable:
+    """Serve an async view from the page cache, with conditional GET support.
+
+    Only successful responses are cached, errors pass through.
+
+    Args:
+        view (Callable): The async view function.
+
+    Returns:
+        Callable: The wrapped view.
+    """
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs) -> Response:
+        version = await catalog_version(current_app.extensions['async_session_maker'])
+        page_cache = current_app.extensions['page_cache']
+        key = (request.full_path, request.accept_mimetypes.best, version.counter)
+        cached = page_cache.get(key)
+        if cached is MISSING:
+            rendered = make_response(await view(*args, **kwargs))
+            if rendered.status_code != OK:
+                return rendered
+            body = rendered.get_data()
+            etag = hashlib.sha256(body).hexdigest()[:ETAG_LENGTH]
+            cached = (body, rendered.mimetype, etag)
+            page_cache.put(key, cached)
+        body, mimetype, etag = cached
+        response = current_app.response_class(body, mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = version.modified
+        response.cache_control.no_cache = True
+        response.vary.add('Accept')
+        return response.make_conditional(request)
+    return wrapper
@@ -0,0 +1,194 @@
+"""Keyset (cursor) pagination module."""
+
+import base64
+import json
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(Exception):
+    """Custom exception class for malformed pagination cursors.
+
+    This exception is raised when a client sends
+    a cursor that was not produced by `encode_cursor`.
+    """
+
+    def __init__(self, message, *args):
+        """Initialize the exception with a human readable message.
+
+        Args:
+            message (str): Error description.
+            args (tuple): Extra exception arguments.
+        """
+        self.message = message
+        super().__init__(message, *args)
+
+
+@dataclass
+class Page(object):
+    """One page of a keyset-paginated listing."""
+
+    rows: list
+    page_size: int
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+    def as_dict(self) -> dict:
+        """Serialize the page for JSON clients.
+
+        Returns:
+            dict: Items and the cursors to fetch the neighbouring pages.
+        """
+        return {
+            'items': [row.as_dict() for row in self.rows],
+            'page_size': self.page_size,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+        }
+
+
+@dataclass
+class PageParams(object):
+    """Pagination parameters requested by the client."""
+
+    after: str | None = None
+    before: str | None = None
+    page_size: int = DEFAULT_PAGE_SIZE
+
+    @classmethod
+    def from_args(cls, args: Mapping[str, str], default_size: int) -> 'PageParams':
+        """Read pagination parameters from the query string.
+
+        Args:
+            args (Mapping[str, str]): Request query arguments.
+            default_size (int): Page size used when `limit` is missing or invalid.
+
+        Returns:
+            PageParams: Parsed and clamped parameters.
+        """
+        try:
+            page_size = int(args.get('limit', default_size))
+        except ValueError:
+            page_size = default_size
+        return cls(
+            after=args.get('after') or None,
+            before=args.get('before') or None,
+            page_size=min(max(page_size, 1), MAX_PAGE_SIZE),
+        )
+
+
+def encode_cursor(key_values: tuple) -> str:
+    """Encode the sort key of a row into an opaque cursor.
+
+    Args:
+        key_values (tuple): Values of the ordering columns.
+
+    Returns:
+        str: Url-safe cursor string.
+    """
+    raw = json.dumps(list(key_values)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _key_value(key_value: Any, key: InstrumentedAttribute) -> Any:
+    expected = key.type.python_type
+    if isinstance(key_value, bool):
+        return None
+    if expected is float and isinstance(key_value, int):
+        return float(key_value)
+    return key_value if isinstance(key_value, expected) else None
+
+
+def decode_cursor(cursor: str, keys: tuple[InstrumentedAttribute, ...]) -> tuple:
+    """Decode a cursor produced by `encode_cursor`.
+
+    Every value must have the Python type of its column, so a forged
+    cursor is rejected here instead of failing in the database.
+
+    Args:
+        cursor (str): Cursor received from the client.
+        keys (tuple): Ordering columns the cursor was encoded from.
+
+    Raises:
+        InvalidCursor: The cursor is malformed.
+
+    Returns:
+        tuple: Values of the ordering columns.
+    """
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        key_values = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError as exc:
+        raise InvalidCursor('Malformed cursor `{0}`'.format(cursor)) from exc
+    if not isinstance(key_values, list) or len(key_values) != len(keys):
+        raise InvalidCursor('Malformed cursor `{0}`'.format(cursor))
+    boundary = tuple(map(_key_value, key_values, keys))
+    if None in boundary:
+        raise InvalidCursor('Malformed cursor `{0}`'.format(cursor))
+    return boundary
+
+
+async def fetch_page(
+    async_session: AsyncSession,
+    stmt: Select,
+    keys: tuple[InstrumentedAttribute, ...],
+    page_params: PageParams,
+    descending: bool = False,
+        ) -> Page:
+    """Fetch one page of `stmt` using keyset pagination.
+
+    The rows are ordered by `keys`, which must be unique as a whole
+    (end them with the primary key). Instead of OFFSET the query seeks
+    past the cursor row, so every page costs the same as the first one.
+    The keys are selected along the rows, so they may be columns of
+    a joined table.
+
+    Args:
+        async_session (AsyncSession): Session used to run the query.
+        stmt (Select): Base query without ordering or limit.
+        keys (tuple): Ordering columns, the last one must be unique.
+        page_params (PageParams): Cursor and page size requested by the client.
+        descending (bool): Sort all keys in descending order.
+
+    Returns:
+        Page: Rows of the page and cursors of its neighbours.
+    """
+    backwards = page_params.before is not None and page_params.after is None
+    cursor = page_params.before if backwards else page_params.after
+    key_tuple = tuple_(*keys)
+    seek_down = descending != backwards
+    if cursor is not None:
+        boundary = decode_cursor(cursor, keys)
+        if seek_down:
+            stmt = stmt.where(key_tuple < boundary)
+        else:
+            stmt = stmt.where(key_tuple > boundary)
+    if seek_down:
+        stmt = stmt.order_by(*[key.desc() for key in keys])
+    else:
+        stmt = stmt.order_by(*[key.asc() for key in keys])
+    stmt = stmt.add_columns(*keys).limit(page_params.page_size + 1)
+    keyed_rows = list(await async_session.execute(stmt))
+    has_more = len(keyed_rows) > page_params.page_size
+    keyed_rows = keyed_rows[:page_params.page_size]
+    if backwards:
+        keyed_rows.reverse()
+    page = Page(rows=[keyed[0] for keyed in keyed_rows], page_size=page_params.page_size)
+    if not keyed_rows:
+        return page
+    if backwards:
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, cursor is not None
+    if has_next:
+        page.next_cursor = encode_cursor(tuple(keyed_rows[-1][1:]))
+    if has_prev:
+        page.prev_cursor = encode_cursor(tuple(keyed_rows[0][1:]))
+    return page
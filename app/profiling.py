@@ -0,0 +1,303 @@
+"""Request profiling module.
+
+Profiles single requests on demand, saving the result to `PROFILE_DIR`:
+
+- Tracing: a request sent with `X-Profile: <PROFILE_SECRET>`, or every
+  request when `PROFILE_ALL_REQUESTS=1` (development), runs under cProfile.
+  The stats are saved as `<time>-<endpoint>-<id>.pstats`
+  (`python -m pstats`, snakeviz) and the response names the file
+  in an `X-Profile-File` header.
+- Sampling: a `PROFILE_SAMPLE_RATE` share of the requests (0.01 for 1%)
+  is sampled every `PROFILE_SAMPLE_INTERVAL` seconds by a background
+  thread, which costs the request next to nothing, so it can stay on in
+  production. The stacks are saved as `<time>-<endpoint>-<id>.folded`, the
+  collapsed format of flamegraph.pl and speedscope.
+
+Flask runs async views in an event loop on another thread:
+`ProfilingFlask` makes that thread join the profile of its request.
+Per-request attribution only holds in WSGI mode, where that loop runs
+the views of one request. Under `asgi` the views of concurrent requests
+share the loop thread of the worker: a traced profile counts the other
+requests interleaved on it, and a request reaching it while another one
+traces it is not traced there, cProfile handles one profiler per thread.
+A request traced from a thread already traced is sampled instead.
+"""
+import cProfile
+import functools
+import hmac
+import itertools
+import os
+import pathlib
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable
+
+from flask import Blueprint, Flask, Response, current_app
+from flask import g as request_globals
+from flask import has_request_context, request
+
+profiling = Blueprint('profiling', __name__)
+REQUEST_NUMBERS = itertools.count(1)
+
+
+@dataclass
+class ProfilerSettings(object):
+    """When and where requests are profiled."""
+
+    directory: pathlib.Path
+    secret: str = ''
+    all_requests: bool = False
+    sample_rate: float = 0
+    sample_interval: float = 0.005
+
+    @classmethod
+    def from_env(cls) -> 'ProfilerSettings':
+        """Configure profiling from the `PROFILE_*` environment variables.
+
+        Returns:
+            ProfilerSettings: The settings, profiling nothing by default.
+        """
+        return cls(
+            directory=pathlib.Path(os.environ.get('PROFILE_DIR', 'profiles')),
+            secret=os.environ.get('PROFILE_SECRET', ''),
+            all_requests=os.environ.get('PROFILE_ALL_REQUESTS', '0') == '1',
+            sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+            sample_interval=float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005')),
+        )
+
+    def traces(self) -> bool:
+        """Tell whether the current request asks to be traced.
+
+        Returns:
+            bool: Every request is traced, or it carries the secret.
+        """
+        if self.all_requests:
+            return True
+        sent = request.headers.get('X-Profile', '')
+        return bool(self.secret) and hmac.compare_digest(sent, self.secret)
+
+    def samples(self, number: int) -> bool:
+        """Tell whether a request is sampled.
+
+        One request in `1 / sample_rate` is, spread evenly
+        unlike a random draw.
+
+        Args:
+            number (int): Number of the request in the process.
+
+        Returns:
+            bool: The request is sampled.
+        """
+        sampled = int(number * self.sample_rate)
+        return sampled > int((number - 1) * self.sample_rate)
+
+
+def collapse(frame) -> str:
+    """Describe a stack in the collapsed format, outermost frame first.
+
+    Args:
+        frame (FrameType): The innermost frame of the stack.
+
+    Returns:
+        str: `function (file:line)` of every frame, separated by `;`.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{0} ({1}:{2})'.format(code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    """Background thread counting the stacks of some threads."""
+
+    def __init__(self, interval: float) -> None:
+        """Initialize a sampler following no thread yet.
+
+        Args:
+            interval (float): Seconds between two samples.
+        """
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.thread_ids: set[int] = set()
+        self.stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        """Sample the followed threads until stopped."""
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in tuple(self.thread_ids):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks[collapse(frame)] += 1
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the thread to end."""
+        self._stopped.set()
+        self.join()
+
+
+class RequestProfile(object):
+    """Profile of one request, across the threads running it."""
+
+    def __init__(self, sample_interval: float | None = None) -> None:
+        """Start profiling, by tracing or by sampling.
+
+        Args:
+            sample_interval (float | None): Seconds between two samples,
+                None to trace with cProfile.
+        """
+        self._profilers: list[cProfile.Profile] = []
+        # Profilers enabled by this profile, by thread.
+        self._enabled: dict[int, cProfile.Profile] = {}
+        self._sampler = None
+        if sample_interval is not None:
+            self._sampler = StackSampler(sample_interval)
+            self._sampler.start()
+        self.saved: pathlib.Path | None = None
+
+    def start_thread(self) -> None:
+        """Profile the code the current thread runs from now on.
+
+        A thread already traced, by another request sharing it,
+        is left to that profile: enabling a second profiler would
+        take its place.
+        """
+        thread_id = threading.get_ident()
+        if self._sampler is not None:
+            self._sampler.thread_ids.add(thread_id)
+            return
+        if sys.getprofile() is not None:
+            return
+        profiler = cProfile.Profile()
+        self._profilers.append(profiler)
+        self._enabled[thread_id] = profiler
+        profiler.enable()
+
+    def stop_thread(self) -> None:
+        """Stop profiling the current thread."""
+        thread_id = threading.get_ident()
+        if self._sampler is not None:
+            self._sampler.thread_ids.discard(thread_id)
+            return
+        profiler = self._enabled.pop(thread_id, None)
+        if profiler is not None:
+            profiler.disable()
+
+    def save(self, stem: pathlib.Path) -> pathlib.Path:
+        """Stop profiling and save the profile, once.
+
+        Args:
+            stem (Path): Path of the file, without its extension.
+
+        Returns:
+            Path: The `.folded` stacks or the `.pstats` file.
+        """
+        if self.saved is not None:
+            return self.saved
+        for profiler in self._profilers:
+            profiler.disable()
+        stem.parent.mkdir(parents=True, exist_ok=True)
+        if self._sampler is None:
+            self.saved = stem.with_name('{0}.pstats'.format(stem.name))
+            pstats.Stats(*self._profilers).dump_stats(self.saved)
+            return self.saved
+        self._sampler.stop()
+        self.saved = stem.with_name('{0}.folded'.format(stem.name))
+        with open(self.saved, 'w', encoding='utf-8') as folded:
+            for stack, samples in self._sampler.stacks.items():
+                folded.write('{0} {1}\n'.format(stack, samples))
+        return self.saved
+
+
+class ProfilingFlask(Flask):
+    """Flask app whose async views join the profile of their request."""
+
+    def async_to_sync(self, func: Callable) -> Callable:
+        """Run a coroutine function in the profile of the current request.
+
+        Args:
+            func (Callable): The coroutine function, a view or a hook.
+
+        Returns:
+            Callable: The synchronous function running it.
+        """
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            profile = request_globals.get('profile') if has_request_context() else None
+            if profile is None:
+                return await func(*args, **kwargs)
+            profile.start_thread()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profile.stop_thread()
+        return super().async_to_sync(wrapper)
+
+
+def save_profile() -> pathlib.Path | None:
+    """Save the profile of the current request, if it is profiled.
+
+    Returns:
+        Path | None: The saved file, None for requests not profiled.
+    """
+    profile = request_globals.get('profile')
+    if profile is None:
+        return None
+    profile.stop_thread()
+    settings = current_app.extensions['profiler']
+    endpoint = request.endpoint or 'unmatched'
+    stem = '{0}-{1}-{2}'.format(
+        time.strftime('%Y%m%d-%H%M%S'), endpoint, uuid.uuid4().hex[:8],
+        )
+    return profile.save(settings.directory / stem)
+
+
+@profiling.before_app_request
+def start_profile() -> None:
+    """Start profiling the requests that are traced or sampled.
+
+    A request asking to be traced from a thread already traced
+    is sampled instead.
+    """
+    settings = current_app.extensions['profiler']
+    if settings.traces():
+        interval = None if sys.getprofile() is None else settings.sample_interval
+        request_globals.profile = RequestProfile(interval)
+    elif settings.samples(next(REQUEST_NUMBERS)):
+        request_globals.profile = RequestProfile(settings.sample_interval)
+    if 'profile' in request_globals:
+        request_globals.profile.start_thread()
+
+
+@profiling.after_app_request
+def name_profile(response: Response) -> Response:
+    """Save the profile of a traced request and name it in the response.
+
+    Args:
+        response (Response): The response of the request.
+
+    Returns:
+        Response: The response, with an `X-Profile-File` header if traced.
+    """
+    saved = save_profile()
+    if saved is not None and saved.suffix == '.pstats':
+        response.headers['X-Profile-File'] = saved.name
+    return response
+
+
+@profiling.teardown_app_request
+def end_profile(_error: BaseException | None) -> None:
+    """Save the profile of a request that failed before its response.
+
+    Args:
+        _error (BaseException | None): Error raised by the request, if any.
+    """
+    save_profile()
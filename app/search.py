@@ -0,0 +1,99 @@
+"""Full-text search blueprint module.
+
+Movies and actors are matched against their `search` tsvector columns
+(title weighted above description, GIN-indexed) and ranked together
+with `ts_rank_cd`. The query accepts web search syntax:
+quoted phrases, `or` and `-excluded` words.
+"""
+from db.models import Actor, Movie
+from flask import Blueprint, current_app, jsonify, render_template, request
+from negotiation import wants_json
+from page_cache import cached_page
+from pagination import MAX_PAGE_SIZE
+from sqlalchemy import Select, desc, func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+SEARCH_CONFIG = 'english'
+DEFAULT_LIMIT = 20
+
+search = Blueprint('search', __name__)
+
+
+def search_statement(terms: str, limit: int) -> Select:
+    """Build the ranked search query over movies and actors.
+
+    Args:
+        terms (str): Web search style query.
+        limit (int): Maximum number of results.
+
+    Returns:
+        Select: Rows of `kind`, `id`, `name`, `image` and `rank`, best first.
+    """
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, terms)
+    movies = select(
+        literal('movie').label('kind'),
+        Movie.id,
+        Movie.movie_name.label('name'),
+        Movie.poster.label('image'),
+        func.ts_rank_cd(Movie.search, tsquery).label('rank'),
+        ).where(Movie.search.op('@@')(tsquery))
+    actors = select(
+        literal('actor').label('kind'),
+        Actor.id,
+        Actor.actor_name.label('name'),
+        Actor.image.label('image'),
+        func.ts_rank_cd(Actor.search, tsquery).label('rank'),
+        ).where(Actor.search.op('@@')(tsquery))
+    return union_all(movies, actors).order_by(desc('rank'), 'id').limit(limit)
+
+
+async def find(
+    terms: str,
+    limit: int,
+    session_maker: async_sessionmaker[AsyncSession],
+        ) -> list[dict]:
+    """Search movies and actors.
+
+    Args:
+        terms (str): Web search style query.
+        limit (int): Maximum number of results.
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+
+    Returns:
+        list[dict]: Matches, best first.
+    """
+    if not terms.strip():
+        return []
+    async with session_maker() as async_session:
+        query = await async_session.execute(search_statement(terms, limit))
+        return [dict(row) for row in query.mappings()]
+
+
+@search.get('/search')
+@cached_page
+async def search_catalog():
+    """Render the results of a full-text search.
+
+    The `q` query argument holds the search terms
+    and `limit` the number of results. JSON clients
+    get the results as a JSON document.
+
+    Returns:
+        TemplateResponse: The rendered template of the results.
+    """
+    terms = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    matches = await find(
+        terms,
+        min(max(limit, 1), MAX_PAGE_SIZE),
+        current_app.extensions['async_session_maker'],
+        )
+    if wants_json():
+        return jsonify({'query': terms, 'results': matches})
+    return render_template(
+        template_name_or_list='search.html', terms=terms, matches=matches,
+        )
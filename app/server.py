@@ -3,11 +3,32 @@
 import logging
 import os
 
-from db.models import Actor, Movie, MoviesApi
-from flask import Flask, render_template, request, session
+from autocomplete import autocomplete, create_autocomplete_cache
+from browse import browse
+from bulk_delete import bulk_delete, delete_ids
+from bulk_update import bulk_update
+from catalog_watch import CatalogWatch
+from db.ingest_queue import enqueue
+from db.loading import ACTOR_DETAIL, ACTOR_LIST, MOVIE_DETAIL, MOVIE_LIST
+from db.models import Actor, Movie
+from db.pools import get_session_maker
+from entity_cache import MISSING, NEGATIVE, EntityCache, entity_key
+from export import export
+from flask import (Blueprint, current_app, jsonify, render_template, request,
+                   session, url_for)
+from images import ImageStore, images
+from jobs import jobs
+from monitoring import monitoring
+from negotiation import wants_json
+from page_cache import cached_page, create_page_cache
+from pagination import InvalidCursor, Page, PageParams, fetch_page
+from profiling import ProfilerSettings, ProfilingFlask, profiling
+from search import search
 from sqlalchemy import inspect, select
-from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
-                                    create_async_engine)
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from stats import stats
+from timing import timing
+from view_counter import ViewCounter, counted_view
 
 # ------ Setup-------
 
@@ -17,44 +38,14 @@ logging.basicConfig(
 )
 
 
-def get_db_url() -> str:
-    """Generate the database URL using environment variables.
-
-    This function constructs the database URL
-    using the provided environment variables
-    for the PostgreSQL database connection.
-
-    Returns:
-        str: The constructed database URL.
-    """
-    pg_vars = (
-        'POSTGRES_INNER_HOST',
-        'POSTGRES_INNER_PORT',
-        'POSTGRES_USER',
-        'POSTGRES_PASSWORD',
-        'POSTGRES_DB',
-        )
-    credentials = {pr: os.environ.get(pr) for pr in pg_vars}
-    return (
-        'postgresql+psycopg://' +
-        '{POSTGRES_USER}:{POSTGRES_PASSWORD}' +
-        '@{POSTGRES_INNER_HOST}:{POSTGRES_INNER_PORT}' +
-        '/{POSTGRES_DB}'
-    ).format(**credentials)
-
-
 NOT_FOUND = 404
 INTERNAL_ERROR = 500
+BAD_REQUEST = 400
 OK = 200
 CREATED = 201
+ACCEPTED = 202
 
-engine = create_async_engine(get_db_url())
-async_session_maker = async_sessionmaker(
-    engine, expire_on_commit=False,
-)
-app = Flask(__name__, static_folder='templates/static')
-app.json.ensure_ascii = False
-app.secret_key = os.urandom(24)
+pages = Blueprint('pages', __name__)
 
 
 class ObjectDoesNotExists(Exception):
@@ -80,14 +71,28 @@ class ObjectDoesNotExists(Exception):
 # ------ Helpful functions -------
 
 
-async def update(obj_data: dict, some_cls: Movie | Actor) -> None:
+def current_session_maker() -> async_sessionmaker[AsyncSession]:
+    """Return the session maker of the current app.
+
+    Returns:
+        async_sessionmaker[AsyncSession]: The shared session maker.
+    """
+    return current_app.extensions['async_session_maker']
+
+
+async def update(
+    obj_data: dict,
+    some_cls: Movie | Actor,
+    session_maker: async_sessionmaker[AsyncSession],
+        ) -> None:
     """_summary_.
 
     Args:
         obj_data (dict): _description_
         some_cls (object): _description_
+        session_maker (sessionmaker): Factory of the updating session.
     """
-    async with async_session_maker() as async_session:
+    async with session_maker() as async_session:
         async with async_session.begin():
             query = (
                 await async_session.execute(
@@ -105,44 +110,52 @@ async def update(obj_data: dict, some_cls: Movie | Actor) -> None:
 
 async def get_movies(
     session_maker: async_sessionmaker[AsyncSession],
-        ) -> list[Movie]:
-    """Asynchronously fetch all movies from the database.
+    page_params: PageParams | None = None,
+        ) -> Page:
+    """Asynchronously fetch one page of movies from the database.
 
-    This function queries the database asynchronously
-    for all records of type Movie and returns them.
+    Movies are ordered by rating (best first) and id,
+    and paginated by keyset, so any page costs the same as the first one.
 
     Args:
         session_maker (sessionmaker):
         An asynchronous session maker for interacting with the database.
+        page_params (PageParams): Cursor and page size, the first page by default.
 
     Returns:
-        list[Movie]: A list of Movie objects fetched from the database.
+        Page: Movie objects of the page and cursors of its neighbours.
     """
     async with session_maker() as async_session:
-        stmt = select(Movie)
-        query = await async_session.execute(stmt)
-        return query.scalars().all()
+        return await fetch_page(
+            async_session, select(Movie).options(*MOVIE_LIST),
+            (Movie.rating, Movie.id),
+            page_params or PageParams(), descending=True,
+            )
 
 
 async def get_actors(
     session_maker: async_sessionmaker[AsyncSession],
-        ) -> list[Actor]:
-    """Asynchronously fetch all actors from the database.
+    page_params: PageParams | None = None,
+        ) -> Page:
+    """Asynchronously fetch one page of actors from the database.
 
-    This function queries the database asynchronously
-    for all records of type Actor and returns them.
+    Actors are ordered by name and id,
+    and paginated by keyset, so any page costs the same as the first one.
 
     Args:
         session_maker (sessionmaker):
         An asynchronous session maker for interacting with the database.
+        page_params (PageParams): Cursor and page size, the first page by default.
 
     Returns:
-        list[Actor]: A list of Actor objects fetched from the database.
+        Page: Actor objects of the page and cursors of its neighbours.
     """
     async with session_maker() as async_session:
-        stmt = select(Actor)
-        query = await async_session.execute(stmt)
-        return query.scalars().all()
+        return await fetch_page(
+            async_session, select(Actor).options(*ACTOR_LIST),
+            (Actor.actor_name, Actor.id),
+            page_params or PageParams(),
+            )
 
 
 async def get_movie(
@@ -153,6 +166,8 @@ async def get_movie(
 
     This function queries the database asynchronously
     for a record of type Movie with the specified ID and returns it.
+    Found and missing ids are kept in the `entity_cache` extension,
+    and dropped when it or a related entity changes.
 
     Args:
         movie_id (str): The ID of the movie to fetch.
@@ -166,15 +181,22 @@ async def get_movie(
         Movie: The Movie object with the specified ID,
         or raises ObjectDoesNotExists if not found.
     """
-    async with session_maker() as async_session:
-        stmt = select(Movie).where(Movie.id == movie_id)
-        query = await async_session.execute(stmt)
-        query_result = query.scalars().first()
+    key = entity_key(Movie, movie_id)
+    query_result = current_app.extensions['entity_cache'].get(key)
+    if query_result is MISSING:
+        snapshot = current_app.extensions['catalog_watch'].snapshot()
+        async with session_maker() as async_session:
+            stmt = select(Movie).where(Movie.id == movie_id)
+            query = await async_session.execute(stmt.options(*MOVIE_DETAIL))
+            query_result = query.scalars().first()
         if query_result is None:
-            raise ObjectDoesNotExists(
-                'Movie with id `{0}` does not exists'.format(movie_id),
-                )
-        return query_result
+            query_result = NEGATIVE
+        current_app.extensions['catalog_watch'].keep(key, query_result, snapshot)
+    if query_result is NEGATIVE:
+        raise ObjectDoesNotExists(
+            'Movie with id `{0}` does not exists'.format(movie_id),
+            )
+    return query_result
 
 
 async def get_actor(
@@ -185,6 +207,8 @@ async def get_actor(
 
     This function queries the database asynchronously
     for a record of type Actor with the specified ID and returns it.
+    Found and missing ids are kept in the `entity_cache` extension,
+    and dropped when it or a related entity changes.
 
     Args:
         actor_id (str): The ID of the actor to fetch.
@@ -198,48 +222,73 @@ async def get_actor(
         Actor: The Actor object with the specified ID,
         or raises ObjectDoesNotExists if not found.
     """
-    async with session_maker() as async_session:
-        stmt = select(Actor).where(Actor.id == actor_id)
-        query = await async_session.execute(stmt)
-        query_result = query.scalars().first()
+    key = entity_key(Actor, actor_id)
+    query_result = current_app.extensions['entity_cache'].get(key)
+    if query_result is MISSING:
+        snapshot = current_app.extensions['catalog_watch'].snapshot()
+        async with session_maker() as async_session:
+            stmt = select(Actor).where(Actor.id == actor_id)
+            query = await async_session.execute(stmt.options(*ACTOR_DETAIL))
+            query_result = query.scalars().first()
         if query_result is None:
-            raise ObjectDoesNotExists(
-                'Actor with id `{0}` does not exists'.format(actor_id),
-                )
-        return query_result
+            query_result = NEGATIVE
+        current_app.extensions['catalog_watch'].keep(key, query_result, snapshot)
+    if query_result is NEGATIVE:
+        raise ObjectDoesNotExists(
+            'Actor with id `{0}` does not exists'.format(actor_id),
+            )
+    return query_result
 
 # ------ Main pages -------
 
 
-@app.get('/')
+@pages.get('/')
+@cached_page
 async def index():
-    """Render the main page displaying a list of movies.
+    """Render the main page displaying a page of movies.
 
     This route handler renders the main page of the application,
-    listing all available movies.
+    listing movies page by page. The `after`/`before` cursors
+    and `limit` query arguments select the page,
+    JSON clients get the same page as a JSON document.
 
     Returns:
         TemplateResponse: The rendered template for the main page.
     """
-    movies = await get_movies(async_session_maker)
-    return render_template(template_name_or_list='index.html', movies=movies)
+    page_params = PageParams.from_args(request.args, current_app.config['PAGE_SIZE'])
+    page = await get_movies(current_session_maker(), page_params)
+    if wants_json():
+        return jsonify(page.as_dict())
+    return render_template(
+        template_name_or_list='index.html', movies=page.rows, page=page,
+        )
 
 
-@app.get('/actors')
+@pages.get('/actors')
+@cached_page
 async def actors():
-    """Render the actors page displaying a list of actors.
+    """Render the actors page displaying a page of actors.
 
     This route handler renders the actors page of the application,
-    listing all available actors.
+    listing actors page by page. The `after`/`before` cursors
+    and `limit` query arguments select the page,
+    JSON clients get the same page as a JSON document.
 
     Returns:
         TemplateResponse: The rendered template for the actors page.
     """
-    act_seq = await get_actors(async_session_maker)
-    return render_template(template_name_or_list='actors.html', actors=act_seq)
+    page_params = PageParams.from_args(request.args, current_app.config['PAGE_SIZE'])
+    page = await get_actors(current_session_maker(), page_params)
+    if wants_json():
+        return jsonify(page.as_dict())
+    return render_template(
+        template_name_or_list='actors.html', actors=page.rows, page=page,
+        )
 
 
-@app.get('/detail/<string:movie_id>', endpoint='detail')
+@pages.get('/detail/<string:movie_id>', endpoint='detail')
+@counted_view
+@cached_page
 async def view_movie(movie_id: str):
     """Render the detail page for a specific movie.
 
@@ -252,11 +301,13 @@ async def view_movie(movie_id: str):
     Returns:
         TemplateResponse: The rendered template for the movie detail page.
     """
-    movie = await get_movie(movie_id, async_session_maker)
+    movie = await get_movie(movie_id, current_session_maker())
     return render_template(template_name_or_list='detail.html', movie=movie)
 
 
-@app.get('/actor/<string:actor_id>', endpoint='actor')
+@pages.get('/actor/<string:actor_id>', endpoint='actor')
+@counted_view
+@cached_page
 async def view_actor(actor_id: str):
     """Render the detail page for a specific actor.
 
@@ -269,50 +320,52 @@ async def view_actor(actor_id: str):
     Returns:
         TemplateResponse: The rendered template for the actor detail page.
     """
-    actor = await get_actor(actor_id, async_session_maker)
+    actor = await get_actor(actor_id, current_session_maker())
     return render_template(template_name_or_list='actor.html', actor=actor)
 
 # ------ REST -------
 
 
-@app.route('/add_movie_actor', methods=['GET', 'POST'])
+@pages.route('/add_movie_actor', methods=['GET', 'POST'])
 async def add_movie_actor():
     """Handle adding a movie or actor via the REST API.
 
     This route handler processes both GET and POST requests
-    to add a movie or actor based on an IMDb ID.
+    to add a movie or actor based on an IMDb ID. The import itself
+    runs in the background worker: POST only queues the IMDb ID
+    and answers 202 with the job to poll at `/jobs/<job_id>`.
 
     Returns:
-        Tuple[TemplateResponse, int]:
-        The response template and HTTP status code indicating success.
+        Tuple[TemplateResponse | dict, int]:
+        The response template (JSON for JSON clients) and HTTP status code.
     """
     if request.method == 'POST':
-        api = MoviesApi()
         imdb_id = request.form.get('id')
         if imdb_id is None:
             imdb_id = request.json['id']
-        if imdb_id.startswith('tt'):
-            url = 'https://www.imdb.com/title/{0}/'.format(imdb_id)
-            await api.add_movie(url)
-        if imdb_id.startswith('nm'):
-            url = 'https://www.imdb.com/name/{0}/'.format(imdb_id)
-            await api.add_actor(url)
-        session['message'] = 'Added successfully!'
+        if not imdb_id.startswith(('tt', 'nm')):
+            return {'error': 'Unknown IMDb id `{0}`'.format(imdb_id)}, BAD_REQUEST
+        job = await enqueue(imdb_id, current_session_maker())
+        status_url = url_for('jobs.job_status', job_id=job.id)
+        if request.form.get('id') is None:
+            return {'job_id': job.id, 'status_url': status_url}, ACCEPTED
+        session['message'] = 'Queued! Progress: {0}'.format(status_url)
     message = session.get('message')
     session.pop('message', None)
     return render_template(
         template_name_or_list='form.html', method='post',
         link='add_movie_actor',
         message='' if message is None else message,
-    ), CREATED
+    ), ACCEPTED if request.method == 'POST' else CREATED
 
 
-@app.route('/delete_movie_actor', methods=['GET', 'POST', 'DELETE'])
+@pages.route('/delete_movie_actor', methods=['GET', 'POST', 'DELETE'])
 async def delete_movie_actor():
     """Handle deleting a movie or actor via the REST API.
 
     This route handler processes GET, POST, and DELETE requests
-    to delete a movie or actor based on an IMDb ID.
+    to delete a movie or actor based on an IMDb ID,
+    its links going with it (`DELETE /bulk_delete` for many IDs).
 
     Returns:
         Tuple[TemplateResponse, int]:
@@ -323,23 +376,9 @@ async def delete_movie_actor():
             imdb_id = request.form.get('id')
         else:
             imdb_id = request.json['id']
-        async with async_session_maker() as async_session:
-            async with async_session.begin():
-                if imdb_id.startswith('tt'):
-                    instance = (
-                        await async_session.execute(
-                            select(Movie).where(Movie.id == imdb_id),
-                            )
-                        )
-                if imdb_id.startswith('nm'):
-                    instance = (
-                        await async_session.execute(
-                            select(Actor).where(Actor.id == imdb_id),
-                            )
-                        )
-                instance = instance.scalars().first()
-                await async_session.delete(instance)
-        session['message'] = 'Deleted successfully!'
+        deleted = await delete_ids(current_session_maker(), [imdb_id])
+        current_app.extensions['catalog_watch'].changed(*deleted)
+        session['message'] = 'Deleted successfully!' if deleted else 'Nothing to delete.'
     message = session.get('message')
     session.pop('message', None)
     return render_template(
@@ -349,7 +388,7 @@ async def delete_movie_actor():
     )
 
 
-@app.route('/update_movie', methods=['GET', 'POST', 'PUT'])
+@pages.route('/update_movie', methods=['GET', 'POST', 'PUT'])
 async def update_movie():
     """Update a movie's details via the REST API.
 
@@ -370,7 +409,8 @@ async def update_movie():
         if request.method == 'PUT':
             movie_data = request.get_json()
             logging.info(movie_data)
-        await update(movie_data, Movie)
+        await update(movie_data, Movie, current_session_maker())
+        current_app.extensions['catalog_watch'].changed(movie_data['id'])
         session['message'] = 'Modified successfully!'
     message = session.get('message')
     session.pop('message', None)
@@ -381,7 +421,7 @@ async def update_movie():
     ), OK
 
 
-@app.route('/update_actor', methods=['GET', 'POST', 'PUT'])
+@pages.route('/update_actor', methods=['GET', 'POST', 'PUT'])
 async def update_actor():
     """Update an actor's details via the REST API.
 
@@ -401,7 +441,8 @@ async def update_actor():
                 actor_data[attr] = request.form.get(attr)
         if request.method == 'PUT':
             actor_data = request.get_json()
-        await update(actor_data, Actor)
+        await update(actor_data, Actor, current_session_maker())
+        current_app.extensions['catalog_watch'].changed(actor_data['id'])
         session['message'] = 'Modified successfully!'
     message = session.get('message')
     session.pop('message', None)
@@ -414,7 +455,7 @@ async def update_actor():
 # ------ Handlers -------
 
 
-@app.errorhandler(ObjectDoesNotExists)
+@pages.app_errorhandler(ObjectDoesNotExists)
 def obj_does_not_exists_error(error):
     """Error handler for ObjectDoesNotExists exceptions.
 
@@ -431,7 +472,24 @@ def obj_does_not_exists_error(error):
     return render_template('404.html'), NOT_FOUND
 
 
-@app.errorhandler(NOT_FOUND)
+@pages.app_errorhandler(InvalidCursor)
+def invalid_cursor_error(error):
+    """Error handler for InvalidCursor exceptions.
+
+    This error handler catches
+    InvalidCursor exceptions and responds with 400 Bad Request.
+
+    Args:
+        error (InvalidCursor): The exception instance.
+
+    Returns:
+        Tuple[dict, int]:
+        The error description and HTTP status code indicating an error.
+    """
+    return {'error': error.message}, BAD_REQUEST
+
+
+@pages.app_errorhandler(NOT_FOUND)
 def not_found_error(error):
     """Error handler for generic 404 Not Found errors.
 
@@ -448,7 +506,7 @@ def not_found_error(error):
     return render_template('404.html'), NOT_FOUND
 
 
-@app.errorhandler(INTERNAL_ERROR)
+@pages.app_errorhandler(INTERNAL_ERROR)
 def internal_error(error):
     """Error handler for generic 500 Internal Server Error.
 
@@ -465,5 +523,38 @@ def internal_error(error):
     return render_template('500.html'), INTERNAL_ERROR
 
 
+BLUEPRINTS = (
+    profiling, timing, pages, jobs, monitoring, export, search, autocomplete, browse, stats,
+    bulk_update, bulk_delete, images,
+)
+
+
+def create_app() -> ProfilingFlask:
+    """Create and configure the app.
+
+    Nothing connects to the database or imports the IMDb scraping stack
+    here, so a preloading server creates the app once and forks its
+    workers from it: `gunicorn --preload 'server:create_app()'`.
+
+    Returns:
+        ProfilingFlask: The configured app.
+    """
+    app = ProfilingFlask(__name__, static_folder='templates/static')
+    app.json.ensure_ascii = False
+    app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(24)
+    app.config['PAGE_SIZE'] = int(os.environ.get('PAGE_SIZE', '24'))
+    app.extensions['async_session_maker'] = get_session_maker()
+    app.extensions['entity_cache'] = EntityCache.from_env()
+    app.extensions['catalog_watch'] = CatalogWatch(app.extensions['entity_cache'])
+    app.extensions['view_counter'] = ViewCounter.from_env()
+    app.extensions['image_store'] = ImageStore.from_env()
+    app.extensions['page_cache'] = create_page_cache()
+    app.extensions['autocomplete_cache'] = create_autocomplete_cache()
+    app.extensions['profiler'] = ProfilerSettings.from_env()
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
+    return app
+
+
 if __name__ == '__main__':
-    app.run(port=os.getenv('FLASK_PORT'))
+    create_app().run(port=os.getenv('FLASK_PORT'))
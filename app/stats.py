@@ -0,0 +1,112 @@
+"""Catalog statistics blueprint module.
+
+`GET /stats` reads the movie counts and rating totals of the genres and
+the filmography sizes of the actors from the `genre_stats` and
+`actor_stats` summary tables. Database triggers add every change of the
+links and ratings to them, so they are never recomputed. The top-rated
+titles of a genre are the first entries of `movie_genre_rating_idx`.
+"""
+import itertools
+from operator import attrgetter
+
+from db.models import Actor, ActorStats, Genre, GenreStats, Movie, MovieGenre
+from flask import Blueprint, current_app, jsonify, render_template
+from negotiation import wants_json
+from page_cache import cached_page
+from sqlalchemy import ColumnElement, Select, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+TOP_ACTORS = 20
+TOP_TITLES = 5
+
+stats = Blueprint('stats', __name__)
+
+
+def top_rated(genre_id: ColumnElement) -> Select:
+    """Build the query of the best rated movies of a genre.
+
+    It reads the first `TOP_TITLES` entries of the genre
+    in `movie_genre_rating_idx`, whatever the size of the catalog.
+
+    Args:
+        genre_id (ColumnElement): The genre, usually a correlated column.
+
+    Returns:
+        Select: Id, name and rating of the movies, best first.
+    """
+    titles = select(Movie.id, Movie.movie_name, MovieGenre.rating).join(MovieGenre)
+    best_first = (MovieGenre.rating.desc(), MovieGenre.movie_id.desc())
+    titles = titles.where(MovieGenre.genre_id == genre_id).order_by(*best_first)
+    return titles.limit(TOP_TITLES)
+
+
+async def genre_stats(async_session: AsyncSession) -> list[dict]:
+    """Fetch the statistics of every genre with movies.
+
+    Args:
+        async_session (AsyncSession): Session used to read the summaries.
+
+    Returns:
+        list[dict]: Movie count, average rating and top-rated titles
+        of each genre, largest genres first.
+    """
+    top = top_rated(GenreStats.genre_id).lateral()
+    totals = (Genre.genre_name, GenreStats.movies, GenreStats.rating_sum)
+    stmt = select(*totals, top).join(GenreStats)
+    stmt = stmt.join(top, true()).where(GenreStats.movies > 0)
+    largest_first = (GenreStats.movies.desc(), Genre.genre_name)
+    best_first = (top.c.rating.desc(), top.c.id.desc())
+    query = await async_session.execute(stmt.order_by(*largest_first, *best_first))
+    genres = []
+    for genre_name, titles in itertools.groupby(query, key=attrgetter('genre_name')):
+        titles = list(titles)
+        genres.append({
+            'genre': genre_name,
+            'movies': titles[0].movies,
+            'avg_rating': float(titles[0].rating_sum / titles[0].movies),
+            'top_rated': [
+                {'id': title.id, 'movie_name': title.movie_name, 'rating': title.rating}
+                for title in titles
+            ],
+        })
+    return genres
+
+
+async def top_actors(async_session: AsyncSession, limit: int) -> list[dict]:
+    """Fetch the actors with the largest filmographies.
+
+    Args:
+        async_session (AsyncSession): Session used to read the summaries.
+        limit (int): Number of actors returned.
+
+    Returns:
+        list[dict]: Id, name and filmography size of each actor.
+    """
+    stmt = select(Actor.id, Actor.actor_name, ActorStats.movies).join(
+        ActorStats, ActorStats.actor_id == Actor.id,
+        ).where(ActorStats.movies > 0)
+    query = await async_session.execute(
+        stmt.order_by(ActorStats.movies.desc(), ActorStats.actor_id.desc()).limit(limit),
+        )
+    return [dict(actor) for actor in query.mappings()]
+
+
+@stats.get('/stats')
+@cached_page
+async def catalog_stats():
+    """Render the catalog statistics.
+
+    JSON clients get them as a JSON document.
+
+    Returns:
+        Response: Genre statistics and the actors with the largest filmographies.
+    """
+    session_maker = current_app.extensions['async_session_maker']
+    async with session_maker() as async_session:
+        summary = {
+            'genres': await genre_stats(async_session),
+            'actors': await top_actors(async_session, TOP_ACTORS),
+        }
+    if wants_json():
+        return jsonify(summary)
+    return render_template(template_name_or_list='stats.html', **summary)
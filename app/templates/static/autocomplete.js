@@ -0,0 +1,25 @@
+// Typeahead for IMDb id inputs marked with `data-autocomplete`.
+// Suggestions come from `/autocomplete`, the chosen option fills in the id.
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+    var list = document.createElement('datalist');
+    var timer = null;
+    list.id = input.name + '-suggestions';
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+    input.after(list);
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            fetch(input.dataset.autocomplete + '?q=' + encodeURIComponent(input.value))
+                .then(function (response) { return response.json(); })
+                .then(function (suggestions) {
+                    list.replaceChildren.apply(list, suggestions.map(function (suggestion) {
+                        var option = document.createElement('option');
+                        option.value = suggestion.id;
+                        option.label = suggestion.name + ' (' + suggestion.kind + ')';
+                        return option;
+                    }));
+                });
+        }, 150); // Wait for a pause in typing
+    });
+});
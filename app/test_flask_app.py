@@ -1,16 +1,91 @@
+import os
+
+os.environ.setdefault('IMDB_HTTP_MODE', 'replay')
+
+import httpx
 import pytest
-from server import app 
+import bulk_update as bulk_update_module
+import server
+from catalog_watch import EVERYTHING
+from db.http_cache import FIXTURES_DIR, CachingFetcher, HttpCache, ReplayMiss
+from db.ingest_queue import FAILED, enqueue
+from db.imdb import MoviesApi
+from db.ld_json import extract_ld_json, parse_ld_json, scan_ld_json
+from db.bulk_load import load_catalog
+from db.models import (Actor, ActorStats, CatalogVersion, CrawlState, Genre, GenreStats, IngestJob,
+                       Movie, MovieActor, MovieGenre, NameWord)
+from db.pools import TimedQueuePool, get_db_url, get_engine, get_session_maker
+from images import ImageStore
+from db.rate_budget import RateBudget
+from db.refresh import pick_due
+from pagination import encode_cursor
+from profiling import RequestProfile
+from PIL import Image
+from server import create_app
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import selectinload
+from view_counter import ViewCounter
+from worker import is_permanent, process_next
+import requests
 import asyncio
+import dataclasses
+import datetime
+import io
+import json
+import pstats
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+app = create_app()
+async_session_maker = get_session_maker()
 
 
 @pytest.mark.asyncio
 async def test_add_movie_actor():
-    def sync_test():
+    def enqueue_test():
         with app.test_client() as test_client:
             response = test_client.post('/add_movie_actor', json={'id': 'tt1853728'})
-            assert response.status_code == 201  # Assuming successful operation returns 201 OK
+            assert response.status_code == 202
+            return response.get_json()['status_url']
+
+    def status_test(status_url):
+        with app.test_client() as test_client:
+            return test_client.get(status_url).get_json()
     loop = asyncio.get_running_loop()
-    await loop.run_in_executor(None, sync_test)
+    status_url = await loop.run_in_executor(None, enqueue_test)
+    assert (await loop.run_in_executor(None, status_test, status_url))['status'] == 'queued'
+    api = MoviesApi()
+    while await process_next(api, async_session_maker):
+        pass
+    job = await loop.run_in_executor(None, status_test, status_url)
+    assert job['status'] == 'done'
+    assert job['report']['actors_added'] == 3
+    assert 'total' in job['report']['timings']
+
+
+@pytest.mark.asyncio
+async def test_permanent_job_failures_are_not_retried():
+    job = await enqueue('tt12x', async_session_maker)
+    while await process_next(MoviesApi(), async_session_maker):
+        pass
+    async with async_session_maker() as async_session:
+        failed = await async_session.get(IngestJob, job.id)
+    assert (failed.status, failed.attempts) == (FAILED, 1)
+    assert 'Malformed IMDb id' in failed.error
+    # Only requeued jobs are pushed back.
+    assert failed.run_after == job.run_after
+    missing = requests.Response()
+    missing.status_code = 404
+    unavailable = requests.Response()
+    unavailable.status_code = 503
+    assert is_permanent(ReplayMiss('No recorded response'))
+    assert is_permanent(requests.HTTPError(response=missing))
+    assert not is_permanent(requests.HTTPError(response=unavailable))
+    assert not is_permanent(asyncio.TimeoutError())
 
 
 @pytest.mark.asyncio
@@ -38,4 +113,1106 @@ async def test_delete_movie_actor():
             response = test_client.delete('/delete_movie_actor', json={'id': 'tt1853728'})
             assert response.status_code == 200  # Assuming successful operation returns 201 OK
     loop = asyncio.get_running_loop()
-    await loop.run_in_executor(None, sync_test)
\ No newline at end of file
+    await loop.run_in_executor(None, sync_test)
+
+@pytest.mark.asyncio
+async def test_index_keyset_pagination():
+    seeded = ['tt99000{0:02d}'.format(num) for num in range(7)]
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add_all([
+                Movie(id=movie_id, movie_name=movie_id, url='', poster='', description='', rating=-1.0)
+                for movie_id in seeded
+            ])
+
+    def sync_test():
+        with app.test_client() as test_client:
+            walked, previous = [], None
+            page = test_client.get('/', query_string={'format': 'json', 'limit': 3}).get_json()
+            while True:
+                walked.extend(item['id'] for item in page['items'])
+                if previous is not None:
+                    args = {'format': 'json', 'limit': 3, 'before': page['prev_cursor']}
+                    assert test_client.get('/', query_string=args).get_json()['items'] == previous['items']
+                if page['next_cursor'] is None:
+                    break
+                args = {'format': 'json', 'limit': 3, 'after': page['next_cursor']}
+                previous, page = page, test_client.get('/', query_string=args).get_json()
+            assert [movie_id for movie_id in walked if movie_id in seeded] == sorted(seeded, reverse=True)
+            assert len(walked) == len(set(walked))
+            assert test_client.get('/', query_string={'after': 'garbage'}).status_code == 400
+            for forged in (['best', 'tt1'], [7.5, 1], [True, 'tt1'], [None, 'tt1']):
+                after = encode_cursor(forged)
+                assert test_client.get('/', query_string={'after': after}).status_code == 400
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, sync_test)
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(Movie).where(Movie.id.in_(seeded)))
+
+
+# Eager loading the models used to do implicitly (lazy='selectin' on every relationship).
+LEGACY_MOVIE = (
+    selectinload(Movie.actors).selectinload(Actor.movies).selectinload(Movie.genres),
+    selectinload(Movie.genres).selectinload(Genre.movies).selectinload(Movie.actors),
+)
+LEGACY_ACTOR = (
+    selectinload(Actor.movies).selectinload(Movie.genres).selectinload(Genre.movies),
+    selectinload(Actor.movies).selectinload(Movie.actors),
+)
+
+
+def count_sql(test_client, url):
+    stats = {'statements': 0, 'rows': 0}
+
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        stats['statements'] += 1
+        stats['rows'] += max(cursor.rowcount, 0)
+    event.listen(get_engine().sync_engine, 'after_cursor_execute', after_execute)
+    try:
+        assert test_client.get(url).status_code == 200
+    finally:
+        event.remove(get_engine().sync_engine, 'after_cursor_execute', after_execute)
+    return stats
+
+
+def settle_catalog():
+    # Apply the notifications of the writes made so far, then drop the cached version and entities.
+    watch = app.extensions['catalog_watch']
+    assert watch.flush(5)
+    watch.changed(EVERYTHING)
+
+
+@pytest.mark.asyncio
+async def test_loading_profiles_sql_cost(monkeypatch):
+    movie_ids = ['tt98000{0:02d}'.format(num) for num in range(6)]
+    actor_ids = ['nm98000{0:02d}'.format(num) for num in range(12)]
+    genres = [Genre(genre_name='profile-genre-{0}'.format(num)) for num in range(3)]
+    actors = [
+        Actor(id=actor_id, actor_name=actor_id, image='', url='', description='', birth_date=datetime.date(1970, 1, 1))
+        for actor_id in actor_ids
+    ]
+    movies = [
+        Movie(
+            id=movie_id, movie_name=movie_id, url='', poster='', description='', rating=-2.0,
+            actors=[actors[(num * 2 + shift) % len(actors)] for shift in range(5)],
+            genres=[genres[num % len(genres)], genres[(num + 1) % len(genres)]],
+        )
+        for num, movie_id in enumerate(movie_ids)
+    ]
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add_all(movies)
+    urls = ['/?limit=100', '/actors?limit=100', '/detail/tt9800000', '/actor/nm9800000']
+
+    def sync_test():
+        settle_catalog()
+        with app.test_client() as test_client:
+            after = {url: count_sql(test_client, url) for url in urls}
+            monkeypatch.setattr(server, 'MOVIE_LIST', LEGACY_MOVIE)
+            monkeypatch.setattr(server, 'MOVIE_DETAIL', LEGACY_MOVIE)
+            monkeypatch.setattr(server, 'ACTOR_LIST', LEGACY_ACTOR)
+            monkeypatch.setattr(server, 'ACTOR_DETAIL', LEGACY_ACTOR)
+            app.extensions['entity_cache'].clear()
+            app.extensions['page_cache'].clear()
+            before = {url: count_sql(test_client, url) for url in urls}
+        for url in urls:
+            assert after[url]['rows'] < before[url]['rows'], '{0} before: {1} after: {2}'.format(
+                url, before[url], after[url],
+            )
+        # The first page also reads the catalog version, kept until the next change.
+        assert after['/?limit=100']['statements'] == 2
+        assert after['/actors?limit=100']['statements'] == 1
+        assert after['/detail/tt9800000']['statements'] == 3
+        assert after['/actor/nm9800000']['statements'] == 2
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, sync_test)
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(MovieActor).where(MovieActor.movie_id.in_(movie_ids)))
+                await async_session.execute(delete(MovieGenre).where(MovieGenre.movie_id.in_(movie_ids)))
+                await async_session.execute(delete(Movie).where(Movie.id.in_(movie_ids)))
+                await async_session.execute(delete(Actor).where(Actor.id.in_(actor_ids)))
+                await async_session.execute(delete(Genre).where(Genre.genre_name.like('profile-genre-%')))
+
+
+@pytest.mark.asyncio
+async def test_add_movie_fetches_cast_concurrently(monkeypatch):
+    movie_id = 'tt9700000'
+    actor_ids = ['nm97000{0:02d}'.format(num) for num in range(6)]
+
+    async def fake_movie(self, imdb_id):
+        return {
+            'name': 'Concurrent', 'url': '', 'image': '', 'description': '',
+            'aggregateRating': {'ratingValue': 5.0}, 'genre': ['upsert-genre-a', 'upsert-genre-b'],
+            'actor': [{'url': 'https://www.imdb.com/name/{0}/'.format(actor_id)} for actor_id in actor_ids],
+        }
+
+    async def fake_person(self, actor_id):
+        await asyncio.sleep(0.2)
+        if actor_id == actor_ids[0]:
+            raise ConnectionError('IMDb is down')
+        if actor_id == actor_ids[1]:
+            await asyncio.sleep(10)
+        return {'mainEntity': {'name': actor_id, 'image': '', 'url': '', 'description': '', 'birthDate': '1970-01-01'}}
+    monkeypatch.setattr(MoviesApi, 'get_movie', fake_movie)
+    monkeypatch.setattr(MoviesApi, 'get_person', fake_person)
+    try:
+        api = MoviesApi(concurrency=6, fetch_timeout=1)
+        for _ in range(2):
+            report = await api.add_movie('https://www.imdb.com/title/{0}/'.format(movie_id))
+        assert report.actors_added == 4
+        assert report.actors_failed == actor_ids[:2]
+        assert report.timings['actors_fetch'] < 2
+        async with async_session_maker() as async_session:
+            cast = await async_session.scalars(select(MovieActor.actor_id).where(MovieActor.movie_id == movie_id))
+            assert sorted(cast) == actor_ids[2:]
+            genres = await async_session.scalars(select(MovieGenre.genre_id).where(MovieGenre.movie_id == movie_id))
+            assert len(genres.all()) == 2
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(MovieGenre).where(MovieGenre.movie_id == movie_id))
+                await async_session.execute(delete(Genre).where(Genre.genre_name.like('upsert-genre-%')))
+                await async_session.execute(delete(MovieActor).where(MovieActor.movie_id == movie_id))
+                await async_session.execute(delete(Movie).where(Movie.id == movie_id))
+                await async_session.execute(delete(Actor).where(Actor.id.in_(actor_ids)))
+
+
+@pytest.mark.asyncio
+async def test_added_actor_refresh_is_unchanged(monkeypatch):
+    actor_id = 'nm9600000'
+    person = {'mainEntity': {'name': 'Hashed', 'image': '', 'url': '', 'description': '', 'birthDate': '1970-01-01'}}
+
+    async def fake_page(self, url, revalidate=False):
+        return person
+    monkeypatch.setattr(MoviesApi, 'get_person', lambda self, imdb_id: fake_page(self, None))
+    monkeypatch.setattr(MoviesApi, 'fetch_ld_json', fake_page)
+    try:
+        api = MoviesApi()
+        await api.add_actor('https://www.imdb.com/name/{0}/'.format(actor_id))
+        async with async_session_maker() as async_session:
+            known_hash = await async_session.scalar(
+                select(CrawlState.content_hash).where(CrawlState.imdb_id == actor_id),
+            )
+        # The import and the refresh hash the same row of the same page.
+        assert not await api.refresh(actor_id, known_hash)
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(CrawlState).where(CrawlState.imdb_id == actor_id))
+                await async_session.execute(delete(Actor).where(Actor.id == actor_id))
+
+
+@pytest.mark.asyncio
+async def test_http_cache_revalidates_and_evicts(tmp_path):
+    class FakeResponse(object):
+        def __init__(self, status_code, content=b'', headers=None):
+            self.status_code, self.content, self.headers = status_code, content, headers or {}
+
+        def raise_for_status(self):
+            pass
+
+    class FakeSession(object):
+        def __init__(self):
+            self.requests = []
+
+        async def get(self, url, headers, timeout):
+            self.requests.append(headers)
+            if headers.get('If-None-Match') == '"v1"':
+                return FakeResponse(304)
+            return FakeResponse(200, b'x' * 60, {'ETag': '"v1"'})
+    session = FakeSession()
+    fetcher = CachingFetcher(session, HttpCache(tmp_path, ttl=0, max_bytes=100))
+    assert await fetcher.fetch('https://example.com/a/', {}) == b'x' * 60
+    assert await fetcher.fetch('https://example.com/a/', {}) == b'x' * 60
+    assert session.requests == [{}, {'If-None-Match': '"v1"'}]
+    await fetcher.fetch('https://example.com/b/', {})
+    assert fetcher.cache.lookup('https://example.com/a/') is None
+    assert fetcher.cache.lookup('https://example.com/b/') is not None
+    # The refresher revalidates pages the cache still holds as fresh.
+    fresh = CachingFetcher(session, HttpCache(tmp_path / 'fresh', ttl=None, max_bytes=None))
+    for revalidate in (False, False, True):
+        await fresh.fetch('https://example.com/c/', {}, revalidate=revalidate)
+    assert session.requests[-2:] == [{}, {'If-None-Match': '"v1"'}]
+    budget = RateBudget(rate=100, burst=1)
+    assert budget.reserve() == 0
+    assert 0.009 < budget.reserve() <= 0.01
+
+
+@pytest.mark.asyncio
+async def test_shared_pools():
+    first, second = MoviesApi(), MoviesApi()
+    assert first.session is second.session
+    assert first.async_session.bind is second.async_session.bind is get_engine()
+    await first.async_session.close()
+    await second.async_session.close()
+
+    def stats_test():
+        with app.test_client() as test_client:
+            test_client.get('/?format=json')
+            return test_client.get('/pool_stats').get_json()
+    stats = await asyncio.get_running_loop().run_in_executor(None, stats_test)
+    assert stats['checkouts'] > 0
+    assert stats['checked_out'] == 0
+    assert stats['timeouts'] == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_times_only_the_queue_wait():
+    engine = create_async_engine(get_db_url(), poolclass=TimedQueuePool, pool_size=1, max_overflow=0)
+    try:
+        async with engine.connect():
+            pass
+        # Opening the first connection is no wait, the pool had room.
+        assert (engine.pool.connects, engine.pool.wait_total) == (1, 0)
+        assert engine.pool.connect_total > 0
+
+        async def hold():
+            async with engine.connect():
+                await asyncio.sleep(0.2)
+        holding = asyncio.create_task(hold())
+        await asyncio.sleep(0.05)
+        async with engine.connect():
+            pass
+        await holding
+        assert 0.1 < engine.pool.wait_max < 1
+        assert engine.pool.connects == 1
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_invalidation():
+    movie_id, actor_id = 'tt9700000', 'nm9700000'
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add(Movie(
+                id=movie_id, movie_name='Cached', url='', poster='', description='', rating=-3.0,
+                actors=[Actor(
+                    id=actor_id, actor_name='Cached Actor', image='', url='',
+                    description='', birth_date=datetime.date(1970, 1, 1),
+                )],
+            ))
+
+    def sync_test():
+        settle_catalog()
+        with app.test_client() as test_client:
+            assert count_sql(test_client, '/detail/{0}'.format(movie_id))['statements'] == 4
+            app.extensions['page_cache'].clear()
+            # A warm hit reads neither the entity nor the catalog version.
+            assert count_sql(test_client, '/detail/{0}'.format(movie_id))['statements'] == 0
+            assert count_sql(test_client, '/actor/{0}'.format(actor_id))['statements'] == 2
+            assert test_client.get('/detail/tt9700001').status_code == 404
+            assert test_client.get('/detail/tt9700001').status_code == 404
+            test_client.put('/update_movie', json={'id': movie_id, 'movie_name': 'Renamed'})
+            assert b'Renamed' in test_client.get('/detail/{0}'.format(movie_id)).data
+            assert b'Renamed' in test_client.get('/actor/{0}'.format(actor_id)).data
+            test_client.delete('/delete_movie_actor', json={'id': actor_id})
+            assert test_client.get('/actor/{0}'.format(actor_id)).status_code == 404
+            assert b'Cached Actor' not in test_client.get('/detail/{0}'.format(movie_id)).data
+
+    def other_process_test():
+        assert app.extensions['catalog_watch'].flush(5)
+        with app.test_client() as test_client:
+            assert b'Renamed elsewhere' in test_client.get('/detail/{0}'.format(movie_id)).data
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, sync_test)
+        stats = app.extensions['entity_cache'].stats()
+        assert stats['hits'] >= 1 and stats['negative_hits'] == 1 and stats['invalidations'] >= 2
+        # A write that does not go through this process, like another worker's.
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(
+                    update(Movie).where(Movie.id == movie_id).values(movie_name='Renamed elsewhere'),
+                )
+        await asyncio.get_running_loop().run_in_executor(None, other_process_test)
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(MovieActor).where(MovieActor.movie_id == movie_id))
+                await async_session.execute(delete(Movie).where(Movie.id == movie_id))
+                await async_session.execute(delete(Actor).where(Actor.id == actor_id))
+
+
+@pytest.mark.asyncio
+async def test_bulk_update(monkeypatch):
+    movie_ids, actor_id = ('tt9710000', 'tt9710001'), 'nm9710000'
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add_all([
+                Movie(id=movie_id, movie_name='Bulk', url='', poster='', description='', rating=1.0)
+                for movie_id in movie_ids
+            ])
+            async_session.add(Actor(
+                id=actor_id, actor_name='Bulk Actor', image='', url='', description='',
+                birth_date=datetime.date(1970, 1, 1),
+            ))
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def sync_test():
+        with app.test_client() as test_client:
+            event.listen(get_engine().sync_engine, 'before_cursor_execute', before_execute)
+            try:
+                response = test_client.patch('/bulk_update/movies', json=[
+                    {'id': movie_ids[0], 'rating': 8},
+                    {'id': movie_ids[1], 'description': 'Fixed'},
+                    {'id': 'tt9719999', 'rating': 2.0},
+                    {'id': movie_ids[0], 'rating': 3.0},
+                    {'id': movie_ids[1], 'budget': 1},
+                    {'id': movie_ids[1], 'rating': 'high'},
+                    {'rating': 4.0},
+                    {'id': movie_ids[1], 'description': 'x' * 300},
+                ])
+            finally:
+                event.remove(get_engine().sync_engine, 'before_cursor_execute', before_execute)
+            assert response.status_code == 200
+            body = response.get_json()
+            assert body['updated'] == 2
+            assert [result['status'] for result in body['results']] == [
+                'updated', 'updated', 'not_found', 'invalid', 'invalid', 'invalid', 'invalid', 'invalid',
+            ]
+            assert body['results'][3]['error'] == 'duplicate id'
+            assert body['results'][4]['error'] == 'unknown columns: budget'
+            assert body['results'][7]['error'] == '`description` must be shorter than 300 characters'
+            # All the valid records in one statement.
+            assert sum(statement.startswith('UPDATE movie') for statement in statements) == 1
+            response = test_client.patch(
+                '/bulk_update/actors', json=[{'id': actor_id, 'birth_date': '1980-02-03'}],
+            )
+            assert response.get_json()['results'][0]['status'] == 'updated'
+            assert test_client.patch('/bulk_update/actors', json={'id': actor_id}).status_code == 400
+            # Constraints the records cannot be checked against reject the whole update.
+            monkeypatch.setattr(bulk_update_module, 'MAX_LENGTHS', {})
+            rejected = test_client.patch('/bulk_update/actors', json=[{'id': actor_id, 'description': 'x' * 1000}])
+            assert rejected.status_code == 422 and 'description_valid_length' in rejected.get_json()['error']
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, sync_test)
+        async with async_session_maker() as async_session:
+            movies = {
+                movie.id: movie
+                for movie in await async_session.scalars(select(Movie).where(Movie.id.in_(movie_ids)))
+            }
+            actor = await async_session.get(Actor, actor_id)
+        assert (movies[movie_ids[0]].rating, movies[movie_ids[0]].description) == (8.0, '')
+        assert (movies[movie_ids[1]].rating, movies[movie_ids[1]].description) == (1.0, 'Fixed')
+        assert actor.birth_date == datetime.date(1980, 2, 3)
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(Movie).where(Movie.id.in_(movie_ids)))
+                await async_session.execute(delete(Actor).where(Actor.id == actor_id))
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete():
+    movie_id, kept_actor, doomed_actor = 'tt9720000', 'nm9720000', 'nm9720001'
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add(Movie(
+                id=movie_id, movie_name='Doomed', url='', poster='', description='', rating=5.0,
+                genres=[Genre(genre_name='doomed-genre')],
+                actors=[
+                    Actor(
+                        id=actor_id, actor_name='Doomed Actor', image='', url='', description='',
+                        birth_date=datetime.date(1970, 1, 1),
+                    )
+                    for actor_id in (kept_actor, doomed_actor)
+                ],
+            ))
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def sync_test():
+        with app.test_client() as test_client:
+            event.listen(get_engine().sync_engine, 'before_cursor_execute', before_execute)
+            try:
+                response = test_client.delete(
+                    '/bulk_delete', json=[movie_id, doomed_actor, 'tt9729999', 'xx1', 5],
+                )
+            finally:
+                event.remove(get_engine().sync_engine, 'before_cursor_execute', before_execute)
+            assert response.status_code == 200
+            body = response.get_json()
+            assert body['deleted'] == 2
+            assert [result['status'] for result in body['results']] == [
+                'deleted', 'deleted', 'not_found', 'invalid', 'invalid',
+            ]
+            assert test_client.delete('/bulk_delete', json={'ids': []}).status_code == 400
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, sync_test)
+        # One DELETE per table, the links cascade in the database.
+        assert [statement.split()[2] for statement in statements if statement.startswith('DELETE')] == [
+            'movie', 'actor', 'crawl_state',
+        ]
+        async with async_session_maker() as async_session:
+            links = await async_session.scalars(select(MovieActor).where(MovieActor.movie_id == movie_id))
+            assert list(links) == []
+            genre = await async_session.scalar(select(Genre).where(Genre.genre_name == 'doomed-genre'))
+            genre_links = await async_session.scalars(select(MovieGenre).where(MovieGenre.genre_id == genre.id))
+            assert list(genre_links) == []
+            assert (await async_session.get(ActorStats, kept_actor)).movies == 0
+            assert await async_session.get(ActorStats, doomed_actor) is None
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(Movie).where(Movie.id == movie_id))
+                await async_session.execute(delete(Actor).where(Actor.id.in_((kept_actor, doomed_actor))))
+                await async_session.execute(delete(Genre).where(Genre.genre_name == 'doomed-genre'))
+
+
+@pytest.mark.asyncio
+async def test_recrawl_writes_changed_rows_only():
+    actor_id = 'nm0004937'
+    api = MoviesApi()
+    await api.add_actor('https://www.imdb.com/name/{0}/'.format(actor_id))
+    await api.async_session.close()
+
+    async def read_state():
+        async with async_session_maker() as async_session:
+            state = await async_session.get(CrawlState, actor_id)
+            version = await async_session.get(CatalogVersion, 1)
+            return state.last_fetched, state.content_hash, version.counter
+    fetched, known_hash, version = await read_state()
+    # An unchanged page only stamps the fetch, the catalog keeps its version.
+    assert not await api.refresh(actor_id, known_hash)
+    refetched, same_hash, same_version = await read_state()
+    assert refetched > fetched and (same_hash, same_version) == (known_hash, version)
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            await async_session.execute(update(Actor).where(Actor.id == actor_id).values(description='Drifted'))
+    assert await api.refresh(actor_id, 'outdated')
+    async with async_session_maker() as async_session:
+        assert (await async_session.get(Actor, actor_id)).description != 'Drifted'
+
+    viewed, stale, recent, unknown = 'tt9730000', 'nm9730000', 'nm9730001', 'nm9730002'
+    month_ago = datetime.datetime.now() - datetime.timedelta(days=30)
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add(Movie(id=viewed, movie_name='Viewed', url='', poster='', description='', rating=-4.0))
+            async_session.add_all([
+                Actor(id=actor, actor_name='Recrawled', image='', url='', description='', birth_date=datetime.date(1970, 1, 1))
+                for actor in (stale, recent, unknown)
+            ])
+            async_session.add_all([
+                CrawlState(imdb_id=viewed, last_fetched=month_ago, views=10),
+                CrawlState(imdb_id=stale, last_fetched=month_ago),
+                CrawlState(imdb_id=recent, last_fetched=datetime.datetime.now()),
+            ])
+    app.extensions['view_counter'] = ViewCounter(flush_every=2)
+
+    def view_test():
+        with app.test_client() as test_client:
+            for _ in range(2):
+                assert test_client.get('/detail/{0}'.format(viewed)).status_code == 200
+            assert test_client.get('/detail/tt9730009').status_code == 404
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, view_test)
+        async with async_session_maker() as async_session:
+            assert (await async_session.get(CrawlState, viewed)).views == 12
+            assert await async_session.get(CrawlState, 'tt9730009') is None
+        due = [imdb_id for imdb_id, _ in await pick_due(async_session_maker, datetime.timedelta(days=1), 1000)]
+        # Never fetched first, then staleness weighted by views.
+        assert due.index(unknown) < due.index(viewed) < due.index(stale)
+        assert recent not in due
+    finally:
+        app.extensions['view_counter'] = ViewCounter.from_env()
+        deleted = await server.delete_ids(async_session_maker, [viewed, stale, recent, unknown])
+        assert len(deleted) == 4
+    async with async_session_maker() as async_session:
+        assert list(await async_session.scalars(select(CrawlState).where(CrawlState.imdb_id == viewed))) == []
+
+
+@pytest.mark.asyncio
+async def test_image_proxy_variants(tmp_path):
+    movie_id, poster = 'tt9740000', 'https://m.media-amazon.com/images/M/tt9740000.jpg'
+    upstream = []
+
+    def fetch_original(http_request):
+        upstream.append(str(http_request.url))
+        if 'slow' in http_request.url.path:
+            time.sleep(0.2)
+        if http_request.url.path.endswith('missing.jpg'):
+            return httpx.Response(404)
+        original = io.BytesIO()
+        Image.new('RGB', (2000, 3000), 'red').save(original, 'PNG')
+        return httpx.Response(200, content=original.getvalue())
+    image_store = ImageStore(HttpCache(tmp_path, ttl=None, max_bytes=None), frozenset({'m.media-amazon.com'}), 2, 1)
+    image_store.transport = httpx.MockTransport(fetch_original)
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add(Movie(id=movie_id, movie_name='Proxied', url='', poster=poster, description='', rating=-5.0))
+
+    def sync_test():
+        with app.test_client() as test_client:
+            page = test_client.get('/detail/{0}'.format(movie_id)).get_data(as_text=True)
+            detail_url = page.split('<img src="')[1].split('"')[0].replace('&amp;', '&')
+            assert detail_url.startswith('/images/detail?src=')
+            detail = test_client.get(detail_url)
+            thumb = test_client.get('/images/thumb', query_string={'src': poster})
+            revalidated = test_client.get(detail_url, headers={'If-None-Match': detail.headers['ETag']})
+            elsewhere = test_client.get('/images/thumb', query_string={'src': 'https://example.com/a.jpg'})
+            missing = test_client.get('/images/thumb', query_string={'src': poster.replace(movie_id, 'missing')})
+            return detail, thumb, revalidated.status_code, elsewhere.status_code, missing.status_code
+
+    def cold_request(variant):
+        with app.test_client() as test_client:
+            return test_client.get('/images/{0}'.format(variant), query_string={'src': slow}).status_code
+    slow = poster.replace(movie_id, 'slow')
+    app.extensions['image_store'] = image_store
+    try:
+        detail, thumb, revalidated, elsewhere, missing = await asyncio.get_running_loop().run_in_executor(None, sync_test)
+        cold = await asyncio.gather(*[
+            asyncio.get_running_loop().run_in_executor(None, cold_request, variant)
+            for variant in ('thumb', 'detail', 'thumb', 'detail')
+        ])
+    finally:
+        app.extensions['image_store'] = ImageStore.from_env()
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(Movie).where(Movie.id == movie_id))
+    assert (detail.mimetype, thumb.mimetype) == ('image/jpeg', 'image/jpeg')
+    assert Image.open(io.BytesIO(detail.data)).size == (467, 700)
+    assert Image.open(io.BytesIO(thumb.data)).size == (300, 450)
+    assert {'public', 'immutable', 'max-age=31536000'} <= set(thumb.headers['Cache-Control'].split(', '))
+    # The original is fetched once, both variants are made from it.
+    assert upstream.count(poster) == 1
+    # Concurrent requests of an image not cached yet share one fetch.
+    assert cold == [200] * 4 and upstream.count(slow) == 1
+    assert (revalidated, elsewhere, missing) == (304, 400, 502)
+
+
+def test_ld_json_extraction(caplog):
+    for body_path in sorted(FIXTURES_DIR.glob('*.body')):
+        page = body_path.read_bytes()
+        assert scan_ld_json(page) == parse_ld_json(page)
+    assert extract_ld_json(
+        b"<HEAD><SCRIPT nonce='x' TYPE='application/ld+json'>{\"name\": \"Scanned\"}</SCRIPT >",
+    ) == {'name': 'Scanned'}
+    assert 'Unexpected layout' not in caplog.text
+    # A commented out block is not valid JSON: the whole page is parsed.
+    commented = (
+        b'<html><head><!-- <script type="application/ld+json">{"name": </script> -->'
+        b'<script type="application/ld+json">{"name": "Parsed"}</script></head></html>'
+    )
+    assert extract_ld_json(commented, 'commented') == {'name': 'Parsed'}
+    assert 'Unexpected layout of commented' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_server_timing_and_metrics():
+    api = MoviesApi()
+    await api.get_person('nm0004937')
+    await api.async_session.close()
+
+    def sync_test():
+        settle_catalog()
+        with app.test_client() as test_client:
+            test_client.get('/')  # reads the catalog version
+            statements = count_sql(test_client, '/stats')['statements']
+            timing = test_client.get('/stats').headers['Server-Timing']
+            assert timing.startswith('sql;dur=') and 'render;dur=' in timing and 'total;dur=' in timing
+            assert 'desc="{0} statements"'.format(statements) in test_client.get('/stats?format=json').headers['Server-Timing']
+            metrics = test_client.get('/metrics')
+            assert metrics.mimetype == 'text/plain'
+            return metrics.get_data(as_text=True)
+    metrics = await asyncio.get_running_loop().run_in_executor(None, sync_test)
+    assert 'http_request_duration_seconds_count{route="stats.catalog_stats"}' in metrics
+    assert 'http_request_sql_statements_bucket{route="stats.catalog_stats",le="+Inf"}' in metrics
+    assert 'ingest_stage_duration_seconds_count{stage="fetch"}' in metrics
+    assert 'ingest_stage_duration_seconds_count{stage="parse"}' in metrics
+
+
+@pytest.mark.asyncio
+async def test_profile_requests(tmp_path):
+    settings = app.extensions['profiler']
+    saved = dataclasses.replace(settings)
+    settings.directory, settings.secret = tmp_path, 'profile-secret'
+
+    def sync_test():
+        with app.test_client() as test_client:
+            assert 'X-Profile-File' not in test_client.get('/stats', headers={'X-Profile': 'wrong'}).headers
+            traced = test_client.get('/stats?traced', headers={'X-Profile': 'profile-secret'})
+            settings.secret, settings.sample_rate, settings.sample_interval = '', 1, 0.001
+            sampled = test_client.get('/stats?sampled')
+            assert 'X-Profile-File' not in sampled.headers
+            return traced.headers['X-Profile-File']
+    try:
+        traced = await asyncio.get_running_loop().run_in_executor(None, sync_test)
+    finally:
+        app.extensions['profiler'] = saved
+    functions = {function for _, _, function in pstats.Stats(str(tmp_path / traced)).stats}
+    assert {'catalog_stats', 'render_template'} <= functions  # the async view runs on another thread
+    assert [path.suffix for path in tmp_path.iterdir()].count('.folded') == 1
+
+
+def test_profiles_sharing_a_thread():
+    # Concurrent async views share the loop thread in ASGI mode.
+    first, second = RequestProfile(), RequestProfile()
+    first.start_thread()
+    tracing = sys.getprofile()
+    second.start_thread()
+    second.stop_thread()
+    assert sys.getprofile() is tracing  # the nested profile did not take over
+    first.stop_thread()
+    assert sys.getprofile() is None
+
+
+@pytest.mark.asyncio
+async def test_page_cache_conditional_get():
+    def sync_test():
+        settle_catalog()
+        with app.test_client() as test_client:
+            first = test_client.get('/actors')
+            assert first.status_code == 200 and first.headers['ETag'] and first.last_modified
+            again = test_client.get('/actors', headers={'If-None-Match': first.headers['ETag']})
+            assert again.status_code == 304 and again.data == b''
+            assert count_sql(test_client, '/actors')['statements'] == 0
+            test_client.put('/update_actor', json={'id': 'nm0004937', 'description': 'Changed'})
+            changed = test_client.get('/actors', headers={'If-None-Match': first.headers['ETag']})
+            assert changed.status_code == 304  # the list does not show descriptions
+            detail = test_client.get('/actor/nm0004937')
+            assert b'Changed' in detail.data
+            json_page = test_client.get('/actors?format=json')
+            assert json_page.is_json and json_page.headers['ETag'] != first.headers['ETag']
+    await asyncio.get_running_loop().run_in_executor(None, sync_test)
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson():
+    movie_ids = ['tt9600000', 'tt9600001']
+    actor = Actor(
+        id='nm9600000', actor_name='Exported', image='', url='', description='',
+        birth_date=datetime.date(1970, 1, 1), created=datetime.date(2001, 1, 1),
+    )
+    genre = Genre(genre_name='export-genre')
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add_all([
+                Movie(
+                    id=movie_id, movie_name=movie_id, url='', poster='', description='',
+                    rating=-4.0, created=created, actors=[actor], genres=[genre],
+                )
+                for movie_id, created in zip(movie_ids, [datetime.date(2001, 1, 1), datetime.date(2002, 1, 1)])
+            ])
+
+    def export_lines(test_client, url):
+        response = test_client.get(url)
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def sync_test():
+        with app.test_client() as test_client:
+            movies = {row['id']: row for row in export_lines(test_client, '/export/movies')}
+            assert set(movie_ids) <= set(movies)
+            assert movies['tt9600001']['created'] == '2002-01-01'
+            since = {row['id'] for row in export_lines(test_client, '/export/movies?since=2002-01-01')}
+            assert 'tt9600001' in since and 'tt9600000' not in since
+            assert 'nm9600000' in {row['id'] for row in export_lines(test_client, '/export/actors')}
+            # Links are dated on their own: both were made today, for an old and a new movie.
+            edges = export_lines(test_client, '/export/movie_actor?since=2002-01-01')
+            assert {'movie_id': 'tt9600001', 'actor_id': 'nm9600000'} in edges
+            assert {'movie_id': 'tt9600000', 'actor_id': 'nm9600000'} in edges
+            tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+            assert not export_lines(test_client, '/export/movie_genre?since={0}'.format(tomorrow))
+            genres = export_lines(test_client, '/export/movie_genre')
+            assert {'movie_id': 'tt9600000', 'genre_name': 'export-genre'} in genres
+            assert test_client.get('/export/movies?since=yesterday').status_code == 400
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, sync_test)
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(MovieActor).where(MovieActor.movie_id.in_(movie_ids)))
+                await async_session.execute(delete(MovieGenre).where(MovieGenre.movie_id.in_(movie_ids)))
+                await async_session.execute(delete(Movie).where(Movie.id.in_(movie_ids)))
+                await async_session.execute(delete(Actor).where(Actor.id == 'nm9600000'))
+                await async_session.execute(delete(Genre).where(Genre.genre_name == 'export-genre'))
+
+
+@pytest.mark.asyncio
+async def test_bulk_load_round_trip():
+    movie_ids = ['tt9500000', 'tt9500001']
+    actor = Actor(
+        id='nm9500000', actor_name='Loaded Actor', image='', url='', description='',
+        birth_date=datetime.date(1970, 1, 1),
+    )
+    genre = Genre(genre_name='load-genre')
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add_all([
+                Movie(
+                    id=movie_id, movie_name='Qwzloaded {0}'.format(movie_id), url='', poster='',
+                    description='', rating=rating, actors=[actor], genres=[genre],
+                )
+                for movie_id, rating in zip(movie_ids, [6.0, 7.0])
+            ])
+
+    def export_catalog():
+        with app.test_client() as test_client:
+            return {
+                name: [
+                    json.loads(line)
+                    for line in test_client.get('/export/{0}'.format(table)).get_data(as_text=True).splitlines()
+                    if {json.loads(line).get('id'), json.loads(line).get('movie_id')} & {*movie_ids, actor.id}
+                ]
+                for name, table in (('movies', 'movies'), ('actors', 'actors'),
+                                    ('movie_genre', 'movie_genre'), ('movie_actor', 'movie_actor'))
+            }
+
+    async def stored():
+        async with async_session_maker() as async_session:
+            links = await async_session.execute(
+                select(MovieGenre.movie_id, MovieGenre.rating).where(MovieGenre.movie_id.in_(movie_ids)),
+            )
+            genre_stats = await async_session.execute(
+                select(GenreStats.movies, GenreStats.rating_sum).join(Genre).where(Genre.genre_name == 'load-genre'),
+            )
+            return {
+                'links': dict(links.all()),
+                'genre_stats': genre_stats.one(),
+                'actor_stats': await async_session.scalar(
+                    select(ActorStats.movies).where(ActorStats.actor_id == actor.id),
+                ),
+                'word': await async_session.scalar(select(NameWord.word).where(NameWord.word == 'qwzloaded')),
+                'version': await async_session.scalar(select(CatalogVersion.counter)),
+            }
+    try:
+        exported = await asyncio.get_running_loop().run_in_executor(None, export_catalog)
+        assert [len(exported[name]) for name in ('movies', 'actors', 'movie_genre', 'movie_actor')] == [2, 1, 2, 2]
+        await server.delete_ids(async_session_maker, [*movie_ids, actor.id])
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(NameWord).where(NameWord.word == 'qwzloaded'))
+        before = (await stored())['version']
+        loaded = await load_catalog(async_session_maker, exported)
+        assert loaded == {'genres': 0, 'movies': 2, 'actors': 1, 'movie_genre': 2, 'movie_actor': 2}
+        after = await stored()
+        # The work of the bypassed row triggers, done once for the load.
+        assert after['links'] == {movie_ids[0]: 6.0, movie_ids[1]: 7.0}
+        assert after['genre_stats'] == (2, 13) and after['actor_stats'] == 2
+        assert after['word'] == 'qwzloaded' and after['version'] == before + 1
+        # Conflicts: stored rows and links are kept as they are.
+        exported['movies'][0]['rating'] = 9.0
+        loaded = await load_catalog(async_session_maker, exported)
+        assert loaded == {'genres': 0, 'movies': 0, 'actors': 0, 'movie_genre': 0, 'movie_actor': 0}
+        assert (await stored())['links'][movie_ids[0]] == 6.0
+        # --update overwrites the movies, their links and the genre summary follow.
+        loaded = await load_catalog(async_session_maker, exported, update=True)
+        assert loaded['movies'] == 2 and loaded['movie_genre'] == 0
+        after = await stored()
+        assert after['links'][movie_ids[0]] == 9.0 and after['genre_stats'] == (2, 16)
+        watch = app.extensions['catalog_watch']
+        assert await asyncio.get_running_loop().run_in_executor(None, watch.flush, 5)
+        assert app.extensions['entity_cache'].stats()['size'] == 0
+    finally:
+        await server.delete_ids(async_session_maker, [*movie_ids, actor.id])
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(Genre).where(Genre.genre_name == 'load-genre'))
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_movies_and_actors():
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add_all([
+                Movie(
+                    id='tt9500000', movie_name='Zanzibar Nights', url='', poster='',
+                    description='A heist on a spice ship.', rating=-5.0,
+                ),
+                Movie(
+                    id='tt9500001', movie_name='Harbour', url='', poster='',
+                    description='Smugglers leave Zanzibar at night.', rating=-5.0,
+                ),
+                Actor(
+                    id='nm9500000', actor_name='Ana Zanzibar', image='', url='',
+                    description='', birth_date=datetime.date(1970, 1, 1),
+                ),
+            ])
+
+    def sync_test():
+        with app.test_client() as test_client:
+            results = test_client.get('/search?q=zanzibar&format=json').get_json()['results']
+            assert [row['id'] for row in results] == ['nm9500000', 'tt9500000', 'tt9500001']
+            assert results[1]['rank'] > results[2]['rank']  # title matches rank first
+            assert test_client.get('/search?q=zanzibar -spice&format=json').get_json()['results'][0]['id'] != 'tt9500000'
+            page = test_client.get('/search?q=zanzibar+nights')
+            assert page.status_code == 200 and b'Zanzibar Nights' in page.data
+            test_client.put('/update_movie', json={'id': 'tt9500001', 'description': 'Quiet docks.'})
+            results = test_client.get('/search?q=zanzibar&format=json').get_json()['results']
+            assert 'tt9500001' not in {row['id'] for row in results}
+            assert test_client.get('/search?q=&format=json').get_json()['results'] == []
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, sync_test)
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(Movie).where(Movie.id.in_(['tt9500000', 'tt9500001'])))
+                await async_session.execute(delete(Actor).where(Actor.id == 'nm9500000'))
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_prefix_and_fuzzy():
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add_all([
+                Movie(id='tt9400000', movie_name='Quillbrook Manor', url='', poster='', description='', rating=-6.0),
+                Movie(id='tt9400001', movie_name='Return to Quillbrook', url='', poster='', description='', rating=-6.0),
+                Actor(
+                    id='nm9400000', actor_name='Quill 50% Off', image='', url='', description='',
+                    birth_date=datetime.date(1970, 1, 1),
+                ),
+            ])
+
+    def sync_test():
+        with app.test_client() as test_client:
+            found = test_client.get('/autocomplete?q=quillbr').get_json()
+            assert [row['id'] for row in found][:2] == ['tt9400000', 'tt9400001']
+            assert found[0] == {'kind': 'movie', 'id': 'tt9400000', 'name': 'Quillbrook Manor'}
+            assert 'tt9400000' in {row['id'] for row in test_client.get('/autocomplete?q=quilbrook').get_json()}
+            assert [row['id'] for row in test_client.get('/autocomplete?q=quill 50%').get_json()] == ['nm9400000']
+            assert test_client.get('/autocomplete?q=q').get_json() == []
+            hits = app.extensions['autocomplete_cache'].stats()['hits']
+            test_client.get('/autocomplete?q=QUILLBR')
+            assert app.extensions['autocomplete_cache'].stats()['hits'] == hits + 1
+            assert 'autocomplete_cache' in test_client.get('/cache_stats').get_json()
+            assert b'data-autocomplete' in test_client.get('/add_movie_actor').data
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, sync_test)
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(Movie).where(Movie.id.in_(['tt9400000', 'tt9400001'])))
+                await async_session.execute(delete(Actor).where(Actor.id == 'nm9400000'))
+
+
+@pytest.mark.asyncio
+async def test_browse_by_genre_and_rating():
+    movie_ids = ['tt93000{0:02d}'.format(num) for num in range(5)]
+    genres = [Genre(genre_name='browse-genre-a'), Genre(genre_name='browse-genre-b')]
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add_all([
+                Movie(
+                    id=movie_id, movie_name=movie_id, url='', poster='', description='',
+                    rating=float(num), genres=[genres[num % 2]],
+                )
+                for num, movie_id in enumerate(movie_ids)
+            ])
+
+    def sync_test():
+        with app.test_client() as test_client:
+            found = test_client.get('/browse?genre=browse-genre-a&format=json').get_json()
+            assert [row['id'] for row in found['items']] == ['tt9300004', 'tt9300002', 'tt9300000']
+            found = test_client.get('/browse?genre=browse-genre-a&order=asc&min_rating=1&limit=1&format=json').get_json()
+            assert [row['id'] for row in found['items']] == ['tt9300002']
+            found = test_client.get('/browse', query_string={
+                'genre': 'browse-genre-a', 'order': 'asc', 'min_rating': 1, 'limit': 1, 'format': 'json',
+                'after': found['next_cursor'],
+            }).get_json()
+            assert [row['id'] for row in found['items']] == ['tt9300004']
+            found = test_client.get('/browse?min_rating=1&max_rating=3.5&genre=browse-genre-b&format=json').get_json()
+            assert [row['id'] for row in found['items']] == ['tt9300003', 'tt9300001']
+            assert test_client.get('/browse?min_rating=high').status_code == 400
+            assert test_client.get('/browse?order=sideways').status_code == 400
+            page = test_client.get('/browse?genre=browse-genre-a&limit=2')
+            assert page.status_code == 200 and b'genre=browse-genre-a' in page.data
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, sync_test)
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(MovieGenre).where(MovieGenre.movie_id.in_(movie_ids)))
+                await async_session.execute(delete(Movie).where(Movie.id.in_(movie_ids)))
+                await async_session.execute(delete(Genre).where(Genre.genre_name.like('browse-genre-%')))
+
+
+@pytest.mark.asyncio
+async def test_stats_follow_writes():
+    movie_ids = ['tt94000{0:02d}'.format(num) for num in range(3)]
+    actor_ids = ['nm94000{0:02d}'.format(num) for num in range(2)]
+    actor_rows = [
+        {'id': actor_id, 'actor_name': actor_id, 'image': '', 'url': '', 'description': '',
+         'birth_date': datetime.date(1970, 1, 1)}
+        for actor_id in actor_ids
+    ]
+    api = MoviesApi()
+    for movie_id, rating, genre_names, cast in (
+        (movie_ids[0], 6.0, ['stats-genre-a'], actor_rows),
+        (movie_ids[1], 8.0, ['stats-genre-a', 'stats-genre-b'], actor_rows[:1]),
+        (movie_ids[2], 7.0, ['stats-genre-a'], actor_rows[:1]),
+    ):
+        movie_row = {'id': movie_id, 'movie_name': movie_id, 'url': '', 'poster': '', 'description': '', 'rating': rating}
+        await api.store_movie(movie_row, genre_names, cast)
+
+    async def filmographies():
+        async with async_session_maker() as async_session:
+            query = await async_session.execute(
+                select(ActorStats.actor_id, ActorStats.movies).where(ActorStats.actor_id.in_(actor_ids)),
+            )
+            return dict(query.all())
+
+    def genre_stats(test_client):
+        found = test_client.get('/stats?format=json').get_json()
+        return {
+            genre['genre']: (genre['movies'], genre['avg_rating'], [movie['id'] for movie in genre['top_rated']])
+            for genre in found['genres'] if genre['genre'].startswith('stats-genre-')
+        }
+
+    def sync_test():
+        with app.test_client() as test_client:
+            assert genre_stats(test_client) == {
+                'stats-genre-a': (3, 7.0, [movie_ids[1], movie_ids[2], movie_ids[0]]),
+                'stats-genre-b': (1, 8.0, [movie_ids[1]]),
+            }
+            test_client.put('/update_movie', json={'id': movie_ids[0], 'rating': 9.0})
+            assert genre_stats(test_client)['stats-genre-a'] == (3, 8.0, [movie_ids[0], movie_ids[1], movie_ids[2]])
+            test_client.delete('/delete_movie_actor', json={'id': movie_ids[1]})
+            assert genre_stats(test_client) == {'stats-genre-a': (2, 8.0, [movie_ids[0], movie_ids[2]])}
+            assert test_client.get('/stats').status_code == 200
+    try:
+        assert await filmographies() == {actor_ids[0]: 3, actor_ids[1]: 1}
+        await asyncio.get_running_loop().run_in_executor(None, sync_test)
+        assert await filmographies() == {actor_ids[0]: 2, actor_ids[1]: 1}
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(MovieActor).where(MovieActor.movie_id.in_(movie_ids)))
+                await async_session.execute(delete(MovieGenre).where(MovieGenre.movie_id.in_(movie_ids)))
+                await async_session.execute(delete(Movie).where(Movie.id.in_(movie_ids)))
+                await async_session.execute(delete(Actor).where(Actor.id.in_(actor_ids)))
+                await async_session.execute(delete(Genre).where(Genre.genre_name.like('stats-genre-%')))
+
+
+CATALOG_TABLES = ('movie', 'actor', 'genre', 'movie_actor', 'movie_genre')
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+@pytest.mark.asyncio
+async def test_lookups_do_not_scan_tables():
+    genre = Genre(genre_name='plan-genre')
+    actor = Actor(id='nm9200000', actor_name='Plan Actor', image='', url='', description='', birth_date=datetime.date(1970, 1, 1))
+    async with async_session_maker() as async_session:
+        async with async_session.begin():
+            async_session.add(Movie(
+                id='tt9200000', movie_name='Plan Movie', url='', poster='', description='', rating=5.0,
+                genres=[genre], actors=[actor],
+            ))
+    urls = [
+        '/browse?genre=plan-genre&min_rating=1&max_rating=8&format=json',
+        '/browse?order=asc&min_rating=1&limit=1&format=json',
+        '/actors?format=json',
+        '/actor/nm9200000',
+        '/export/movies?since=2020-01-01',
+    ]
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    def sync_test():
+        app.extensions['entity_cache'].clear()
+        app.extensions['page_cache'].clear()
+        event.listen(get_engine().sync_engine, 'before_cursor_execute', before_execute)
+        try:
+            with app.test_client() as test_client:
+                for url in urls:
+                    assert test_client.get(url).status_code == 200
+        finally:
+            event.remove(get_engine().sync_engine, 'before_cursor_execute', before_execute)
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, sync_test)
+        indexes = set()
+        async with get_engine().connect() as conn:
+            # Tables of a test database are tiny, so a sequential scan or a sort
+            # always looks cheapest: disable them to see whether an index path exists.
+            await conn.exec_driver_sql('SET enable_seqscan = off')
+            await conn.exec_driver_sql('SET enable_sort = off')
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith('SELECT'):
+                    continue
+                query = await conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+                for node in plan_nodes(query.scalar()[0]['Plan']):
+                    if node.get('Relation Name') in CATALOG_TABLES:
+                        assert node['Node Type'] != 'Seq Scan', statement
+                    indexes.add(node.get('Index Name'))
+        # Sorting by rating or name must walk an index, not sort a full scan.
+        assert {'movie_rating_idx', 'movie_genre_rating_idx', 'actor_name_idx'} <= indexes
+    finally:
+        async with async_session_maker() as async_session:
+            async with async_session.begin():
+                await async_session.execute(delete(MovieActor).where(MovieActor.movie_id == 'tt9200000'))
+                await async_session.execute(delete(MovieGenre).where(MovieGenre.movie_id == 'tt9200000'))
+                await async_session.execute(delete(Movie).where(Movie.id == 'tt9200000'))
+                await async_session.execute(delete(Actor).where(Actor.id == 'nm9200000'))
+                await async_session.execute(delete(Genre).where(Genre.genre_name == 'plan-genre'))
+
+
+PRELOAD_PROBE = '''
+import asyncio, os, sys
+import server
+from db.pools import get_engine
+
+app = server.create_app()
+print(sorted({'requests_html', 'pyppeteer', 'lxml', 'db.imdb'} & set(sys.modules)))
+
+async def connect():
+    async with get_engine().connect():
+        pass
+
+asyncio.run(connect())
+pid = os.fork()
+if pid == 0:
+    os._exit(get_engine().pool.checkedin())
+print(get_engine().pool.checkedin(), os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]))
+'''
+
+
+@pytest.mark.asyncio
+async def test_asgi_serves_requests_concurrently():
+    import asgi
+    threads = set()
+
+    @asgi.wsgi_application.wsgi_application.before_request
+    def record_thread():
+        threads.add(threading.get_ident())
+    # Requests occupying the default executor used to starve the host
+    # lookups of new connections, which run there too.
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(1))
+    transport = httpx.ASGITransport(app=asgi.application)
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+        responses = await asyncio.gather(
+            *[client.get('/actors', params={'format': 'json', 'limit': limit}) for limit in range(1, 5)],
+            client.get('/detail/tt9759999'),
+        )
+    assert [response.status_code for response in responses] == [200, 200, 200, 200, 404]
+    assert [len(response.json()['items']) for response in responses[:2]] == [1, 2]
+    # Requests run in the threads of their executor, not one shared thread.
+    assert len(threads) > 1
+
+
+def test_create_app_is_preload_safe():
+    probe = subprocess.run(
+        [sys.executable, '-c', PRELOAD_PROBE], capture_output=True, text=True, check=True,
+    )
+    scraping, pooled = probe.stdout.splitlines()
+    # The web app never loads the IMDb scraping stack.
+    assert scraping == '[]'
+    # A forked worker starts with an empty pool, the parent keeps its connection.
+    assert pooled == '1 0'
@@ -0,0 +1,142 @@
+"""Request timing blueprint module.
+
+Measures where each request spends its time: the number and duration
+of its SQL statements (engine events), template rendering (Flask
+signals) and the whole request. The split is sent back in a
+`Server-Timing` header, which browser dev tools show next to the
+request, and added to the `http_request_*` histograms of `/metrics`,
+labelled by route endpoint.
+"""
+import time
+from dataclasses import dataclass
+
+from db.metrics import (REQUEST_RENDER_SECONDS, REQUEST_SECONDS,
+                        REQUEST_SQL_SECONDS, REQUEST_SQL_STATEMENTS)
+from db.pools import get_engine
+from flask import Blueprint, Response, before_render_template
+from flask import g as request_globals
+from flask import has_request_context, request, template_rendered
+from flask.blueprints import BlueprintSetupState
+from sqlalchemy import event
+
+MILLISECONDS = 1000
+
+timing = Blueprint('timing', __name__)
+
+
+@dataclass
+class RequestTiming(object):
+    """Time spent by a request so far, in seconds."""
+
+    started: float
+    statements: int = 0
+    sql: float = 0
+    render: float = 0
+    render_started: float = 0
+
+
+def current_timing() -> RequestTiming | None:
+    """Return the timing of the current request.
+
+    Returns:
+        RequestTiming | None: The timing, None outside of a request.
+    """
+    if not has_request_context():
+        return None
+    return request_globals.get('timing')
+
+
+def start_statement(conn, *_args) -> None:
+    """Note the start of a statement on its connection.
+
+    Args:
+        conn (Connection): Connection running the statement.
+        _args (tuple): Other arguments of the engine event.
+    """
+    conn.info['statement_started'] = time.perf_counter()
+
+
+def end_statement(conn, *_args) -> None:
+    """Add a finished statement to the timing of the current request.
+
+    Args:
+        conn (Connection): Connection that ran the statement.
+        _args (tuple): Other arguments of the engine event.
+    """
+    request_timing = current_timing()
+    if request_timing is not None:
+        request_timing.statements += 1
+        request_timing.sql += time.perf_counter() - conn.info['statement_started']
+
+
+def start_render(*_args, **_kwargs) -> None:
+    """Note the start of a template rendering.
+
+    Args:
+        _args (tuple): Arguments of the signal.
+        _kwargs (dict): Keyword arguments of the signal.
+    """
+    request_timing = current_timing()
+    if request_timing is not None:
+        request_timing.render_started = time.perf_counter()
+
+
+def end_render(*_args, **_kwargs) -> None:
+    """Add a finished template rendering to the timing of the current request.
+
+    Args:
+        _args (tuple): Arguments of the signal.
+        _kwargs (dict): Keyword arguments of the signal.
+    """
+    request_timing = current_timing()
+    if request_timing is not None:
+        request_timing.render += time.perf_counter() - request_timing.render_started
+
+
+@timing.record_once
+def listen(state: BlueprintSetupState) -> None:
+    """Subscribe to the statements of the shared engine and to template renderings.
+
+    Args:
+        state (BlueprintSetupState): Registration of the blueprint on the app.
+    """
+    sync_engine = get_engine().sync_engine
+    event.listen(sync_engine, 'before_cursor_execute', start_statement)
+    event.listen(sync_engine, 'after_cursor_execute', end_statement)
+    before_render_template.connect(start_render, state.app)
+    template_rendered.connect(end_render, state.app)
+
+
+@timing.before_app_request
+def start_request() -> None:
+    """Start timing a request."""
+    request_globals.timing = RequestTiming(started=time.perf_counter())
+
+
+@timing.after_app_request
+def end_request(response: Response) -> Response:
+    """Report the timing of a request in its headers and in the histograms.
+
+    Args:
+        response (Response): The response of the request.
+
+    Returns:
+        Response: The response with a `Server-Timing` header.
+    """
+    request_timing = current_timing()
+    if request_timing is None:
+        return response
+    total = time.perf_counter() - request_timing.started
+    route = request.endpoint or 'unmatched'
+    REQUEST_SECONDS.observe(route, total)
+    REQUEST_SQL_SECONDS.observe(route, request_timing.sql)
+    REQUEST_SQL_STATEMENTS.observe(route, request_timing.statements)
+    REQUEST_RENDER_SECONDS.observe(route, request_timing.render)
+    response.headers['Server-Timing'] = ', '.join((
+        'sql;dur={0:.1f};desc="{1} statements"'.format(
+            request_timing.sql * MILLISECONDS, request_timing.statements,
+            ),
+        'render;dur={0:.1f}'.format(request_timing.render * MILLISECONDS),
+        'total;dur={0:.1f}'.format(total * MILLISECONDS),
+        ))
+    return response
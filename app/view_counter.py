@@ -0,0 +1,88 @@
+"""Detail page view counter module.
+
+The re-crawl refresher (`db.refresh`) favours the most viewed movies
+and actors. Writing each view to the database would add a write to every
+detail page, cached or not, so views are counted in process and added to
+`crawl_state` in one statement every `VIEW_FLUSH_EVERY` views. Views counted
+by a process that exits before its next flush are lost: the counts only
+rank the refreshes.
+"""
+import functools
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Callable
+
+from db.refresh import record_views
+from flask import Response, current_app, make_response
+
+COUNTED_STATUSES = frozenset((200, 304))
+
+
+class ViewCounter(object):
+    """Thread-safe counter of views, handed out in batches."""
+
+    def __init__(self, flush_every: int) -> None:
+        """Initialize an empty counter.
+
+        Args:
+            flush_every (int): Number of views per batch.
+        """
+        self.flush_every = flush_every
+        self._counts: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'ViewCounter':
+        """Configure a counter from the `VIEW_FLUSH_EVERY` environment variable.
+
+        Returns:
+            ViewCounter: The configured counter.
+        """
+        return cls(flush_every=int(os.environ.get('VIEW_FLUSH_EVERY', '100')))
+
+    def hit(self, imdb_id: str) -> Counter[str] | None:
+        """Count a view, taking the batch out once it is full.
+
+        Args:
+            imdb_id (str): The IMDb ID of the viewed movie or actor.
+
+        Returns:
+            Counter[str] | None: Views per id to write, None while the batch fills.
+        """
+        with self._lock:
+            self._counts[imdb_id] += 1
+            if self._counts.total() < self.flush_every:
+                return None
+            batch = self._counts
+            self._counts = Counter()
+        return batch
+
+
+def counted_view(view: Callable) -> Callable:
+    """Count the successful responses of a detail view.
+
+    Wraps `cached_page`, so views served from the page cache
+    and revalidations count too. A failed flush is logged,
+    the page is served anyway.
+
+    Args:
+        view (Callable): The async view function, its only argument is the IMDb id.
+
+    Returns:
+        Callable: The wrapped view.
+    """
+    @functools.wraps(view)
+    async def wrapper(**view_args) -> Response:
+        response = make_response(await view(**view_args))
+        if response.status_code in COUNTED_STATUSES:
+            imdb_id = next(iter(view_args.values()))
+            batch = current_app.extensions['view_counter'].hit(imdb_id)
+            if batch:
+                try:
+                    await record_views(current_app.extensions['async_session_maker'], batch)
+                except Exception as exc:
+                    logging.exception(exc)
+        return response
+    return wrapper
@@ -0,0 +1,304 @@
+"""Background ingestion worker module.
+
+Processes the `ingest_job` queue filled by the `add_movie_actor` route
+and, with `REFRESH_INTERVAL` set, refreshes the stored movies and actors
+that are due (see `db.refresh`).
+
+Usage:
+    python worker.py [--concurrency N]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import time
+import traceback
+from dataclasses import asdict
+from datetime import timedelta
+
+from db.http_cache import ReplayMiss
+from db.imdb import MoviesApi, get_http_session
+from db.ingest_queue import claim, finish, requeue_stale
+from db.metrics import CONTENT_TYPE, render_metrics
+from db.models import IngestJob
+from db.pools import get_session_maker, pool_stats
+from db.refresh import pick_due, postpone
+from requests import HTTPError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+POLL_INTERVAL = float(os.environ.get('INGEST_POLL_INTERVAL', '1'))
+JOB_TIMEOUT = float(os.environ.get('INGEST_JOB_TIMEOUT', '600'))
+REQUEUE_INTERVAL = float(os.environ.get('INGEST_REQUEUE_INTERVAL', '60'))
+# A live worker cancels its jobs after `JOB_TIMEOUT`: a job still running
+# a minute later belongs to a worker that died.
+STALE_AFTER = JOB_TIMEOUT + 60
+METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', '0'))
+REFRESH_INTERVAL = float(os.environ.get('REFRESH_INTERVAL', '0'))
+REFRESH_MAX_AGE = timedelta(seconds=float(os.environ.get('REFRESH_MAX_AGE', '604800')))
+REFRESH_BATCH = int(os.environ.get('REFRESH_BATCH', '50'))
+IMDB_ID = re.compile('(?:tt|nm)[0-9]+')
+NOT_FOUND = 404
+
+
+class MalformedId(Exception):
+    """Custom exception class for a job id that is not an IMDb id.
+
+    This exception is raised when a job is run for an id
+    that no IMDb page can have.
+    """
+
+    def __init__(self, message, *args):
+        """Initialize the exception with a human readable message.
+
+        Args:
+            message (str): Error description.
+            args (tuple): Extra exception arguments.
+        """
+        self.message = message
+        super().__init__(message, *args)
+
+
+def is_permanent(exc: Exception) -> bool:
+    """Check whether a job failure would repeat on a retry.
+
+    Args:
+        exc (Exception): The error raised by the job.
+
+    Returns:
+        bool: True for malformed ids, pages missing on IMDb
+        and pages not recorded in replay mode.
+    """
+    if isinstance(exc, (MalformedId, ReplayMiss)):
+        return True
+    return isinstance(exc, HTTPError) and getattr(exc.response, 'status_code', None) == NOT_FOUND
+
+
+async def run_job(api: MoviesApi, job: IngestJob) -> dict:
+    """Import the IMDb entity of a job.
+
+    Args:
+        api (MoviesApi): Api used to import the IMDb entity.
+        job (IngestJob): The claimed job.
+
+    Raises:
+        MalformedId: The id of the job is not an IMDb id.
+
+    Returns:
+        dict: Report of the import.
+    """
+    if not IMDB_ID.fullmatch(job.imdb_id):
+        raise MalformedId('Malformed IMDb id `{0}`'.format(job.imdb_id))
+    if job.imdb_id.startswith('tt'):
+        report = await api.add_movie('https://www.imdb.com/title/{0}/'.format(job.imdb_id))
+        return asdict(report)
+    await api.add_actor('https://www.imdb.com/name/{0}/'.format(job.imdb_id))
+    return {'imdb_id': job.imdb_id, 'timings': {}}
+
+
+async def process_next(
+    api: MoviesApi,
+    session_maker: async_sessionmaker[AsyncSession],
+        ) -> bool:
+    """Claim and run one queued job.
+
+    A job running longer than `JOB_TIMEOUT` is cancelled and fails.
+    Failures that would repeat (see `is_permanent`) are not retried.
+
+    Args:
+        api (MoviesApi): Api used to import the IMDb entity.
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+
+    Returns:
+        bool: False if no job was due.
+    """
+    job = await claim(session_maker)
+    if job is None:
+        return False
+    logging.info('Processing job {0} ({1})'.format(job.id, job.imdb_id))
+    started = time.perf_counter()
+    try:
+        report = await asyncio.wait_for(run_job(api, job), JOB_TIMEOUT)
+    except Exception as exc:
+        logging.exception(exc)
+        await finish(
+            job,
+            session_maker,
+            error=''.join(traceback.format_exception_only(exc)).strip(),
+            permanent=is_permanent(exc),
+            )
+        return True
+    report['timings']['job'] = time.perf_counter() - started
+    await finish(job, session_maker, report=report)
+    logging.info('Pool stats: database {0}, http {1}'.format(
+        pool_stats(), get_http_session().pool_stats(),
+        ))
+    return True
+
+
+async def work(session_maker: async_sessionmaker[AsyncSession]) -> None:
+    """Process jobs until cancelled, polling while the queue is empty.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+    """
+    api = MoviesApi()
+    while True:
+        try:
+            processed = await process_next(api, session_maker)
+        except Exception as exc:
+            logging.exception(exc)
+            processed = False
+        if not processed:
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+async def requeue(session_maker: async_sessionmaker[AsyncSession]) -> None:
+    """Put back the jobs of dead workers every `REQUEUE_INTERVAL` seconds.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+    """
+    while True:
+        try:
+            requeued = await requeue_stale(STALE_AFTER, session_maker)
+        except Exception as exc:
+            logging.exception(exc)
+            requeued = 0
+        if requeued:
+            logging.info('Requeued {0} stale jobs'.format(requeued))
+        await asyncio.sleep(REQUEUE_INTERVAL)
+
+
+async def refresh_entry(
+    api: MoviesApi,
+    session_maker: async_sessionmaker[AsyncSession],
+    due: tuple[str, str | None],
+    semaphore: asyncio.Semaphore,
+        ) -> bool:
+    """Refresh one due movie or actor, postponing it if the fetch fails.
+
+    Args:
+        api (MoviesApi): Api used to fetch the IMDb entity.
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        due (tuple[str, str | None]): IMDb id and content hash from `pick_due`.
+        semaphore (asyncio.Semaphore): Limits the number of concurrent refreshes.
+
+    Returns:
+        bool: True if the row changed.
+    """
+    imdb_id, known_hash = due
+    async with semaphore:
+        try:
+            return await api.refresh(imdb_id, known_hash)
+        except Exception as exc:
+            logging.error('Failed to refresh {0}: {1!r}'.format(imdb_id, exc))
+            await postpone(session_maker, imdb_id)
+            return False
+
+
+async def refresh_batch(
+    api: MoviesApi,
+    session_maker: async_sessionmaker[AsyncSession],
+    semaphore: asyncio.Semaphore,
+        ) -> tuple[int, int]:
+    """Refresh the next `REFRESH_BATCH` due movies and actors.
+
+    Args:
+        api (MoviesApi): Api used to fetch the IMDb entities.
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+        semaphore (asyncio.Semaphore): Limits the number of concurrent refreshes.
+
+    Returns:
+        tuple[int, int]: Number of refreshed and of changed entries.
+    """
+    due = await pick_due(session_maker, REFRESH_MAX_AGE, REFRESH_BATCH)
+    changed = await asyncio.gather(
+        *[refresh_entry(api, session_maker, entry, semaphore) for entry in due],
+        )
+    return len(due), sum(changed)
+
+
+async def recrawl(session_maker: async_sessionmaker[AsyncSession]) -> None:
+    """Refresh due movies and actors, `REFRESH_BATCH` at a time.
+
+    Batches follow each other while entries are due, then the
+    refresher sleeps `REFRESH_INTERVAL` seconds. Fetches run
+    `IMDB_CONCURRENCY` at a time within the `IMDB_RATE_LIMIT` budget
+    that the imports of the process share.
+
+    Args:
+        session_maker (sessionmaker):
+        An asynchronous session maker for interacting with the database.
+    """
+    api = MoviesApi()
+    semaphore = asyncio.Semaphore(api.concurrency)
+    while True:
+        try:
+            refreshed, changed = await refresh_batch(api, session_maker, semaphore)
+        except Exception as exc:
+            logging.exception(exc)
+            refreshed, changed = 0, 0
+        if refreshed:
+            logging.info('Refreshed {0} entries, {1} changed'.format(refreshed, changed))
+        if refreshed < REFRESH_BATCH:
+            await asyncio.sleep(REFRESH_INTERVAL)
+
+
+async def answer_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer any HTTP request with the metrics of the worker.
+
+    Args:
+        reader (StreamReader): Stream of the request.
+        writer (StreamWriter): Stream of the response.
+    """
+    await reader.readuntil(b'\r\n\r\n')
+    body = render_metrics().encode()
+    writer.write('HTTP/1.1 200 OK\r\n'.encode())
+    writer.write('Content-Type: {0}\r\nContent-Length: {1}\r\n'.format(
+        CONTENT_TYPE, len(body),
+        ).encode())
+    writer.write(b'Connection: close\r\n\r\n')
+    writer.write(body)
+    await writer.drain()
+    writer.close()
+
+
+async def serve_metrics() -> None:
+    """Serve the ingestion histograms to Prometheus on `WORKER_METRICS_PORT`."""
+    server = await asyncio.start_server(answer_metrics, port=METRICS_PORT)
+    async with server:
+        await server.serve_forever()
+
+
+async def main(concurrency: int) -> None:
+    """Run `concurrency` jobs at a time.
+
+    The jobs share the process-wide database pool (`DB_POOL_SIZE`)
+    and HTTP session, size them for `concurrency` jobs.
+
+    Args:
+        concurrency (int): Number of jobs processed in parallel.
+    """
+    session_maker = get_session_maker()
+    logging.info('Starting {0} workers'.format(concurrency))
+    tasks = [work(session_maker) for _ in range(concurrency)]
+    tasks.append(requeue(session_maker))
+    if REFRESH_INTERVAL:
+        tasks.append(recrawl(session_maker))
+    if METRICS_PORT:
+        tasks.append(serve_metrics())
+    await asyncio.gather(*tasks)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process the IMDb ingestion queue.')
+    parser.add_argument(
+        '--concurrency', type=int, default=int(os.environ.get('INGEST_WORKERS', '2')),
+        )
+    asyncio.run(main(parser.parse_args().concurrency))